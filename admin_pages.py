@@ -0,0 +1,168 @@
+from typing import List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from async_db import (
+    get_channel_by_id, get_stats_totals, get_channels_page,
+    get_authenticated_chats_page, count_channel_chats,
+    get_groups_page, get_group_members_preview, count_group_members
+)
+
+# Admin listings are sent one page at a time with ⬅️/➡️ buttons. Each page is
+# read with a keyset query, so only the rows shown are fetched, and the button
+# callback data carries the (timestamp, id) key of the row to continue from:
+#
+#   page:<view>:<argument>:<n|p>:<id>:<timestamp>
+#
+# 'n' continues after the key (next page), 'p' ends before it (previous page).
+# The timestamp goes last because it contains colons itself.
+
+CALLBACK_PREFIX = "page"
+PAGE_SIZE = 20
+# Groups are listed together with some of their members, so fewer fit on a page
+GROUPS_PAGE_SIZE = 5
+MEMBERS_PER_GROUP = 10
+# Telegram rejects longer messages; titles are shortened so a page stays well below it
+MESSAGE_LIMIT = 4096
+TITLE_LENGTH = 64
+
+def _short(text: Optional[str]) -> str:
+    """Shorten a user-provided title to TITLE_LENGTH characters"""
+    text = text or ""
+    return text if len(text) <= TITLE_LENGTH else text[:TITLE_LENGTH - 1] + "…"
+
+def _clip(text: str) -> str:
+    """Make sure a message fits Telegram's length limit"""
+    return text if len(text) <= MESSAGE_LIMIT else text[:MESSAGE_LIMIT - 1] + "…"
+
+def _callback(view: str, argument: str, direction: str, key: Tuple[str, int]) -> str:
+    return f"{CALLBACK_PREFIX}:{view}:{argument}:{direction}:{key[1]}:{key[0]}"
+
+def parse_callback(data: str) -> Optional[Tuple[str, str, Optional[Tuple[str, int]], Optional[Tuple[str, int]]]]:
+    """Parse page button data into (view, argument, after, before), or None if it is not a page button"""
+    parts = (data or "").split(":", 5)
+    if len(parts) != 6 or parts[0] != CALLBACK_PREFIX or parts[1] not in VIEWS or parts[3] not in ("n", "p"):
+        return None
+    try:
+        key = (parts[5], int(parts[4]))
+    except ValueError:
+        return None
+    if parts[3] == "n":
+        return parts[1], parts[2], key, None
+    return parts[1], parts[2], None, key
+
+async def _page(fetch, limit: int, after, before) -> Tuple[List[Tuple], bool, bool]:
+    """Fetch one page with `fetch(limit, after, before)` and tell whether there are pages before and after it"""
+    rows = await fetch(limit + 1, after, before)
+    if before is not None:
+        has_previous = len(rows) > limit
+        rows = rows[-limit:]
+        if not rows:
+            # Everything newer is gone; start over from the first page
+            return await _page(fetch, limit, None, None)
+        return rows, has_previous, True
+    return rows[:limit], after is not None, len(rows) > limit
+
+def _buttons(view: str, argument: str, rows: List[Tuple], key, has_previous: bool,
+             has_next: bool) -> Optional[InlineKeyboardMarkup]:
+    buttons = []
+    if has_previous:
+        buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=_callback(view, argument, "p", key(rows[0]))))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=_callback(view, argument, "n", key(rows[-1]))))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def _channels_page(argument, after, before):
+    rows, has_previous, has_next = await _page(get_channels_page, PAGE_SIZE, after, before)
+    if not rows:
+        return "📺 No channels found.", None
+
+    response = "📺 Available Channels:\n\n"
+    for channel_id, channel_name, description, is_active, created_at, chat_count in rows:
+        status = "🟢 Active" if is_active else "🔴 Inactive"
+        response += f"{_short(channel_name)} {status}\n"
+        response += f"ID: {channel_id} | Chats: {chat_count}\n"
+        if description:
+            response += f"Description: {_short(description)}\n"
+        response += f"Created: {created_at}\n\n"
+    key = lambda channel: (channel.created_at, channel.channel_id)
+    return response, _buttons("channels", argument, rows, key, has_previous, has_next)
+
+async def _stats_page(argument, after, before):
+    stats = await get_stats_totals()
+    rows, has_previous, has_next = await _page(get_channels_page, PAGE_SIZE, after, before)
+
+    response = f"""📊 Bot Statistics:
+👥 Total Users: {stats['total_users']}
+🏠 Active Groups: {stats['total_groups']}
+📺 Total Channels: {stats['total_channels']}
+💬 Authenticated Chats: {stats['total_authenticated_chats']}
+
+📺 Channel Distribution:
+"""
+    for channel_id, channel_name, description, is_active, created_at, chat_count in rows:
+        response += f"• {_short(channel_name)}: {chat_count} chats\n"
+    response += "\nUse /channel_chats <channel_id> to see the chats of a channel."
+    key = lambda channel: (channel.created_at, channel.channel_id)
+    return response, _buttons("stats", argument, rows, key, has_previous, has_next)
+
+async def _channel_chats_page(argument, after, before):
+    channel_id = int(argument)
+    channel = await get_channel_by_id(channel_id)
+    if channel is None:
+        return f"❌ Channel with ID {channel_id} not found.", None
+    channel_name = channel.channel_name
+
+    fetch = lambda limit, after, before: get_authenticated_chats_page(channel_id, limit, after, before)
+    rows, has_previous, has_next = await _page(fetch, PAGE_SIZE, after, before)
+    if not rows:
+        return f"📺 No authenticated chats found for channel '{_short(channel_name)}'.", None
+
+    total = await count_channel_chats(channel_id)
+    response = f"💬 Authenticated chats for channel '{_short(channel_name)}' ({total}):\n\n"
+    for chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity in rows:
+        status = "🟢" if is_active else "🔴"
+        response += f"{status} {_short(chat_title)} ({chat_type})\n"
+        response += f"  ID: {chat_id} | Auth: {authenticated_at}\n\n"
+    key = lambda chat: (chat.last_activity, chat.chat_id)
+    return response, _buttons("chats", argument, rows, key, has_previous, has_next)
+
+async def _groups_page(argument, after, before):
+    rows, has_previous, has_next = await _page(get_groups_page, GROUPS_PAGE_SIZE, after, before)
+    stats = await get_stats_totals()
+
+    response = "🔍 Debug Information\n\n"
+    response += f"📊 Groups ({stats['total_groups']}):\n"
+    group_ids = [group.group_id for group in rows]
+    member_counts = await count_group_members(group_ids)
+    members = {}
+    for member in await get_group_members_preview(group_ids, MEMBERS_PER_GROUP):
+        members.setdefault(member.group_id, []).append(member)
+
+    for group in rows:
+        status = "🟢" if group.is_active else "🔴"
+        member_count = member_counts.get(group.group_id, 0)
+        group_members = members.get(group.group_id, [])
+        response += f"\n{status} {_short(group.group_title)} (ID: {group.group_id}) - {member_count} members\n"
+        for member in group_members:
+            display_name = _short(member.first_name or member.username or f"User {member.user_id}")
+            response += f"  • {display_name} (@{member.username or 'N/A'})\n"
+        if member_count > len(group_members):
+            response += f"  … and {member_count - len(group_members)} more\n"
+
+    response += "\nUse /stats and /channel_chats <channel_id> for authenticated chats."
+    key = lambda group: (group.created_at, group.group_id)
+    return response, _buttons("groups", argument, rows, key, has_previous, has_next)
+
+VIEWS = {
+    "channels": _channels_page,
+    "stats": _stats_page,
+    "chats": _channel_chats_page,
+    "groups": _groups_page,
+}
+
+async def render_page(view: str, argument: str = "", after: Optional[Tuple[str, int]] = None,
+                      before: Optional[Tuple[str, int]] = None) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Render one page of an admin listing as (text, keyboard)"""
+    text, keyboard = await VIEWS[view](argument, after, before)
+    return _clip(text), keyboard
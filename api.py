@@ -1,78 +1,104 @@
+import io
 import os
+import json
+import base64
+import binascii
+from typing import Callable, Iterator, Optional, Tuple, Union
 # sqlite3 import no longer needed - using db.py
-import asyncio
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 from db import (
-    get_all_channels, get_bot_stats,
-    get_authenticated_chats_for_channel
+    get_channels_page, count_channels, get_bot_stats, get_stats_totals,
+    get_authenticated_chats_page, count_channel_chats, get_channel_recipients, create_broadcast_job,
+    get_broadcast_job, get_broadcast_deliveries, get_dead_letters, replay_dead_letters, check_database,
+    get_channel_by_name, get_channel_by_secret, import_authenticated_chats, iter_authenticated_chats
 )
+from bulk import FORMATS, MIMETYPES, parse_chats, format_chats
+from broadcast import start_dispatcher, wake_dispatcher, check_bot
 
 # Environment variables are loaded by docker-compose
 
 TELEGRAM_CHANNEL_BOT_API_KEY = os.environ.get("TELEGRAM_CHANNEL_BOT_API_KEY", "change-me")
 TELEGRAM_CHANNEL_BOT_API_PORT = int(os.environ.get("TELEGRAM_CHANNEL_BOT_API_PORT", 5000))
+# How `python api.py` serves the API on its own (bot.py always serves it on the bot's loop):
+# "gunicorn" (default): threaded gunicorn worker; "async": one process serving on the broadcast event loop (async_api.py)
+TELEGRAM_CHANNEL_BOT_API_SERVER = os.environ.get("TELEGRAM_CHANNEL_BOT_API_SERVER", "gunicorn").strip().lower()
+# Request threads of the one gunicorn worker, or of the Flask fallback in the async server
+TELEGRAM_CHANNEL_BOT_API_THREADS = int(os.environ.get("TELEGRAM_CHANNEL_BOT_API_THREADS", 8))
 TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "api.telegram.org").strip().rstrip("/")
+# Listing endpoints return pages of this many rows unless ?limit= asks for fewer or more
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Listings answer with one JSON page; ndjson streams every row from the cursor on instead
+LISTING_FORMATS = ("json", "ndjson")
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Global variable to store the bot application (for compatibility)
-bot_app = None
-
-def set_bot_app(app_instance):
-    """Set the bot application instance for sending messages"""
-    global bot_app
-    bot_app = app_instance
-
 # All database functions are now imported from db.py
 
-def send_message_to_chat(chat_id, message):
-    """Send a message to a specific chat (group or private)"""
-    # Get the bot token directly from environment (thread-safe)
-    token = os.environ.get("TELEGRAM_CHANNEL_BOT_TOKEN")
-    if not token:
-        return False
-    
-    try:
-        from telegram import Bot
-        bot = Bot(
-            token=token,
-            base_url=f"https://{TELEGRAM_API_URL}/bot",
-            base_file_url=f"https://{TELEGRAM_API_URL}/file/bot",
-        )
-        
-        # Try to get existing event loop first
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            # No event loop exists, create a new one
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        # Run the coroutine
-        loop.run_until_complete(bot.send_message(chat_id=chat_id, text=message))
-        return True
-    except Exception as e:
-        print(f"Error sending message to chat {chat_id}: {e}")
-        return False
-
 # Chat retrieval functions are now imported from db.py
 
+@app.before_request
+def ensure_dispatcher():
+    """Start the broadcast dispatcher of this worker on its first request"""
+    start_dispatcher()
+
+def api_key_valid(api_key) -> bool:
+    """Check an API key sent with a request"""
+    return api_key == TELEGRAM_CHANNEL_BOT_API_KEY
+
 def authenticate_api():
     """Check if the API request is authenticated"""
-    api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
-    return api_key == TELEGRAM_CHANNEL_BOT_API_KEY
+    return api_key_valid(request.headers.get('X-API-Key') or request.args.get('api_key'))
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    stats = get_bot_stats()
-    return jsonify({
+# The *_result functions below build response bodies without touching Flask's
+# request, so the async server (async_api.py) serves the same responses
+
+def liveness_result() -> dict:
+    return {
+        "status": "alive",
+        "timestamp": datetime.now().isoformat()
+    }
+
+def readiness_result(database: Optional[Tuple[bool, str]] = None,
+                     bot: Optional[Tuple[bool, str]] = None) -> Tuple[dict, int]:
+    """Readiness body from the (ok, detail) outcomes of the checks, running those not given"""
+    database_ok, database_detail = database or check_database()
+    bot_ok, bot_detail = bot or check_bot()
+    ready = database_ok and bot_ok
+    return {
+        "status": "ready" if ready else "not_ready",
+        "timestamp": datetime.now().isoformat(),
+        "checks": {
+            "database": {"ok": database_ok, "detail": database_detail},
+            "bot": {"ok": bot_ok, "detail": bot_detail}
+        }
+    }, 200 if ready else 503
+
+def health_result() -> dict:
+    stats = get_stats_totals()
+    return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "total_authenticated_chats": stats['total_authenticated_chats']
-    })
+    }
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the worker answers requests, nothing else is checked"""
+    return jsonify(liveness_result())
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: the database answers and the bot reaches Telegram, without scanning any table"""
+    body, status = readiness_result()
+    return jsonify(body), status
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """Health check endpoint with basic statistics (use /api/health/live for frequent probes)"""
+    return jsonify(health_result())
 
 
 @app.route('/', methods=['GET'])
@@ -81,80 +107,92 @@ def landing_page():
     return render_template("landing.html")
 
 
-def _broadcast_to_channel_logic(data):
-    """Core broadcast logic shared by authenticated API and public landing form."""
+def broadcast_to_channel_result(data) -> Tuple[dict, int]:
+    """Core broadcast logic shared by the API, the landing form and the async server; returns (body, status)"""
     if not data or 'message' not in data or 'channel_name' not in data or 'channel_secret' not in data:
-        return jsonify({"error": "Message, channel, and channel_secret are required"}), 400
+        return {"error": "Message, channel, and channel_secret are required"}, 400
 
     message = data['message']
     channel = data['channel_name']
     channel_secret = data['channel_secret']
 
     if not message.strip() or not channel.strip() or not channel_secret.strip():
-        return jsonify({"error": "Message, channel, and channel_secret cannot be empty"}), 400
+        return {"error": "Message, channel, and channel_secret cannot be empty"}, 400
 
     # Get channel information by secret (for security)
-    from db import get_channel_by_secret
     channel_info = get_channel_by_secret(channel_secret)
     if not channel_info:
-        return jsonify({
+        return {
             "error": "Invalid channel secret",
             "sent_to": 0
-        }), 401
+        }, 401
 
     channel_id, channel_name_from_db, description, is_active = channel_info
 
     # Verify the provided channel name matches the secret
     if channel_name_from_db != channel:
-        return jsonify({
+        return {
             "error": "Channel name does not match the provided secret",
             "sent_to": 0
-        }), 401
+        }, 401
 
     if not is_active:
-        return jsonify({
+        return {
             "error": f"Channel '{channel_name_from_db}' is inactive",
             "sent_to": 0
-        }), 400
+        }, 400
 
-    # Get authenticated chats for this channel
-    authenticated_chats = get_authenticated_chats_for_channel(channel_id)
+    # Get authenticated chats for this channel (cached between broadcasts)
+    authenticated_chats = get_channel_recipients(channel_id)
 
     if not authenticated_chats:
-        return jsonify({
+        return {
             "error": f"No authenticated chats found for channel '{channel_name_from_db}'",
             "sent_to": 0
-        }), 404
-
-    # Send message to all authenticated chats
-    success_count = 0
-    failed_chats = []
-
-    for chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity in authenticated_chats:
-        if send_message_to_chat(chat_id, message):
-            success_count += 1
-        else:
-            failed_chats.append({
-                "chat_id": chat_id,
-                "chat_type": chat_type,
-                "chat_title": chat_title
-            })
-
-    total_chats = len(authenticated_chats)
-
-    response = {
-        "message": f"Broadcast to channel '{channel_name_from_db}' completed",
+        }, 404
+
+    if not os.environ.get("TELEGRAM_CHANNEL_BOT_TOKEN"):
+        return {
+            "error": "Bot token is not configured",
+            "sent_to": 0
+        }, 500
+
+    # Queue the broadcast; the dispatcher sends it in the background
+    job_id = create_broadcast_job(channel_id, message, authenticated_chats)
+    wake_dispatcher()
+
+    return {
+        "message": f"Broadcast to channel '{channel_name_from_db}' queued",
+        "job_id": job_id,
+        "status": "queued",
         "channel": channel_name_from_db,
         "channel_id": channel_id,
-        "total_authenticated_chats": total_chats,
-        "sent_to": success_count,
-        "failed": len(failed_chats)
-    }
+        "total_authenticated_chats": len(authenticated_chats),
+        "status_url": f"/api/broadcast-jobs/{job_id}"
+    }, 202
 
-    if failed_chats:
-        response["failed_chats"] = failed_chats
 
-    return jsonify(response)
+def _broadcast_to_channel_logic(data):
+    """Flask response of broadcast_to_channel_result"""
+    body, status = broadcast_to_channel_result(data)
+    return jsonify(body), status
+
+
+def _broadcast_job_progress(job):
+    """Convert a broadcast_jobs row into its JSON progress representation"""
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "channel": job.channel_name,
+        "channel_id": job.channel_id,
+        "total_authenticated_chats": job.total_chats,
+        "sent_to": job.sent_count,
+        "failed": job.failed_count,
+        "pending": job.total_chats - job.sent_count - job.failed_count,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
 
 
 @app.route('/api/broadcast-to-channel', methods=['POST'])
@@ -173,92 +211,362 @@ def web_broadcast_to_channel():
     data = request.get_json()
     return _broadcast_to_channel_logic(data)
 
-@app.route('/api/channels', methods=['GET'])
-def get_channels():
-    """Get all channels"""
+
+@app.route('/api/broadcast-jobs/<job_id>', methods=['GET'])
+def broadcast_job_status(job_id):
+    """Get the progress of a queued broadcast"""
     if not authenticate_api():
         return jsonify({"error": "Unauthorized"}), 401
-    
-    channels = get_all_channels()
-    channel_list = []
-    
-    for channel in channels:
-        channel_id, channel_name, description, is_active, created_at, user_count = channel
-        channel_list.append({
-            "channel_id": channel_id,
-            "channel_name": channel_name,
-            "description": description,
-            "is_active": bool(is_active),
-            "user_count": user_count,
-            "created_at": created_at
+
+    job = get_broadcast_job(job_id)
+    if not job:
+        return jsonify({"error": "Broadcast job not found"}), 404
+
+    return jsonify(_broadcast_job_progress(job))
+
+
+@app.route('/api/broadcast-jobs/<job_id>/deliveries', methods=['GET'])
+def broadcast_job_deliveries(job_id):
+    """Get the per-chat outcomes of a queued broadcast, optionally filtered by ?status="""
+    if not authenticate_api():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    status = request.args.get('status')
+    if status and status not in ('pending', 'sent', 'failed'):
+        return jsonify({"error": "status must be one of pending, sent, failed"}), 400
+
+    if not get_broadcast_job(job_id):
+        return jsonify({"error": "Broadcast job not found"}), 404
+
+    deliveries = []
+    for delivery in get_broadcast_deliveries(job_id, status):
+        deliveries.append({
+            "chat_id": delivery.chat_id,
+            "chat_type": delivery.chat_type,
+            "chat_title": delivery.chat_title,
+            "status": delivery.status,
+            "error": delivery.error,
+            "updated_at": delivery.updated_at
         })
-    
+
     return jsonify({
-        "channels": channel_list,
-        "total": len(channel_list)
+        "job_id": job_id,
+        "deliveries": deliveries,
+        "total": len(deliveries)
     })
 
-@app.route('/api/channel/<channel_name>/chats', methods=['POST'])
-def get_channel_chats(channel_name):
-    """Get authenticated chats for a specific channel - requires channel secret for security"""
+
+@app.route('/api/broadcast-jobs/<job_id>/dead-letters', methods=['GET'])
+def broadcast_job_dead_letters(job_id):
+    """Get the deliveries of a broadcast that failed after all retries"""
     if not authenticate_api():
         return jsonify({"error": "Unauthorized"}), 401
+
+    if not get_broadcast_job(job_id):
+        return jsonify({"error": "Broadcast job not found"}), 404
+
+    dead_letters = []
+    for dead_letter in get_dead_letters(job_id):
+        dead_letters.append({
+            "chat_id": dead_letter.chat_id,
+            "chat_type": dead_letter.chat_type,
+            "chat_title": dead_letter.chat_title,
+            "error": dead_letter.error,
+            "permanent": bool(dead_letter.permanent),
+            "attempts": dead_letter.attempts,
+            "created_at": dead_letter.created_at,
+            "replay_job_id": dead_letter.replay_job_id
+        })
+
+    return jsonify({
+        "job_id": job_id,
+        "dead_letters": dead_letters,
+        "total": len(dead_letters)
+    })
+
+
+@app.route('/api/broadcast-jobs/<job_id>/replay', methods=['POST'])
+def replay_broadcast_job(job_id):
+    """Re-send a broadcast to the chats whose delivery failed, as a new job"""
+    if not authenticate_api():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if not get_broadcast_job(job_id):
+        return jsonify({"error": "Broadcast job not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    replay_job_id, total = replay_dead_letters(job_id, bool(data.get('include_permanent', False)))
+    if replay_job_id is None:
+        return jsonify({"error": "No failed deliveries to replay", "job_id": job_id}), 404
+    wake_dispatcher()
+
+    return jsonify({
+        "message": f"Replay of broadcast {job_id} queued",
+        "job_id": replay_job_id,
+        "status": "queued",
+        "replayed_from": job_id,
+        "total_authenticated_chats": total,
+        "status_url": f"/api/broadcast-jobs/{replay_job_id}"
+    }), 202
+
+
+@app.route('/web/broadcast-jobs/<job_id>', methods=['GET'])
+def web_broadcast_job_status(job_id):
+    """Public progress endpoint for the landing page (job ids are unguessable)."""
+    job = get_broadcast_job(job_id)
+    if not job:
+        return jsonify({"error": "Broadcast job not found"}), 404
+
+    progress = _broadcast_job_progress(job)
+    return jsonify({key: progress[key] for key in ("job_id", "status", "total_authenticated_chats", "sent_to", "failed", "pending")})
+
+def _encode_cursor(key) -> str:
+    """Turn the sort key of the last row of a page into an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor: str):
+    """Turn a cursor back into a (timestamp, id) sort key, raising ValueError if it is malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("invalid cursor")
+    if (not isinstance(key, list) or len(key) != 2 or not isinstance(key[0], str)
+            or not isinstance(key[1], int) or isinstance(key[1], bool)):
+        raise ValueError("invalid cursor")
+    return key[0], key[1]
+
+def _page_args(args, data=None):
+    """Read (limit, after) from the query string `args` or a JSON body, raising ValueError if they are invalid"""
+    data = data or {}
+    limit = args.get('limit', data.get('limit', DEFAULT_PAGE_SIZE))
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    cursor = args.get('cursor', data.get('cursor'))
+    if not cursor:
+        return limit, None
+    if not isinstance(cursor, str):
+        raise ValueError("invalid cursor")
+    return limit, _decode_cursor(cursor)
+
+def wants_ndjson(args, data=None) -> bool:
+    """Read the listing format (json or ndjson) from the query string or a JSON body, raising ValueError if invalid"""
+    fmt = str(args.get('format', (data or {}).get('format', 'json'))).lower()
+    if fmt not in LISTING_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(LISTING_FORMATS)}")
+    return fmt == 'ndjson'
+
+def _ndjson_pages(fetch: Callable, to_json: Callable, key: Callable, limit: int, after) -> Iterator[str]:
+    """Stream every row from `after` on as NDJSON, reading `limit` rows per `fetch(limit, after)` query"""
+    while True:
+        rows = fetch(limit, after)
+        if rows:
+            yield "".join(json.dumps(to_json(row)) + "\n" for row in rows)
+        if len(rows) < limit:
+            return
+        after = key(rows[-1])
+
+def _channel_key(channel):
+    return channel.created_at, channel.channel_id
+
+def _chat_key(chat):
+    return chat.last_activity, chat.chat_id
+
+def _channel_json(channel):
+    """JSON representation of a ChannelSummary record"""
+    return {
+        "channel_id": channel.channel_id,
+        "channel_name": channel.channel_name,
+        "description": channel.description,
+        "is_active": bool(channel.is_active),
+        "user_count": channel.chat_count,
+        "created_at": channel.created_at
+    }
+
+def _chat_json(chat):
+    """JSON representation of an AuthenticatedChat record"""
+    record = chat._asdict()
+    record["is_active"] = bool(chat.is_active)
+    return record
+
+def channels_result(args) -> Tuple[dict, int]:
+    """A page of channels, newest first, as selected by the limit and cursor in `args`"""
+    try:
+        limit, after = _page_args(args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
     
-    data = request.get_json()
+    # One extra row tells whether there is another page
+    channels = get_channels_page(limit + 1, after)
+    next_cursor = None
+    if len(channels) > limit:
+        channels = channels[:limit]
+        next_cursor = _encode_cursor(_channel_key(channels[-1]))
+    return {
+        "channels": [_channel_json(channel) for channel in channels],
+        "total": count_channels(),
+        "next_cursor": next_cursor
+    }, 200
+
+def channels_ndjson(args) -> Iterator[str]:
+    """Every channel from the cursor in `args` on, newest first, as NDJSON chunks; raises ValueError for invalid arguments"""
+    limit, after = _page_args(args)
+    return _ndjson_pages(get_channels_page, _channel_json, _channel_key, limit, after)
+
+@app.route('/api/channels', methods=['GET'])
+def get_channels():
+    """Get a page of channels, newest first, or stream all of them with ?format=ndjson"""
+    if not authenticate_api():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        if wants_ndjson(request.args):
+            return Response(stream_with_context(channels_ndjson(request.args)), mimetype=MIMETYPES['ndjson'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    body, status = channels_result(request.args)
+    return jsonify(body), status
+
+def channel_chats_result(channel_name: str, args, data) -> Tuple[Union[dict, Iterator[str]], int]:
+    """A page of a channel's chats as selected by `args` and the JSON body `data`, which holds the channel secret.
+
+    With format=ndjson the body is an iterator of NDJSON chunks of every chat
+    from the cursor on instead, reading one page per chunk.
+    """
     if not data or 'channel_secret' not in data:
-        return jsonify({"error": "channel_secret is required"}), 400
+        return {"error": "channel_secret is required"}, 400
     
     channel_secret = data['channel_secret']
     if not channel_secret.strip():
-        return jsonify({"error": "channel_secret cannot be empty"}), 400
+        return {"error": "channel_secret cannot be empty"}, 400
     
     # Get channel information by secret (for security)
-    from db import get_channel_by_secret
     channel_info = get_channel_by_secret(channel_secret)
     if not channel_info:
-        return jsonify({"error": "Invalid channel secret"}), 401
-    
-    channel_id, channel_name_from_db, description, is_active = channel_info
+        return {"error": "Invalid channel secret"}, 401
     
     # Verify the provided channel name matches the secret
-    if channel_name_from_db != channel_name:
-        return jsonify({"error": "Channel name does not match the provided secret"}), 401
+    if channel_info.channel_name != channel_name:
+        return {"error": "Channel name does not match the provided secret"}, 401
     
-    if not is_active:
-        return jsonify({"error": f"Channel '{channel_name_from_db}' is inactive"}), 400
+    if not channel_info.is_active:
+        return {"error": f"Channel '{channel_info.channel_name}' is inactive"}, 400
     
-    # Get authenticated chats for the channel
-    chats = get_authenticated_chats_for_channel(channel_id)
-    chat_list = []
+    try:
+        limit, after = _page_args(args, data)
+        ndjson = wants_ndjson(args, data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
     
-    for chat in chats:
-        chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity = chat
-        chat_list.append({
-            "chat_id": chat_id,
-            "chat_type": chat_type,
-            "chat_title": chat_title,
-            "is_active": bool(is_active),
-            "authenticated_at": authenticated_at,
-            "last_activity": last_activity
-        })
+    channel_id = channel_info.channel_id
+    if ndjson:
+        fetch = lambda limit, after: get_authenticated_chats_page(channel_id, limit, after)
+        return _ndjson_pages(fetch, _chat_json, _chat_key, limit, after), 200
     
-    return jsonify({
+    # Get a page of authenticated chats for the channel, plus one row to see if there are more
+    chats = get_authenticated_chats_page(channel_id, limit + 1, after)
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = _encode_cursor(_chat_key(chats[-1]))
+    
+    return {
         "channel": {
             "channel_id": channel_id,
-            "channel_name": channel_name_from_db,
-            "description": description,
-            "is_active": bool(is_active)
+            "channel_name": channel_info.channel_name,
+            "description": channel_info.description,
+            "is_active": bool(channel_info.is_active)
         },
-        "chats": chat_list,
-        "total": len(chat_list)
-    })
+        "chats": [_chat_json(chat) for chat in chats],
+        "total": count_channel_chats(channel_id),
+        "next_cursor": next_cursor
+    }, 200
 
-@app.route('/api/stats', methods=['GET'])
-def get_stats():
-    """Get bot statistics"""
+@app.route('/api/channel/<channel_name>/chats', methods=['POST'])
+def get_channel_chats(channel_name):
+    """Get a page of authenticated chats for a specific channel - requires channel secret for security"""
+    if not authenticate_api():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    body, status = channel_chats_result(channel_name, request.args, request.get_json(silent=True))
+    if isinstance(body, dict):
+        return jsonify(body), status
+    return Response(stream_with_context(body), mimetype=MIMETYPES['ndjson'])
+
+def _bulk_format(args, content_type: Optional[str], default: str) -> str:
+    """Format of a bulk request: ?format=, else the Content-Type, else `default`"""
+    fmt = args.get('format')
+    if fmt:
+        return fmt.lower()
+    if 'csv' in (content_type or ''):
+        return 'csv'
+    return default
+
+@app.route('/api/channel/<channel_name>/chats/import', methods=['POST'])
+def import_channel_chats(channel_name):
+    """Authenticate many chats for a channel from a streamed NDJSON or CSV body"""
+    if not authenticate_api():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    fmt = _bulk_format(request.args, request.content_type, 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(FORMATS)}"}), 400
+    
+    channel_info = get_channel_by_name(channel_name)
+    if not channel_info:
+        return jsonify({"error": f"Channel '{channel_name}' not found or inactive"}), 404
+    channel_id = channel_info.channel_id
+    
+    # Parse and write while the body is still being received
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    report = {"skipped": 0, "errors": []}
+    imported = import_authenticated_chats(channel_id, parse_chats(lines, fmt, report))
+    print(f"Bulk import for channel '{channel_name}': {imported} chats imported, {report['skipped']} skipped")
+    
+    return jsonify({
+        "channel": channel_name,
+        "channel_id": channel_id,
+        "imported": imported,
+        "skipped": report["skipped"],
+        "errors": report["errors"]
+    }), 400 if report["skipped"] and not imported else 200
+
+def export_chats_result(channel_name: str, args, content_type: Optional[str] = None) -> Tuple[Union[dict, Iterator[str]], int, dict]:
+    """The authenticated chats of a channel as NDJSON or CSV chunks, with the headers of the file.
+
+    Errors come back as a JSON body dict instead of the chunks.
+    """
+    fmt = _bulk_format(args, content_type, 'ndjson')
+    if fmt not in FORMATS:
+        return {"error": f"format must be one of: {', '.join(FORMATS)}"}, 400, {}
+    include_inactive = args.get('include_inactive', '').lower() in ('1', 'true', 'yes')
+    
+    channel_info = get_channel_by_name(channel_name)
+    if not channel_info:
+        return {"error": f"Channel '{channel_name}' not found or inactive"}, 404, {}
+    
+    rows = iter_authenticated_chats(channel_info.channel_id, include_inactive)
+    return format_chats(rows, fmt), 200, {
+        "Content-Type": MIMETYPES[fmt],
+        "Content-Disposition": f'attachment; filename="{channel_name}-chats.{fmt}"'
+    }
+
+@app.route('/api/channel/<channel_name>/chats/export', methods=['GET'])
+def export_channel_chats(channel_name):
+    """Stream the authenticated chats of a channel as NDJSON or CSV"""
     if not authenticate_api():
         return jsonify({"error": "Unauthorized"}), 401
     
+    body, status, headers = export_chats_result(channel_name, request.args, request.content_type)
+    if isinstance(body, dict):
+        return jsonify(body), status
+    return Response(stream_with_context(body), headers=headers)
+
+def stats_result() -> dict:
     stats = get_bot_stats()
     total_users = stats['total_users']
     total_groups = stats['total_groups']
@@ -266,27 +574,43 @@ def get_stats():
     total_authenticated_chats = stats['total_authenticated_chats']
     channel_distribution = stats['channel_distribution']
     
-    return jsonify({
+    return {
         "total_users": total_users,
         "total_groups": total_groups,
         "total_channels": total_channels,
         "total_authenticated_chats": total_authenticated_chats,
         "channel_distribution": {name: count for name, count in channel_distribution},
         "timestamp": datetime.now().isoformat()
-    })
+    }
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Get bot statistics"""
+    if not authenticate_api():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    return jsonify(stats_result())
 
 def run_api():
-    """Run the API server in a separate thread using Gunicorn for production"""
+    """Run the API server without the bot, using Gunicorn (or the async server) for production"""
     import subprocess
     import sys
     
-    # Use Gunicorn for production WSGI server
+    if TELEGRAM_CHANNEL_BOT_API_SERVER == "async":
+        from async_api import serve
+        serve(TELEGRAM_CHANNEL_BOT_API_PORT)
+        return
+    
+    # Use Gunicorn for production WSGI server. A single worker process, because
+    # the rate limiter and the dispatcher are per process: a second worker would
+    # send at the full Telegram rate again and double the broadcast throughput
+    # past the limits. Threads serve the concurrent requests instead.
     cmd = [
         'gunicorn',
         '--bind', f'0.0.0.0:{TELEGRAM_CHANNEL_BOT_API_PORT}',
-        '--workers', '2',
-        '--worker-class', 'sync',
-        '--worker-connections', '1000',
+        '--workers', '1',
+        '--threads', str(TELEGRAM_CHANNEL_BOT_API_THREADS),
+        '--worker-class', 'gthread',
         '--max-requests', '1000',
         '--max-requests-jitter', '100',
         '--timeout', '30',
@@ -0,0 +1,167 @@
+import json
+import threading
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.web
+import tornado.wsgi
+
+import broadcast
+from async_db import run_db
+from db import check_database
+from bulk import MIMETYPES
+from api import (
+    api_key_valid, broadcast_to_channel_result, channels_result, channels_ndjson, wants_ndjson,
+    channel_chats_result, export_chats_result, stats_result, health_result, liveness_result, readiness_result, app,
+    TELEGRAM_CHANNEL_BOT_API_THREADS
+)
+
+# Environment variables are loaded by docker-compose
+
+# Async serving mode of the HTTP API (TELEGRAM_CHANNEL_BOT_API_SERVER=async).
+# A tornado server runs on the worker's broadcast event loop, next to the
+# dispatcher and the shared Bot, so one process holds any number of open
+# requests while every send goes through the same connection pool. Handlers
+# build their responses with the same functions as the Flask routes in api.py
+# and run the blocking database work on the async_db executor. All other routes
+# (landing page, jobs, imports) are passed on to the Flask app, which runs on
+# its own threads. Streamed responses must not be left to that fallback:
+# WSGIContainer buffers the whole body and iterates it on whichever of its
+# threads is free, outside Flask's request context. They are served here, one
+# page query per chunk.
+
+class JSONHandler(tornado.web.RequestHandler):
+    def reply(self, body: dict, status: int = 200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(body))
+
+    def authenticated(self) -> bool:
+        """Check the API key like api.authenticate_api"""
+        return api_key_valid(self.request.headers.get("X-API-Key") or self.get_query_argument("api_key", None))
+
+    def json_body(self):
+        """The request's JSON body, or None if it has none or it is invalid"""
+        try:
+            return json.loads(self.request.body or b"null")
+        except ValueError:
+            return None
+
+    async def stream(self, chunks: Iterator[str], content_type: str):
+        """Send `chunks` as they are produced, each next() on a database thread"""
+        self.set_header("Content-Type", content_type)
+        while True:
+            chunk = await run_db(next, chunks, None)
+            if chunk is None:
+                break
+            self.write(chunk)
+            await self.flush()
+        self.finish()
+
+    def prepare(self):
+        # Same as api.ensure_dispatcher: the dispatcher sends the queued broadcasts
+        broadcast.start_dispatcher()
+
+class BroadcastHandler(JSONHandler):
+    """POST /api/broadcast-to-channel"""
+    async def post(self):
+        if not self.authenticated():
+            return self.reply({"error": "Unauthorized"}, 401)
+        self.reply(*await run_db(broadcast_to_channel_result, self.json_body()))
+
+class WebBroadcastHandler(JSONHandler):
+    """POST /web/broadcast-to-channel, the landing page's form without an API key"""
+    async def post(self):
+        self.reply(*await run_db(broadcast_to_channel_result, self.json_body()))
+
+class ChannelsHandler(JSONHandler):
+    """GET /api/channels"""
+    async def get(self):
+        if not self.authenticated():
+            return self.reply({"error": "Unauthorized"}, 401)
+        args = {name: self.get_query_argument(name) for name in self.request.query_arguments}
+        try:
+            lines = channels_ndjson(args) if wants_ndjson(args) else None
+        except ValueError as e:
+            return self.reply({"error": str(e)}, 400)
+        if lines is None:
+            return self.reply(*await run_db(channels_result, args))
+        await self.stream(lines, MIMETYPES["ndjson"])
+
+class ChannelChatsHandler(JSONHandler):
+    """POST /api/channel/<name>/chats"""
+    async def post(self, channel_name):
+        if not self.authenticated():
+            return self.reply({"error": "Unauthorized"}, 401)
+        args = {name: self.get_query_argument(name) for name in self.request.query_arguments}
+        body, status = await run_db(channel_chats_result, channel_name, args, self.json_body())
+        if isinstance(body, dict):
+            return self.reply(body, status)
+        await self.stream(body, MIMETYPES["ndjson"])
+
+class ChatsExportHandler(JSONHandler):
+    """GET /api/channel/<name>/chats/export"""
+    async def get(self, channel_name):
+        if not self.authenticated():
+            return self.reply({"error": "Unauthorized"}, 401)
+        args = {name: self.get_query_argument(name) for name in self.request.query_arguments}
+        body, status, headers = await run_db(
+            export_chats_result, channel_name, args, self.request.headers.get("Content-Type"))
+        if isinstance(body, dict):
+            return self.reply(body, status)
+        self.set_header("Content-Disposition", headers["Content-Disposition"])
+        await self.stream(body, headers["Content-Type"])
+
+class StatsHandler(JSONHandler):
+    """GET /api/stats"""
+    async def get(self):
+        if not self.authenticated():
+            return self.reply({"error": "Unauthorized"}, 401)
+        self.reply(await run_db(stats_result))
+
+class HealthHandler(JSONHandler):
+    """GET /api/health"""
+    async def get(self):
+        self.reply(await run_db(health_result))
+
+class LivenessHandler(JSONHandler):
+    """GET /api/health/live"""
+    def get(self):
+        self.reply(liveness_result())
+
+class ReadinessHandler(JSONHandler):
+    """GET /api/health/ready"""
+    async def get(self):
+        # Only the quick database check takes a database thread; getMe is awaited right here
+        database = await run_db(check_database)
+        bot = await broadcast.check_bot_async()
+        self.reply(*readiness_result(database, bot))
+
+def make_app() -> tornado.web.Application:
+    flask_app = tornado.wsgi.WSGIContainer(app, executor=ThreadPoolExecutor(TELEGRAM_CHANNEL_BOT_API_THREADS, thread_name_prefix="flask"))
+    return tornado.web.Application([
+        (r"/api/broadcast-to-channel", BroadcastHandler),
+        (r"/web/broadcast-to-channel", WebBroadcastHandler),
+        (r"/api/channels", ChannelsHandler),
+        (r"/api/channel/([^/]+)/chats", ChannelChatsHandler),
+        (r"/api/channel/([^/]+)/chats/export", ChatsExportHandler),
+        (r"/api/stats", StatsHandler),
+        (r"/api/health", HealthHandler),
+        (r"/api/health/live", LivenessHandler),
+        (r"/api/health/ready", ReadinessHandler),
+        (r".*", tornado.web.FallbackHandler, {"fallback": flask_app}),
+    ])
+
+async def listen(port: int, address: str = "0.0.0.0"):
+    """Start serving on the running event loop and return the tornado HTTPServer"""
+    return make_app().listen(port, address)
+
+def start(port: int, address: str = "0.0.0.0"):
+    """Start serving on the broadcast event loop and return the tornado HTTPServer"""
+    return broadcast.run(listen(port, address))
+
+def serve(port: int, address: str = "0.0.0.0"):
+    """Serve the async API until the process exits"""
+    start(port, address)
+    print(f"Async API server listening on {address}:{port}")
+    threading.Event().wait()
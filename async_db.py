@@ -0,0 +1,53 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+# Environment variables are loaded by docker-compose
+
+# SQLite calls block, so the bot runs them on these threads instead of its event
+# loop. Every thread keeps its own connection (see db.get_connection) and WAL lets
+# the readers among them proceed while one of them writes.
+DB_THREADS = int(os.environ.get("TELEGRAM_CHANNEL_BOT_DB_THREADS", 4))
+
+_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking db.py function on the database executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _offload(func):
+    """Wrap a db.py function into a coroutine function that runs it on the database executor"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+# Awaitable versions of the db.py functions used by the bot handlers
+create_channel = _offload(db.create_channel)
+get_channel_by_id = _offload(db.get_channel_by_id)
+get_channel_by_secret = _offload(db.get_channel_by_secret)
+get_bot_stats = _offload(db.get_bot_stats)
+get_debug_info = _offload(db.get_debug_info)
+add_authenticated_chat = _offload(db.add_authenticated_chat)
+remove_authenticated_chat = _offload(db.remove_authenticated_chat)
+is_chat_authenticated = _offload(db.is_chat_authenticated)
+get_authenticated_channels_for_chat = _offload(db.get_authenticated_channels_for_chat)
+remove_authenticated_chat_from_channel = _offload(db.remove_authenticated_chat_from_channel)
+migrate_chat_id = _offload(db.migrate_chat_id)
+get_authenticated_chats_for_channel = _offload(db.get_authenticated_chats_for_channel)
+get_all_authenticated_chats = _offload(db.get_all_authenticated_chats)
+get_stats_totals = _offload(db.get_stats_totals)
+get_channels_page = _offload(db.get_channels_page)
+get_authenticated_chats_page = _offload(db.get_authenticated_chats_page)
+count_channel_chats = _offload(db.count_channel_chats)
+get_groups_page = _offload(db.get_groups_page)
+get_group_members_preview = _offload(db.get_group_members_preview)
+count_group_members = _offload(db.count_group_members)
+
+def shutdown():
+    """Wait for queued database work and stop the executor threads"""
+    _executor.shutdown(wait=True)
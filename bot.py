@@ -2,18 +2,27 @@ import os
 import json
 import sqlite3
 import asyncio
-import threading
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-from api import run_api, set_bot_app
-from db import (
-    init_database, create_default_channel, add_user_to_db, add_group_to_db,
-    add_user_to_group, remove_user_from_group, create_channel, get_channel_by_secret,
-    get_all_channels, get_bot_stats, get_debug_info,
+from api import TELEGRAM_CHANNEL_BOT_API_PORT
+# The HTTP API and the broadcast dispatcher run on the bot's event loop and use its Bot
+from async_api import listen
+from broadcast import attach, detach, start_dispatcher
+from rate_limiter import get_rate_limiter
+from webhook import webhook_settings
+from db import init_database, create_default_channel, check_stats_counters
+# Handlers await the database through async_db so SQLite never blocks the event loop
+from async_db import (
+    create_channel, get_channel_by_secret,
     add_authenticated_chat, remove_authenticated_chat, is_chat_authenticated,
-    get_authenticated_channels_for_chat, remove_authenticated_chat_from_channel
+    get_authenticated_channels_for_chat, remove_authenticated_chat_from_channel, migrate_chat_id
 )
+# Admin listings are sent page by page with inline navigation buttons
+from admin_pages import render_page, parse_callback
+# User, group and membership tracking is buffered and written in batches
+from tracking import track_user, track_group, track_group_member, track_group_member_left
 
 # Environment variables are loaded by docker-compose
 
@@ -45,6 +54,8 @@ TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "api.telegram.org").strip(
 # Initialize database
 init_database()
 create_default_channel()
+# Statistics are served from counters; fix any drift left by manual edits once per start
+check_stats_counters()
 
 # All database functions are now imported from db.py
 
@@ -55,11 +66,11 @@ async def start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Unable to identify user.")
             return
             
-        add_user_to_db(user.id, user.username, user.first_name, user.last_name)
+        track_user(user.id, user.username, user.first_name, user.last_name)
         
         # Check if this chat is already authenticated
         chat_id = update.effective_chat.id
-        is_authenticated, channel_id, channel_name = is_chat_authenticated(chat_id)
+        is_authenticated, channel_id, channel_name = await is_chat_authenticated(chat_id)
         
         if is_authenticated:
             chat_type = "group" if update.effective_chat.type in ['group', 'supergroup'] else "private chat"
@@ -100,30 +111,24 @@ async def handle_new_member(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             if member.id == ctx.bot.id:
                 # Bot was added to a group
                 group_title = update.effective_chat.title or "Unknown Group"
-                add_group_to_db(update.effective_chat.id, group_title)
+                track_group(update.effective_chat.id, group_title)
                 await update.message.reply_text(
                     f"Hello everyone! I'm your new bot assistant. "
                     f"Please add me to your contacts and use /start to join a channel before using my features! 🤖"
                 )
             else:
                 # New human member added
-                add_user_to_db(member.id, member.username, member.first_name, member.last_name)
+                track_user(member.id, member.username, member.first_name, member.last_name)
                 # Add user to the group
-                add_user_to_group(update.effective_chat.id, member.id)
+                track_group_member(update.effective_chat.id, member.id)
                 
-                is_authenticated, channel_id = get_user_auth_status(member.id)
+                # Authentication is per chat, so check whether this group receives a channel
+                is_authenticated, channel_id, channel_name = await is_chat_authenticated(update.effective_chat.id)
                 if is_authenticated:
-                    channel_info = get_user_channel_info(member.id)
-                    if channel_info and channel_info[2]:  # channel_name
-                        await update.message.reply_text(
-                            f"Welcome {member.first_name}! I see you're already in channel '{channel_info[2]}'. "
-                            f"Feel free to ask me anything! 😊"
-                        )
-                    else:
-                        await update.message.reply_text(
-                            f"Welcome {member.first_name}! I see you're already authenticated. "
-                            f"Feel free to ask me anything! 😊"
-                        )
+                    await update.message.reply_text(
+                        f"Welcome {member.first_name}! This group receives broadcasts from channel '{channel_name}'. "
+                        f"Feel free to ask me anything! 😊"
+                    )
                 else:
                     await update.message.reply_text(
                         f"Welcome {member.first_name}! Please start a private chat with me and use /start to join a channel!\n"
@@ -138,6 +143,19 @@ async def handle_callback_query(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
+    page = parse_callback(query.data)
+    if page:
+        if str(query.from_user.id) != ADMIN_USER_ID:
+            return
+        text, keyboard = await render_page(*page)
+        try:
+            await query.edit_message_text(text, reply_markup=keyboard)
+        except BadRequest as e:
+            # Pressing a button twice renders the same page again
+            if "not modified" not in str(e).lower():
+                raise
+        return
+    
     if query.data == "auth_request":
         await query.edit_message_text(
             "To join a channel, please send me a private message with:\n"
@@ -154,12 +172,12 @@ async def join_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Unable to identify user.")
             return
             
-        add_user_to_db(user.id, user.username, user.first_name, user.last_name)
+        track_user(user.id, user.username, user.first_name, user.last_name)
         
         # Always ensure the user is tracked in the current chat (group or private)
         if update.effective_chat.type in ['group', 'supergroup']:
-            add_group_to_db(update.effective_chat.id, update.effective_chat.title or "Unknown Group")
-            add_user_to_group(update.effective_chat.id, user.id)
+            track_group(update.effective_chat.id, update.effective_chat.title or "Unknown Group")
+            track_group_member(update.effective_chat.id, user.id)
             print(f"User {user.id} joined group {update.effective_chat.id}")
         
         if len(ctx.args) == 0:
@@ -183,8 +201,7 @@ async def join_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             channel_secret = ctx.args[1]
             
             # Get channel information by secret (for security)
-            from db import get_channel_by_secret
-            channel_info = get_channel_by_secret(channel_secret)
+            channel_info = await get_channel_by_secret(channel_secret)
             if not channel_info:
                 await update.message.reply_text("❌ Invalid channel name or secret. Please check with your administrator.")
                 return
@@ -205,7 +222,7 @@ async def join_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             chat_type = update.effective_chat.type
             chat_title = update.effective_chat.title or f"Chat {chat_id}"
             
-            add_authenticated_chat(chat_id, chat_type, chat_title, channel_id)
+            await add_authenticated_chat(chat_id, chat_type, chat_title, channel_id)
             
             message = f"✅ This chat has been successfully authenticated for channel '{channel_name_from_db}'!"
             if description:
@@ -230,18 +247,18 @@ async def leave_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Unable to identify user.")
             return
             
-        add_user_to_db(user.id, user.username, user.first_name, user.last_name)
+        track_user(user.id, user.username, user.first_name, user.last_name)
         
         # Check if this chat is authenticated
         chat_id = update.effective_chat.id
-        is_authenticated, channel_id, channel_name = is_chat_authenticated(chat_id)
+        is_authenticated, channel_id, channel_name = await is_chat_authenticated(chat_id)
         
         if not is_authenticated:
             await update.message.reply_text("❌ This chat is not currently authenticated for any channel.")
             return
         
         # Remove chat authentication
-        remove_authenticated_chat(chat_id)
+        await remove_authenticated_chat(chat_id)
         
         chat_type = "group" if update.effective_chat.type in ['group', 'supergroup'] else "private chat"
         await update.message.reply_text(
@@ -260,7 +277,7 @@ async def stop_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Unable to identify user.")
             return
             
-        add_user_to_db(user.id, user.username, user.first_name, user.last_name)
+        track_user(user.id, user.username, user.first_name, user.last_name)
         
         chat_id = update.effective_chat.id
         chat_type = "group" if update.effective_chat.type in ['group', 'supergroup'] else "private chat"
@@ -268,21 +285,21 @@ async def stop_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         # Check if no arguments provided - remove from all channels
         if len(ctx.args) == 0:
             # Get all authenticated channels for this chat
-            authenticated_channels = get_authenticated_channels_for_chat(chat_id)
+            authenticated_channels = await get_authenticated_channels_for_chat(chat_id)
             
             if not authenticated_channels:
                 await update.message.reply_text(f"❌ This {chat_type} is not currently authenticated for any channel.")
                 return
             
             # Remove from all channels
-            remove_authenticated_chat(chat_id)
+            await remove_authenticated_chat(chat_id)
             
             # If this is a group, also remove user from the group
             if update.effective_chat.type in ['group', 'supergroup']:
-                remove_user_from_group(update.effective_chat.id, user.id)
+                track_group_member_left(update.effective_chat.id, user.id)
                 print(f"User {user.id} removed from group {update.effective_chat.id}")
             
-            channel_names = [channel[1] for channel in authenticated_channels]
+            channel_names = [channel.channel_name for channel in authenticated_channels]
             response = f"✅ {user.first_name}, this {chat_type} has been removed from all channels:\n"
             for channel_name in channel_names:
                 response += f"• {channel_name}\n"
@@ -298,7 +315,7 @@ async def stop_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             failed_removals = []
             
             for channel_name in channel_names:
-                success, message = remove_authenticated_chat_from_channel(chat_id, channel_name)
+                success, message = await remove_authenticated_chat_from_channel(chat_id, channel_name)
                 if success:
                     successful_removals.append(channel_name)
                 else:
@@ -338,16 +355,16 @@ async def status_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Unable to identify user.")
             return
             
-        add_user_to_db(user.id, user.username, user.first_name, user.last_name)
+        track_user(user.id, user.username, user.first_name, user.last_name)
         
         # If this is a group message, ensure the user is tracked in the group
         if update.effective_chat.type in ['group', 'supergroup']:
-            add_group_to_db(update.effective_chat.id, update.effective_chat.title or "Unknown Group")
-            add_user_to_group(update.effective_chat.id, user.id)
+            track_group(update.effective_chat.id, update.effective_chat.title or "Unknown Group")
+            track_group_member(update.effective_chat.id, user.id)
         
         # Check if this chat is authenticated
         chat_id = update.effective_chat.id
-        is_authenticated, channel_id, channel_name = is_chat_authenticated(chat_id)
+        is_authenticated, channel_id, channel_name = await is_chat_authenticated(chat_id)
         
         if is_authenticated:
             chat_type = "group" if update.effective_chat.type in ['group', 'supergroup'] else "private chat"
@@ -374,11 +391,11 @@ async def register_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Unable to identify user.")
             return
             
-        add_user_to_db(user.id, user.username, user.first_name, user.last_name)
+        track_user(user.id, user.username, user.first_name, user.last_name)
         
         if update.effective_chat.type in ['group', 'supergroup']:
-            add_group_to_db(update.effective_chat.id, update.effective_chat.title or "Unknown Group")
-            add_user_to_group(update.effective_chat.id, user.id)
+            track_group(update.effective_chat.id, update.effective_chat.title or "Unknown Group")
+            track_group_member(update.effective_chat.id, user.id)
             await update.message.reply_text(
                 f"✅ {user.first_name}, you are now registered in this group!\n"
                 f"Use /join <channel_name> <channel_secret> to authenticate this group for broadcasts."
@@ -396,36 +413,8 @@ async def admin_stats(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Access denied. Admin only.")
         return
     
-    stats = get_bot_stats()
-    total_users = stats['total_users']
-    total_groups = stats['total_groups']
-    total_channels = stats['total_channels']
-    total_authenticated_chats = stats['total_authenticated_chats']
-    channel_stats = stats['channel_distribution']
-    
-    # Get authenticated chats info
-    from db import get_all_authenticated_chats
-    authenticated_chats = get_all_authenticated_chats()
-    
-    stats_text = f"""
-📊 Bot Statistics:
-👥 Total Users: {total_users}
-🏠 Active Groups: {total_groups}
-📺 Total Channels: {total_channels}
-💬 Authenticated Chats: {total_authenticated_chats}
-
-📺 Channel Distribution:
-"""
-    
-    for channel_name, chat_count in channel_stats:
-        stats_text += f"• {channel_name}: {chat_count} chats\n"
-    
-    if authenticated_chats:
-        stats_text += f"\n💬 Authenticated Chats:\n"
-        for chat_id, chat_type, chat_title, channel_id, channel_name, is_active, auth_at in authenticated_chats:
-            stats_text += f"• {chat_title} ({chat_type}) → {channel_name}\n"
-    
-    await update.message.reply_text(stats_text)
+    text, keyboard = await render_page("stats")
+    await update.message.reply_text(text, reply_markup=keyboard)
 
 async def admin_create_channel(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     """Admin command to create a new channel"""
@@ -450,7 +439,7 @@ async def admin_create_channel(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     chat_type = update.effective_chat.type
     chat_title = update.effective_chat.title or f"Chat {chat_id}"
     
-    success, message = create_channel(channel_name, channel_secret, description, user.id, chat_id, chat_type, chat_title)
+    success, message = await create_channel(channel_name, channel_secret, description, user.id, chat_id, chat_type, chat_title)
     
     if success:
         response = f"✅ Channel '{channel_name}' created successfully!\n"
@@ -469,22 +458,8 @@ async def admin_list_channels(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Access denied. Admin only.")
         return
     
-    channels = get_all_channels()
-    
-    if not channels:
-        await update.message.reply_text("📺 No channels found.")
-        return
-    
-    response = "📺 Available Channels:\n\n"
-    for channel_id, channel_name, description, is_active, created_at, user_count in channels:
-        status = "🟢 Active" if is_active else "🔴 Inactive"
-        response += f"**{channel_name}** {status}\n"
-        response += f"ID: {channel_id} | Users: {user_count}\n"
-        if description:
-            response += f"Description: {description}\n"
-        response += f"Created: {created_at}\n\n"
-    
-    await update.message.reply_text(response, parse_mode='Markdown')
+    text, keyboard = await render_page("channels")
+    await update.message.reply_text(text, reply_markup=keyboard)
 
 async def admin_channel_chats(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     """Admin command to list authenticated chats for a specific channel"""
@@ -503,33 +478,8 @@ async def admin_channel_chats(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Channel ID must be a number.")
         return
     
-    # Get channel info from all channels
-    all_channels = get_all_channels()
-    channel = None
-    for ch in all_channels:
-        if ch[0] == channel_id:  # channel_id is first element
-            channel = (ch[1],)  # channel_name is second element
-            break
-    
-    if not channel:
-        await update.message.reply_text(f"❌ Channel with ID {channel_id} not found.")
-        return
-    
-    from db import get_authenticated_chats_for_channel
-    chats = get_authenticated_chats_for_channel(channel_id)
-    channel_name = channel[0]
-    
-    if not chats:
-        await update.message.reply_text(f"📺 No authenticated chats found for channel '{channel_name}'.")
-        return
-    
-    response = f"💬 Authenticated chats for channel '{channel_name}':\n\n"
-    for chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity in chats:
-        status = "🟢" if is_active else "🔴"
-        response += f"{status} {chat_title} ({chat_type})\n"
-        response += f"  ID: {chat_id} | Auth: {authenticated_at}\n\n"
-    
-    await update.message.reply_text(response)
+    text, keyboard = await render_page("chats", str(channel_id))
+    await update.message.reply_text(text, reply_markup=keyboard)
 
 async def admin_debug_groups(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     """Admin command to debug group and chat tracking"""
@@ -538,44 +488,32 @@ async def admin_debug_groups(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Access denied. Admin only.")
         return
     
-    debug_info = get_debug_info()
-    groups = debug_info['groups']
-    group_members = debug_info['group_members']
-    authenticated_chats = debug_info['authenticated_chats']
-    
-    response = "🔍 **Debug Information**\n\n"
-    
-    # Groups section
-    response += f"📊 **Groups ({len(groups)}):**\n"
-    for group_id, group_title, is_active in groups:
-        status = "🟢" if is_active else "🔴"
-        response += f"{status} {group_title} (ID: {group_id})\n"
-    
-    # Group members section
-    response += f"\n👥 **Group Members ({len(group_members)}):**\n"
-    current_group = None
-    for group_id, group_title, user_id, username, first_name in group_members:
-        if current_group != group_id:
-            response += f"\n**{group_title} (ID: {group_id}):**\n"
-            current_group = group_id
-        
-        display_name = first_name or username or f"User {user_id}"
-        response += f"  • {display_name} (@{username or 'N/A'})\n"
-    
-    # Authenticated chats section
-    response += f"\n💬 **Authenticated Chats ({len(authenticated_chats)}):**\n"
-    for chat_id, chat_type, chat_title, channel_id, channel_name, is_active, auth_at in authenticated_chats:
-        status = "🟢" if is_active else "🔴"
-        response += f"{status} {chat_title} ({chat_type}) → {channel_name}\n"
-        response += f"  ID: {chat_id} | Auth: {auth_at}\n"
-    
-    await update.message.reply_text(response, parse_mode='Markdown')
+    text, keyboard = await render_page("groups")
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+async def start_api(application: Application):
+    """Serve the HTTP API and send queued broadcasts on the bot's event loop with its Bot"""
+    attach(asyncio.get_running_loop(), application.bot)
+    application.bot_data["api_server"] = await listen(TELEGRAM_CHANNEL_BOT_API_PORT)
+    start_dispatcher()
+    print(f"API server started on port {TELEGRAM_CHANNEL_BOT_API_PORT}")
+
+async def stop_api(application: Application):
+    """Stop the HTTP API before the Application shuts its Bot down"""
+    server = application.bot_data.pop("api_server", None)
+    if server is not None:
+        server.stop()
+        await server.close_all_connections()
+    detach()
 
 app = (
     Application.builder()
     .token(TOKEN)
     .base_url(f"https://{TELEGRAM_API_URL}/bot")
     .base_file_url(f"https://{TELEGRAM_API_URL}/file/bot")
+    .rate_limiter(get_rate_limiter())
+    .post_init(start_api)
+    .post_stop(stop_api)
     .build()
 )
 
@@ -596,28 +534,33 @@ async def handle_left_member(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if update.message.left_chat_member:
         member = update.message.left_chat_member
         if member.id != ctx.bot.id:  # Don't remove the bot from group_members
-            remove_user_from_group(update.effective_chat.id, member.id)
+            track_group_member_left(update.effective_chat.id, member.id)
+
+async def handle_migration(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    """Keep a group's channel authentications when it is upgraded to a supergroup with a new id"""
+    if update.message.migrate_to_chat_id:
+        await migrate_chat_id(update.effective_chat.id, update.message.migrate_to_chat_id)
 
 app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_member))
 app.add_handler(MessageHandler(filters.StatusUpdate.LEFT_CHAT_MEMBER, handle_left_member))
+app.add_handler(MessageHandler(filters.StatusUpdate.MIGRATE, handle_migration))
 # Minimal message handler - just logs, doesn't respond
 app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 app.add_handler(CallbackQueryHandler(handle_callback_query))
 
 if __name__ == "__main__":
     try:
-        # Set the bot app for the API
-        set_bot_app(app)
-        
-        # Start API server in a separate thread
-        api_thread = threading.Thread(target=run_api, daemon=True)
-        api_thread.start()
-        print(f"API server started on port {os.environ.get('TELEGRAM_CHANNEL_BOT_API_PORT', 5000)}")
-        
-        # Run the bot in polling mode
-        print("Starting bot in polling mode...")
-        print("Bot will now handle messages without crashing...")
-        app.run_polling()
+        # The API server starts with the bot (see start_api)
+        # Telegram pushes updates to the webhook when one is configured, otherwise poll for them
+        webhook = webhook_settings()
+        if webhook:
+            print(f"Starting bot in webhook mode on {webhook['listen']}:{webhook['port']}/{webhook['url_path']}...")
+            print("Bot will now handle messages without crashing...")
+            app.run_webhook(**webhook)
+        else:
+            print("Starting bot in polling mode...")
+            print("Bot will now handle messages without crashing...")
+            app.run_polling()
     except Exception as e:
         print(f"Fatal error in main: {e}")
         print("Bot crashed. Please check the logs and restart.")
@@ -0,0 +1,347 @@
+import os
+import time
+import atexit
+import random
+import asyncio
+import threading
+import concurrent.futures
+from typing import List, Tuple, NamedTuple, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, ChatMigrated, InvalidToken, NetworkError, RetryAfter
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from rate_limiter import get_rate_limiter
+from async_db import run_db
+from db import (
+    PendingDelivery, claim_broadcast_job, get_pending_deliveries, record_delivery_results,
+    finish_broadcast_job, renew_broadcast_job_lease, deactivate_unreachable_chats, migrate_chat_id
+)
+
+# Environment variables are loaded by docker-compose
+
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "api.telegram.org").strip().rstrip("/")
+# Maximum number of send_message requests in flight at the same time
+BROADCAST_CONCURRENCY = max(1, int(os.environ.get("TELEGRAM_CHANNEL_BOT_BROADCAST_CONCURRENCY", 20)))
+# How often idle dispatchers look for queued broadcast jobs (seconds)
+DISPATCH_INTERVAL = float(os.environ.get("TELEGRAM_CHANNEL_BOT_DISPATCH_INTERVAL", 1))
+# A running job whose dispatcher stopped renewing its lease is picked up by another worker
+JOB_LEASE_SECONDS = 120
+# Deliveries are sent and recorded in batches of this size
+DELIVERY_BATCH_SIZE = 200
+# Readiness probes re-check that the Bot reaches Telegram at most this often (seconds)
+BOT_CHECK_INTERVAL = 60
+# How long a readiness probe waits for getMe before reporting Telegram as unreachable
+BOT_CHECK_TIMEOUT = 10
+# Retries of a send that failed with a transient network error; flood control is
+# retried by the rate limiter only
+SEND_RETRIES = max(0, int(os.environ.get("TELEGRAM_CHANNEL_BOT_SEND_RETRIES", 3)))
+# Retry n waits a random time of up to RETRY_BASE_DELAY * 2**n seconds, capped at RETRY_MAX_DELAY
+RETRY_BASE_DELAY = float(os.environ.get("TELEGRAM_CHANNEL_BOT_RETRY_BASE_DELAY", 1))
+RETRY_MAX_DELAY = 30
+
+# Long-lived per-worker state: one event loop, running forever on its own thread,
+# and one Bot (with its keep-alive connection pool) are created lazily in each
+# process. Flask threads and the dispatcher hand coroutines to the loop with
+# submit(), so sends from all of them overlap on the same loop and connections.
+# Inside bot.py, attach() replaces both with the bot Application's own loop and bot.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+_bot: Optional[Bot] = None
+
+_dispatcher_wakeup = threading.Event()
+_dispatcher_pid: Optional[int] = None
+
+# Outcome of the last Bot connectivity check: (monotonic time, ok, detail)
+_bot_check: Tuple[float, bool, str] = (0.0, False, "Not checked yet")
+
+def create_bot(token: str, concurrency: int = BROADCAST_CONCURRENCY) -> Bot:
+    """Create a rate-limited Bot whose HTTP connection pool can serve `concurrency` parallel requests"""
+    return ExtBot(
+        token=token,
+        base_url=f"https://{TELEGRAM_API_URL}/bot",
+        base_file_url=f"https://{TELEGRAM_API_URL}/file/bot",
+        # The default pool only holds a single connection, which would serialize the fan-out
+        request=HTTPXRequest(connection_pool_size=concurrency, pool_timeout=30.0),
+        rate_limiter=get_rate_limiter(),
+    )
+
+class DeliveryFailure(NamedTuple):
+    """Why a message could not be delivered to a chat"""
+    error: str
+    permanent: bool  # retrying cannot help: the bot was blocked or removed, the chat is gone, ...
+    attempts: int
+    unreachable: bool = False  # the chat itself can no longer receive messages from the bot
+    migrate_to_chat_id: Optional[int] = None  # the group became this supergroup
+
+# BadRequest descriptions meaning the chat is gone rather than the message being wrong
+UNREACHABLE_ERRORS = ("chat not found", "group chat was deactivated", "user is deactivated", "peer_id_invalid")
+
+def is_permanent_error(error: Exception) -> bool:
+    """Tell whether a send failed for good (Forbidden, chat not found, ...) or may succeed when retried"""
+    if isinstance(error, (Forbidden, BadRequest, ChatMigrated, InvalidToken)):
+        return True
+    # NetworkError covers timeouts and connection failures; RetryAfter is flood control
+    # that outlasted the rate limiter's own retries
+    if isinstance(error, (NetworkError, RetryAfter, OSError, asyncio.TimeoutError)):
+        return False
+    # Anything else is a bug that a retry would only repeat
+    return True
+
+def is_unreachable_error(error: Exception) -> bool:
+    """Tell whether a send failed because the bot can no longer reach the chat at all"""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(text in str(error).lower() for text in UNREACHABLE_ERRORS)
+
+def should_retry(error: Exception) -> bool:
+    """Tell whether send_with_retries should send again after `error`.
+
+    A RetryAfter reaching it has already been waited out and retried by the rate
+    limiter MAX_RETRIES times, so it is final here, but not permanent: the dead
+    letter can still be replayed later.
+    """
+    return not is_permanent_error(error) and not isinstance(error, RetryAfter)
+
+def retry_delay(attempt: int) -> float:
+    """Seconds to wait before retry number `attempt` (0-based), with full jitter"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+async def send_with_retries(bot: Bot, chat_id: int, message: str,
+                            semaphore: Optional[asyncio.Semaphore] = None) -> Optional[DeliveryFailure]:
+    """Send a message to one chat, retrying transient errors up to SEND_RETRIES times.
+
+    Returns None when the message was delivered. A `semaphore` limits the sends in
+    flight; it is not held while waiting for a retry.
+    """
+    attempt = 0
+    while True:
+        try:
+            if semaphore is None:
+                await bot.send_message(chat_id=chat_id, text=message)
+            else:
+                async with semaphore:
+                    await bot.send_message(chat_id=chat_id, text=message)
+            return None
+        except Exception as e:
+            if not should_retry(e) or attempt >= SEND_RETRIES:
+                print(f"Error sending message to chat {chat_id} (attempt {attempt + 1}): {e}")
+                return DeliveryFailure(
+                    str(e) or e.__class__.__name__, is_permanent_error(e), attempt + 1, is_unreachable_error(e),
+                    e.new_chat_id if isinstance(e, ChatMigrated) else None
+                )
+            await asyncio.sleep(retry_delay(attempt))
+            attempt += 1
+
+async def deliver(bot: Bot, chats: List[PendingDelivery], message: str,
+                  concurrency: int = BROADCAST_CONCURRENCY) -> List[Optional[DeliveryFailure]]:
+    """Send a message to all chats concurrently, with at most `concurrency` sends in flight.
+
+    Returns one entry per chat: None when the message was delivered, otherwise the failure.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(send_with_retries(bot, chat.chat_id, message, semaphore) for chat in chats))
+
+def _after_fork_in_child():
+    global _loop, _loop_thread, _loop_lock, _bot
+    # gunicorn --preload forks workers from the master: never reuse the parent's
+    # loop, its (not forked) thread or the sockets of its connection pool
+    _loop = None
+    _loop_thread = None
+    _loop_lock = threading.Lock()
+    _bot = None
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def _worker_loop() -> asyncio.AbstractEventLoop:
+    """Get this process' event loop, starting its thread on first use"""
+    global _loop, _loop_thread
+    loop = _loop
+    if loop is not None:
+        return loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=loop.run_forever, name="broadcast-loop", daemon=True)
+            _loop_thread.start()
+            _loop = loop
+    return _loop
+
+def attach(loop: asyncio.AbstractEventLoop, bot: Bot):
+    """Send on an already running event loop with a Bot its owner initialized and will shut down.
+
+    bot.py hands over its Application's loop and bot, so the update handlers, the
+    HTTP API and the dispatcher share one loop, connection pool and rate limiter.
+    """
+    global _loop, _bot
+    with _loop_lock:
+        _loop = loop
+        _bot = bot
+
+def detach():
+    """Stop using the loop and Bot given to attach()"""
+    global _loop, _bot
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop = None
+            _bot = None
+
+def submit(coro) -> concurrent.futures.Future:
+    """Schedule a coroutine on this worker's event loop from any thread and return its future.
+
+    Submit many coroutines before waiting on any of them to have them run concurrently.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _worker_loop())
+
+def run(coro, timeout: Optional[float] = None):
+    """Run a coroutine on this worker's event loop and wait for its result"""
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+async def get_bot() -> Bot:
+    """Get the shared Bot of this worker, initializing its connection pool on first use"""
+    global _bot
+    if _bot is None:
+        bot = create_bot(os.environ["TELEGRAM_CHANNEL_BOT_TOKEN"])
+        await bot.initialize()
+        _bot = bot
+    return _bot
+
+async def _check_bot():
+    bot = await get_bot()
+    await bot.get_me()
+
+async def check_bot_async(max_age: float = BOT_CHECK_INTERVAL) -> Tuple[bool, str]:
+    """Check that this worker's Bot can reach Telegram, awaiting getMe on the running loop.
+
+    The getMe round trip is repeated at most every `max_age` seconds, so frequent
+    readiness probes do not turn into Telegram API calls.
+    """
+    global _bot_check
+    if not os.environ.get("TELEGRAM_CHANNEL_BOT_TOKEN"):
+        return False, "Bot token is not configured"
+    checked_at, ok, detail = _bot_check
+    if checked_at and time.monotonic() - checked_at < max_age:
+        return ok, detail
+    try:
+        await asyncio.wait_for(_check_bot(), BOT_CHECK_TIMEOUT)
+        ok, detail = True, "Telegram reachable"
+    except asyncio.TimeoutError:
+        ok, detail = False, f"Telegram unreachable: no answer within {BOT_CHECK_TIMEOUT} seconds"
+    except Exception as e:
+        ok, detail = False, f"Telegram unreachable: {e}"
+    _bot_check = (time.monotonic(), ok, detail)
+    return ok, detail
+
+def check_bot(max_age: float = BOT_CHECK_INTERVAL) -> Tuple[bool, str]:
+    """check_bot_async for Flask threads"""
+    # Runs alongside any broadcast the dispatcher is sending on the same loop
+    return run(check_bot_async(max_age))
+
+async def _renew_lease(job_id: str):
+    """Renew a job's lease every third of JOB_LEASE_SECONDS until cancelled.
+
+    Retries can keep a batch busy longer than the lease; without renewal another
+    dispatcher would claim the job and send its pending chats a second time.
+    """
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await run_db(renew_broadcast_job_lease, job_id, JOB_LEASE_SECONDS)
+        except Exception as e:
+            print(f"Error renewing lease of broadcast job {job_id}: {e}")
+
+async def process_broadcast_job(job_id: str, message: str):
+    """Send a queued job's pending deliveries batch by batch, recording every outcome"""
+    try:
+        bot = await get_bot()
+    except Exception as e:
+        print(f"Error initializing bot client: {e}")
+        bot = None
+
+    while True:
+        chats = await run_db(get_pending_deliveries, job_id, DELIVERY_BATCH_SIZE)
+        if not chats:
+            break
+        if bot is None:
+            failures = [DeliveryFailure("Bot client unavailable", False, 1)] * len(chats)
+        else:
+            renewal = asyncio.create_task(_renew_lease(job_id))
+            try:
+                failures = await deliver(bot, chats, message)
+            finally:
+                renewal.cancel()
+        results = [(chat.chat_id, None, False, 1) if failure is None
+                   else (chat.chat_id, failure.error, failure.permanent, failure.attempts)
+                   for chat, failure in zip(chats, failures)]
+        await run_db(record_delivery_results, job_id, results, JOB_LEASE_SECONDS)
+
+        # Later broadcasts skip chats that are gone and reach migrated groups at their new id;
+        # a migrated group's delivery is queued again in this job
+        unreachable = [chat.chat_id for chat, failure in zip(chats, failures) if failure and failure.unreachable]
+        if unreachable:
+            await run_db(deactivate_unreachable_chats, unreachable)
+        for chat, failure in zip(chats, failures):
+            if failure and failure.migrate_to_chat_id is not None:
+                await run_db(migrate_chat_id, chat.chat_id, failure.migrate_to_chat_id, job_id)
+
+    await run_db(finish_broadcast_job, job_id)
+    print(f"Broadcast job {job_id} completed")
+
+def _dispatch_forever():
+    """Drain the broadcast job queue, sleeping until woken up or the poll interval passes"""
+    while True:
+        _dispatcher_wakeup.clear()
+        try:
+            job = claim_broadcast_job(JOB_LEASE_SECONDS)
+            if job:
+                job_id, channel_id, message = job
+                print(f"Dispatching broadcast job {job_id} for channel {channel_id}")
+                run(process_broadcast_job(job_id, message))
+                continue
+        except Exception as e:
+            print(f"Error in broadcast dispatcher: {e}")
+        _dispatcher_wakeup.wait(DISPATCH_INTERVAL)
+
+def start_dispatcher():
+    """Start this process' broadcast dispatcher thread (once per worker)"""
+    global _dispatcher_pid
+    if _dispatcher_pid == os.getpid():
+        return
+    _dispatcher_pid = os.getpid()
+    threading.Thread(target=_dispatch_forever, name="broadcast-dispatcher", daemon=True).start()
+
+def wake_dispatcher():
+    """Tell the dispatcher of this process that a new job was queued"""
+    _dispatcher_wakeup.set()
+
+def shutdown():
+    """Close the shared Bot's connection pool and stop this worker's event loop"""
+    global _loop, _loop_thread, _bot
+    if _loop is None:
+        return
+    if _loop_thread is None:
+        # An attached loop and Bot belong to the Application, which closes them itself
+        detach()
+        return
+    try:
+        if _bot is not None:
+            run(_bot.shutdown(), BOT_CHECK_TIMEOUT)
+    except Exception as e:
+        print(f"Error shutting down bot client: {e}")
+    finally:
+        _loop.call_soon_threadsafe(_loop.stop)
+        _loop_thread.join(BOT_CHECK_TIMEOUT)
+        if not _loop.is_running():
+            _loop.close()
+        _loop = None
+        _loop_thread = None
+        _bot = None
+
+atexit.register(shutdown)
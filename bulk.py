@@ -0,0 +1,105 @@
+import io
+import csv
+import json
+from typing import Iterable, Iterator, Tuple
+
+# Bulk import and export of authenticated chats as NDJSON (one JSON object per
+# line) or CSV with a header row. Both directions work on iterators, so files
+# and HTTP bodies are streamed instead of being loaded into memory.
+
+FORMATS = ("ndjson", "csv")
+MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+FIELDS = ("chat_id", "chat_type", "chat_title", "is_active", "authenticated_at", "last_activity")
+CHAT_TYPES = ("private", "group", "supergroup", "channel")
+# Only this many invalid lines are described in an import report
+MAX_REPORTED_ERRORS = 20
+
+def guess_format(filename: str) -> str:
+    """Pick the format from a file name, defaulting to NDJSON"""
+    return "csv" if filename.lower().endswith(".csv") else "ndjson"
+
+def _chat_from_record(record) -> Tuple[int, str, str]:
+    """Validate one imported record and return it as (chat_id, chat_type, chat_title)"""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    chat_id = record.get("chat_id")
+    if isinstance(chat_id, bool) or chat_id in (None, ""):
+        raise ValueError("chat_id is required")
+    try:
+        chat_id = int(chat_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"chat_id must be an integer, got {chat_id!r}")
+    chat_type = (record.get("chat_type") or "").strip()
+    if chat_type not in CHAT_TYPES:
+        raise ValueError(f"chat_type must be one of {', '.join(CHAT_TYPES)}, got {chat_type!r}")
+    chat_title = record.get("chat_title") or f"Chat {chat_id}"
+    return chat_id, chat_type, str(chat_title)
+
+def parse_chats(lines: Iterable[str], fmt: str, report: dict) -> Iterator[Tuple[int, str, str]]:
+    """Parse NDJSON or CSV lines into (chat_id, chat_type, chat_title) tuples.
+
+    Invalid lines are skipped and counted in report['skipped']; the first
+    MAX_REPORTED_ERRORS of them are described in report['errors'].
+    """
+    report.setdefault("skipped", 0)
+    report.setdefault("errors", [])
+
+    def skip(line_number, error):
+        report["skipped"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append(f"line {line_number}: {error}")
+
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            try:
+                yield _chat_from_record(record)
+            except ValueError as e:
+                skip(reader.line_num, e)
+        return
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield _chat_from_record(json.loads(line))
+        except ValueError as e:  # json.JSONDecodeError is a ValueError too
+            skip(line_number, e)
+
+# Exports are handed out in pieces of about this many characters
+CHUNK_SIZE = 8192
+
+def _chunked(pieces: Iterable[str]) -> Iterator[str]:
+    """Join small strings into chunks of about CHUNK_SIZE characters"""
+    chunk = []
+    size = 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield "".join(chunk)
+
+def _csv_lines(rows: Iterable[Tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for row in rows:
+        writer.writerow(row[:3] + (int(bool(row[3])),) + tuple(row[4:]))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_lines(rows: Iterable[Tuple]) -> Iterator[str]:
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record["is_active"] = bool(record["is_active"])
+        yield json.dumps(record) + "\n"
+
+def format_chats(rows: Iterable[Tuple], fmt: str) -> Iterator[str]:
+    """Serialize authenticated chat rows (as yielded by db.iter_authenticated_chats) in chunks"""
+    return _chunked(_csv_lines(rows) if fmt == "csv" else _ndjson_lines(rows))
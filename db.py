@@ -1,10 +1,158 @@
 import os
+import time
+import functools
+import uuid
 import sqlite3
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Tuple, Optional, Union
+from typing import List, Tuple, Optional, Union, Iterable, Iterator, NamedTuple
 
 # Database configuration
 DATABASE_PATH = 'data/bot_database.db'
+# Seconds a connection waits for a lock held by another thread or process before failing
+DATABASE_BUSY_TIMEOUT = 10.0
+
+# Channel records are cached in memory, keyed by id, secret and name
+CHANNEL_CACHE_SIZE = 1024
+# Cached channels are reloaded after this many seconds at the latest
+CHANNEL_CACHE_TTL = float(os.environ.get("TELEGRAM_CHANNEL_BOT_CHANNEL_CACHE_TTL", 300))
+# How often the cache checks whether another process changed the channels table (seconds)
+CHANNEL_GENERATION_CHECK_INTERVAL = 1.0
+# Broadcast recipient lists are cached for this many channels at most
+RECIPIENT_CACHE_CHANNELS = 256
+# Rows per transaction for bulk imports, and rows fetched at a time for exports
+IMPORT_BATCH_SIZE = 10000
+EXPORT_BATCH_SIZE = 1000
+
+# Each thread keeps one connection open and reuses it for every query
+_local = threading.local()
+# Bumped in a forked child so connections inherited from the parent are never reused
+_fork_generation = 0
+
+# (kind, key) -> (channel record, time it was loaded); kind is 'id', 'secret' or 'name'
+_channel_cache: "OrderedDict[Tuple[str, Union[int, str]], Tuple[Channel, float]]" = OrderedDict()
+_channel_cache_lock = threading.Lock()
+# Value of the 'channels' generation counter the cache contents belong to
+_channel_cache_generation: Optional[int] = None
+_channel_cache_checked = 0.0
+# Bumped whenever the cache is cleared, so rows loaded before that are not stored
+_channel_cache_epoch = 0
+
+# channel_id -> _Recipients of that channel
+_recipient_cache: dict = {}
+_recipient_cache_lock = threading.Lock()
+
+def _after_fork_in_child():
+    global _fork_generation, _channel_cache_lock, _recipient_cache_lock
+    _fork_generation += 1
+    # The locks may have been held by another thread of the parent at fork time
+    _channel_cache_lock = threading.Lock()
+    _recipient_cache_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+# Row records
+#
+# Listings return named tuples instead of bare tuples. They take no more memory
+# than the tuples (no per-row __dict__), still unpack positionally and are built
+# straight from the SQLite rows by _record_factory.
+
+class Channel(NamedTuple):
+    """A channel as returned by the channel lookups"""
+    channel_id: int
+    channel_name: str
+    description: Optional[str]
+    is_active: bool
+
+class ChannelSummary(NamedTuple):
+    """A channel in a channel listing, with its number of active chats"""
+    channel_id: int
+    channel_name: str
+    description: Optional[str]
+    is_active: bool
+    created_at: str
+    chat_count: int
+
+class AuthenticatedChat(NamedTuple):
+    """A chat authenticated for a channel"""
+    chat_id: int
+    chat_type: str
+    chat_title: Optional[str]
+    is_active: bool
+    authenticated_at: str
+    last_activity: str
+
+class ChatChannel(NamedTuple):
+    """A channel a chat is authenticated for"""
+    channel_id: int
+    channel_name: str
+    authenticated_at: str
+
+class BroadcastJob(NamedTuple):
+    """A queued broadcast and its progress"""
+    job_id: str
+    channel_id: int
+    channel_name: Optional[str]
+    status: str
+    total_chats: int
+    sent_count: int
+    failed_count: int
+    created_at: str
+    started_at: Optional[str]
+    finished_at: Optional[str]
+
+class PendingDelivery(NamedTuple):
+    """A chat a broadcast job has not been sent to yet"""
+    chat_id: int
+    chat_type: str
+    chat_title: Optional[str]
+
+class Delivery(NamedTuple):
+    """The outcome of a broadcast job for one chat"""
+    chat_id: int
+    chat_type: str
+    chat_title: Optional[str]
+    status: str
+    error: Optional[str]
+    updated_at: str
+
+class DeadLetter(NamedTuple):
+    """A delivery of a broadcast job that failed after all retries"""
+    chat_id: int
+    chat_type: Optional[str]
+    chat_title: Optional[str]
+    error: str
+    permanent: bool
+    attempts: int
+    created_at: str
+    replay_job_id: Optional[str]
+
+class Group(NamedTuple):
+    """A group the bot has seen"""
+    group_id: int
+    group_title: Optional[str]
+    is_active: bool
+    created_at: str
+
+class Member(NamedTuple):
+    """A user tracked in a group"""
+    group_id: int
+    user_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+
+@functools.lru_cache(maxsize=None)
+def _record_factory(record_type):
+    """Row factory building `record_type` records, for cursor.row_factory"""
+    make = record_type._make
+    return lambda cursor, row: make(row)
+
+def _fetch_records(record_type, query: str, params=()) -> list:
+    """Run a query and return its rows as `record_type` records"""
+    cursor = get_connection().cursor()
+    cursor.row_factory = _record_factory(record_type)
+    return cursor.execute(query, params).fetchall()
 
 def ensure_data_directory():
     """Create data directory if it doesn't exist"""
@@ -26,35 +174,73 @@ def ensure_data_directory():
         os.makedirs(abs_data_path, exist_ok=True)
         print(f"Created data directory at: {abs_data_path}")
 
-def get_connection():
-    """Get a database connection"""
-    ensure_data_directory()
+def _open_connection() -> sqlite3.Connection:
+    """Open a new database connection tuned for concurrent use by the bot and the API workers"""
     try:
-        # Try to connect to the database
-        conn = sqlite3.connect(DATABASE_PATH)
-        # Test the connection by creating a simple table check
-        conn.execute("SELECT name FROM sqlite_master WHERE type='table' LIMIT 1")
+        conn = sqlite3.connect(DATABASE_PATH, timeout=DATABASE_BUSY_TIMEOUT)
+    except sqlite3.OperationalError:
+        # Slow path: the data directory is validated once at startup by init_database,
+        # only recreate it here if it went missing since then
+        ensure_data_directory()
+        conn = sqlite3.connect(DATABASE_PATH, timeout=DATABASE_BUSY_TIMEOUT)
+    # WAL lets readers proceed while another connection writes
+    conn.execute('PRAGMA journal_mode = WAL')
+    # In WAL mode NORMAL is still crash-safe and avoids an fsync on every commit
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {int(DATABASE_BUSY_TIMEOUT * 1000)}')
+    conn.execute('PRAGMA cache_size = -16000')  # 16 MB page cache
+    conn.execute('PRAGMA mmap_size = 134217728')  # 128 MB memory-mapped I/O
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """Get this thread's database connection, opening it on first use.
+
+    The connection stays open and must not be closed by callers. Writers use
+    `with conn:` so the transaction is committed, or rolled back on error.
+    """
+    # Fast path: no filesystem access, just a thread-local lookup
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.generation == _fork_generation:
         return conn
+    try:
+        conn = _open_connection()
     except sqlite3.Error as e:
         print(f"Database connection error: {e}")
-        # If connection fails, try to create a new database file
-        print(f"Attempting to create database at {DATABASE_PATH}")
-        conn = sqlite3.connect(DATABASE_PATH)
-        return conn
+        raise
+    _local.conn = conn
+    _local.generation = _fork_generation
+    return conn
 
-def init_database():
-    """Initialize the database with all required tables"""
-    print(f"Initializing database at: {os.path.abspath(DATABASE_PATH)}")
-    ensure_data_directory()
-    
+def close_connection():
+    """Close this thread's database connection, if it has one"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.generation == _fork_generation:
+        conn.close()
+    _local.conn = None
+
+def check_database() -> Tuple[bool, str]:
+    """Check that the database answers queries and has the current schema, without touching any table"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        print("Database connection established successfully")
+        conn.execute('SELECT 1').fetchone()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
     except Exception as e:
-        print(f"Failed to establish database connection: {e}")
-        raise
-    
+        return False, f"Database unavailable: {e}"
+    if version != SCHEMA_VERSION:
+        return False, f"Schema version {version}, expected {SCHEMA_VERSION}"
+    return True, f"Schema version {version}"
+
+# Schema migrations
+#
+# Each step brings the schema from version N-1 to N and is applied exactly once,
+# tracked by PRAGMA user_version. Steps must stay idempotent (IF NOT EXISTS,
+# column checks) because databases created before versioning start at version 0
+# with some of the tables already in place. Never edit a released step; append a
+# new one instead.
+
+def _migrate_base_tables(cursor: sqlite3.Cursor):
+    """Users, groups, channels and the chats authenticated for them"""
     # Create users table (simplified - just for tracking, no authentication)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -117,43 +303,358 @@ def init_database():
             FOREIGN KEY (channel_id) REFERENCES channels (channel_id)
         )
     ''')
+
+def _migrate_lookup_indexes(cursor: sqlite3.Cursor):
+    """Secondary indexes for the lookups in this module"""
+    # The primary keys already cover chat_id lookups on authenticated_chats
+    # and group_id lookups on group_members
+    # Broadcast recipients: WHERE channel_id = ? AND is_active ORDER BY last_activity DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_authenticated_chats_channel
+        ON authenticated_chats (channel_id, is_active, last_activity)
+    ''')
+    # All active chats (admin stats): WHERE is_active = TRUE ORDER BY last_activity DESC.
+    # Partial, so the planner never prefers it over the primary key for chat_id lookups
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_authenticated_chats_active
+        ON authenticated_chats (last_activity) WHERE is_active = TRUE
+    ''')
+    # Debug listing: ORDER BY authenticated_at DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_authenticated_chats_authenticated_at
+        ON authenticated_chats (authenticated_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_channels_created_at
+        ON channels (created_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_groups_created_at
+        ON groups (created_at)
+    ''')
+    # Lookups of the groups a user belongs to
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_group_members_user
+        ON group_members (user_id)
+    ''')
+
+def _migrate_broadcast_queue(cursor: sqlite3.Cursor):
+    """Durable broadcast job queue drained by the broadcast dispatcher"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            job_id TEXT PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',  -- 'queued', 'running' or 'completed'
+            total_chats INTEGER NOT NULL DEFAULT 0,
+            sent_count INTEGER NOT NULL DEFAULT 0,
+            failed_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            lease_expires_at TIMESTAMP,  -- a running job whose lease expired is picked up again
+            FOREIGN KEY (channel_id) REFERENCES channels (channel_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status
+        ON broadcast_jobs (status, created_at)
+    ''')
     
-    conn.commit()
-    conn.close()
-    print("Database initialization completed successfully")
+    # Outcome of a job for every chat
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            job_id TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            chat_type TEXT,
+            chat_title TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',  -- 'pending', 'sent' or 'failed'
+            error TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job_id, chat_id),
+            FOREIGN KEY (job_id) REFERENCES broadcast_jobs (job_id)
+        )
+    ''')
+    # Pending deliveries of a job: WHERE job_id = ? AND status = 'pending'
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_status
+        ON broadcast_deliveries (job_id, status)
+    ''')
 
-def create_default_channel():
-    """Create a default channel if none exists"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def _migrate_channel_generation(cursor: sqlite3.Cursor):
+    """Generation counter bumped on every change to the channels table"""
+    # Processes caching table contents compare the counter with the value their
+    # cache was filled at; triggers keep it current for every writer, including the CLI
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO cache_generations (name) VALUES ('channels')")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS channels_generation_{event.lower()}
+            AFTER {event} ON channels
+            BEGIN
+                UPDATE cache_generations SET generation = generation + 1 WHERE name = 'channels';
+            END
+        ''')
+
+def _migrate_recipient_generations(cursor: sqlite3.Cursor):
+    """Per-channel generation counters bumped on every change to a channel's authenticated chats"""
+    # One 'recipients:<channel_id>' row per channel, created on the first change
+    bump = '''
+        INSERT INTO cache_generations (name, generation) VALUES ('recipients:' || {row}.channel_id, 1)
+        ON CONFLICT (name) DO UPDATE SET generation = generation + 1;
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS authenticated_chats_generation_insert
+        AFTER INSERT ON authenticated_chats
+        BEGIN {bump.format(row='NEW')} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS authenticated_chats_generation_update
+        AFTER UPDATE ON authenticated_chats
+        BEGIN {bump.format(row='NEW')} END
+    ''')
+    # A row moved to another channel changes the recipients of both channels
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS authenticated_chats_generation_move
+        AFTER UPDATE OF channel_id ON authenticated_chats
+        WHEN OLD.channel_id IS NOT NEW.channel_id
+        BEGIN {bump.format(row='OLD')} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS authenticated_chats_generation_delete
+        AFTER DELETE ON authenticated_chats
+        BEGIN {bump.format(row='OLD')} END
+    ''')
+
+def _migrate_stats_counters(cursor: sqlite3.Cursor):
+    """Statistics counters maintained by triggers"""
+    # Single row read by get_bot_stats instead of counting the tables
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_users INTEGER NOT NULL DEFAULT 0,
+            total_groups INTEGER NOT NULL DEFAULT 0,
+            total_channels INTEGER NOT NULL DEFAULT 0,
+            total_authenticated_chats INTEGER NOT NULL DEFAULT 0  -- active rows only
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO stats_counters (id) VALUES (1)')
+    # Active authenticated chats per channel. Kept out of the channels table so
+    # that a chat joining does not invalidate every process' channel cache.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS channel_stats (
+            channel_id INTEGER PRIMARY KEY,
+            active_chats INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (channel_id) REFERENCES channels (channel_id)
+        )
+    ''')
     
-    # Check if any channels exist
-    cursor.execute('SELECT COUNT(*) FROM channels')
-    channel_count = cursor.fetchone()[0]
+    for table, counter in (('users', 'total_users'), ('groups', 'total_groups'), ('channels', 'total_channels')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE stats_counters SET {counter} = {counter} + 1 WHERE id = 1;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE stats_counters SET {counter} = {counter} - 1 WHERE id = 1;
+            END
+        ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS channels_stats_insert AFTER INSERT ON channels
+        BEGIN
+            INSERT OR IGNORE INTO channel_stats (channel_id) VALUES (NEW.channel_id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS channels_stats_delete AFTER DELETE ON channels
+        BEGIN
+            DELETE FROM channel_stats WHERE channel_id = OLD.channel_id;
+        END
+    ''')
     
-    if channel_count == 0:
-        # Create a default channel
+    # Only active authenticated chats are counted
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS authenticated_chats_count_insert AFTER INSERT ON authenticated_chats
+        WHEN NEW.is_active
+        BEGIN
+            UPDATE stats_counters SET total_authenticated_chats = total_authenticated_chats + 1 WHERE id = 1;
+            UPDATE channel_stats SET active_chats = active_chats + 1 WHERE channel_id = NEW.channel_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS authenticated_chats_count_delete AFTER DELETE ON authenticated_chats
+        WHEN OLD.is_active
+        BEGIN
+            UPDATE stats_counters SET total_authenticated_chats = total_authenticated_chats - 1 WHERE id = 1;
+            UPDATE channel_stats SET active_chats = active_chats - 1 WHERE channel_id = OLD.channel_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS authenticated_chats_count_update
+        AFTER UPDATE OF is_active, channel_id ON authenticated_chats
+        WHEN OLD.is_active IS NOT NEW.is_active OR OLD.channel_id IS NOT NEW.channel_id
+        BEGIN
+            UPDATE stats_counters
+            SET total_authenticated_chats = total_authenticated_chats
+                - (CASE WHEN OLD.is_active THEN 1 ELSE 0 END)
+                + (CASE WHEN NEW.is_active THEN 1 ELSE 0 END)
+            WHERE id = 1;
+            UPDATE channel_stats SET active_chats = active_chats - 1
+            WHERE channel_id = OLD.channel_id AND OLD.is_active;
+            UPDATE channel_stats SET active_chats = active_chats + 1
+            WHERE channel_id = NEW.channel_id AND NEW.is_active;
+        END
+    ''')
+    
+    # Start from the actual counts of the existing rows
+    _repair_stats_counters(cursor)
+
+def _migrate_chat_keyset_index(cursor: sqlite3.Cursor):
+    """Add chat_id to the channel index so chat listings can be paged by (last_activity, chat_id)"""
+    cursor.execute('DROP INDEX IF EXISTS idx_authenticated_chats_channel')
+    cursor.execute('''
+        CREATE INDEX idx_authenticated_chats_channel
+        ON authenticated_chats (channel_id, is_active, last_activity, chat_id)
+    ''')
+
+def _migrate_dead_letters(cursor: sqlite3.Cursor):
+    """Failed broadcast deliveries kept for replaying the message to just those chats"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_dead_letters (
+            job_id TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            error TEXT NOT NULL,
+            permanent BOOLEAN NOT NULL DEFAULT FALSE,  -- retrying cannot help (blocked, chat not found, ...)
+            attempts INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            replay_job_id TEXT,  -- the job that re-sent the message, NULL until replayed
+            PRIMARY KEY (job_id, chat_id),
+            FOREIGN KEY (job_id) REFERENCES broadcast_jobs (job_id)
+        )
+    ''')
+
+def _migrate_channel_deactivation(cursor: sqlite3.Cursor):
+    """Mark the authenticated chats deactivated together with their channel"""
+    # reactivate_channel restores exactly these rows, not the chats that were
+    # already inactive (unreachable, left) when the channel was deactivated
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(authenticated_chats)')]
+    if 'deactivated_with_channel' not in columns:
         cursor.execute('''
-            INSERT INTO channels (channel_name, channel_secret, description, created_by)
-            VALUES (?, ?, ?, ?)
-        ''', ('general', 'welcome123', 'Default general channel for all users', 1))
-        conn.commit()
-        print("Created default channel 'general' with secret 'welcome123'")
+            ALTER TABLE authenticated_chats
+            ADD COLUMN deactivated_with_channel BOOLEAN NOT NULL DEFAULT FALSE
+        ''')
+
+# Ordered schema steps; the schema version of a database is the number of steps applied
+MIGRATIONS = [
+    _migrate_base_tables,
+    _migrate_lookup_indexes,
+    _migrate_broadcast_queue,
+    _migrate_channel_generation,
+    _migrate_recipient_generations,
+    _migrate_stats_counters,
+    _migrate_chat_keyset_index,
+    _migrate_dead_letters,
+    _migrate_channel_deactivation,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version() -> int:
+    """Get the schema version of the database"""
+    return get_connection().execute('PRAGMA user_version').fetchone()[0]
+
+def migrate_database() -> int:
+    """Apply all pending schema migrations and return the number of steps applied.
+
+    Every step runs in its own IMMEDIATE transaction together with the version
+    bump, so a failed step leaves the database at the previous version, and the
+    bot and the API workers starting at the same time apply each step only once.
+    """
+    conn = get_connection()
+    version = get_schema_version()
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
     
-    conn.close()
+    applied = 0
+    while version < SCHEMA_VERSION:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we were waiting for the lock
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            if version < SCHEMA_VERSION:
+                step = MIGRATIONS[version]
+                step(cursor)
+                version += 1
+                cursor.execute(f'PRAGMA user_version = {version}')
+                print(f"Applied database migration {version}: {step.__doc__}")
+                applied += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+def init_database():
+    """Initialize the database and bring its schema up to date"""
+    print(f"Initializing database at: {os.path.abspath(DATABASE_PATH)}")
+    ensure_data_directory()
+    
+    try:
+        get_connection()
+        print("Database connection established successfully")
+    except Exception as e:
+        print(f"Failed to establish database connection: {e}")
+        raise
+    
+    applied = migrate_database()
+    if applied:
+        print(f"Database schema migrated to version {SCHEMA_VERSION} ({applied} step(s) applied)")
+    else:
+        print(f"Database schema is up to date (version {SCHEMA_VERSION})")
+    print("Database initialization completed successfully")
+
+def create_default_channel():
+    """Create a default channel if none exists"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        
+        # Check if any channels exist
+        cursor.execute('SELECT COUNT(*) FROM channels')
+        channel_count = cursor.fetchone()[0]
+        
+        if channel_count == 0:
+            # Create a default channel
+            cursor.execute('''
+                INSERT INTO channels (channel_name, channel_secret, description, created_by)
+                VALUES (?, ?, ?, ?)
+            ''', ('general', 'welcome123', 'Default general channel for all users', 1))
+            print("Created default channel 'general' with secret 'welcome123'")
 
 # User operations (simplified - just tracking, no authentication)
 def add_user_to_db(user_id: int, username: str, first_name: str, last_name: str):
     """Add or update a user in the database (for tracking only)"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, first_name, last_name, last_seen)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (user_id, username, first_name, last_name))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('''
+                INSERT INTO users (user_id, username, first_name, last_name, last_seen)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    last_seen = excluded.last_seen
+            ''', (user_id, username, first_name, last_name))
     except Exception as e:
         print(f"Error in add_user_to_db: {e}")
         # Don't re-raise to prevent crashes
@@ -163,13 +664,14 @@ def add_group_to_db(group_id: int, group_title: str):
     """Add or update a group in the database"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO groups (group_id, group_title, is_active)
-            VALUES (?, ?, TRUE)
-        ''', (group_id, group_title))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('''
+                INSERT INTO groups (group_id, group_title, is_active)
+                VALUES (?, ?, TRUE)
+                ON CONFLICT (group_id) DO UPDATE SET
+                    group_title = excluded.group_title,
+                    is_active = TRUE
+            ''', (group_id, group_title))
     except Exception as e:
         print(f"Error in add_group_to_db: {e}")
         # Don't re-raise to prevent crashes
@@ -178,13 +680,11 @@ def add_user_to_group(group_id: int, user_id: int):
     """Add a user to a group in the group_members table"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR IGNORE INTO group_members (group_id, user_id)
-            VALUES (?, ?)
-        ''', (group_id, user_id))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO group_members (group_id, user_id)
+                VALUES (?, ?)
+            ''', (group_id, user_id))
     except Exception as e:
         print(f"Error in add_user_to_group: {e}")
         # Don't re-raise to prevent crashes
@@ -193,46 +693,83 @@ def remove_user_from_group(group_id: int, user_id: int):
     """Remove a user from a group in the group_members table"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            DELETE FROM group_members 
-            WHERE group_id = ? AND user_id = ?
-        ''', (group_id, user_id))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('''
+                DELETE FROM group_members 
+                WHERE group_id = ? AND user_id = ?
+            ''', (group_id, user_id))
         print(f"User {user_id} removed from group {group_id}")
     except Exception as e:
         print(f"Error in remove_user_from_group: {e}")
         # Don't re-raise to prevent crashes
 
+def write_tracking_batch(users: List[Tuple], groups: List[Tuple],
+                         joined_members: List[Tuple], left_members: List[Tuple]):
+    """Write buffered user, group and membership changes in a single transaction.
+
+    `users` are (user_id, username, first_name, last_name) rows, `groups` are
+    (group_id, group_title) rows, memberships are (group_id, user_id) pairs.
+    The upserts keep created_at and skip group rows that would not change.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO users (user_id, username, first_name, last_name, last_seen)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                last_seen = excluded.last_seen
+        ''', users)
+        cursor.executemany('''
+            INSERT INTO groups (group_id, group_title, is_active)
+            VALUES (?, ?, TRUE)
+            ON CONFLICT (group_id) DO UPDATE SET
+                group_title = excluded.group_title,
+                is_active = TRUE
+            WHERE group_title IS NOT excluded.group_title OR NOT is_active
+        ''', groups)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO group_members (group_id, user_id)
+            VALUES (?, ?)
+        ''', joined_members)
+        cursor.executemany('''
+            DELETE FROM group_members
+            WHERE group_id = ? AND user_id = ?
+        ''', left_members)
+
 # Channel operations
 def create_channel(channel_name: str, channel_secret: str, description: str = "", created_by: int = 1, chat_id: int = None, chat_type: str = None, chat_title: str = None) -> Tuple[bool, str]:
     """Create a new channel and optionally authenticate the chat where it's created"""
     conn = get_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            INSERT INTO channels (channel_name, channel_secret, description, created_by)
-            VALUES (?, ?, ?, ?)
-        ''', (channel_name, channel_secret, description, created_by))
-        
-        # Get the channel_id of the newly created channel
-        channel_id = cursor.lastrowid
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO channels (channel_name, channel_secret, description, created_by)
+                VALUES (?, ?, ?, ?)
+            ''', (channel_name, channel_secret, description, created_by))
+            
+            # Get the channel_id of the newly created channel
+            channel_id = cursor.lastrowid
+            
+            # If chat information is provided, automatically authenticate the chat for this channel
+            if chat_id is not None and chat_type is not None:
+                try:
+                    cursor.execute(f'''
+                        INSERT INTO authenticated_chats 
+                        (chat_id, chat_type, chat_title, channel_id, is_active, last_activity)
+                        VALUES (?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP)
+                        {_REAUTHENTICATE_CHAT}
+                    ''', (chat_id, chat_type, chat_title or f"Chat {chat_id}", channel_id))
+                    print(f"Chat {chat_id} ({chat_type}) automatically authenticated for new channel '{channel_name}'")
+                except Exception as auth_error:
+                    print(f"Warning: Failed to auto-authenticate chat {chat_id} for channel '{channel_name}': {auth_error}")
+                    # Don't fail channel creation if authentication fails
         
-        # If chat information is provided, automatically authenticate the chat for this channel
-        if chat_id is not None and chat_type is not None:
-            try:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO authenticated_chats 
-                    (chat_id, chat_type, chat_title, channel_id, is_active, last_activity)
-                    VALUES (?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP)
-                ''', (chat_id, chat_type, chat_title or f"Chat {chat_id}", channel_id))
-                print(f"Chat {chat_id} ({chat_type}) automatically authenticated for new channel '{channel_name}'")
-            except Exception as auth_error:
-                print(f"Warning: Failed to auto-authenticate chat {chat_id} for channel '{channel_name}': {auth_error}")
-                # Don't fail channel creation if authentication fails
-        
-        conn.commit()
+        invalidate_channel_cache()
         return True, "Channel created successfully"
     except sqlite3.IntegrityError as e:
         if "UNIQUE constraint failed" in str(e):
@@ -241,151 +778,239 @@ def create_channel(channel_name: str, channel_secret: str, description: str = ""
         return False, f"Database error: {e}"
     except Exception as e:
         return False, f"Error creating channel: {e}"
-    finally:
-        conn.close()
 
-def get_channel_by_secret(channel_secret: str) -> Optional[Tuple]:
+def invalidate_channel_cache():
+    """Drop all cached channel records of this process.
+
+    Other processes notice the change through the 'channels' generation counter.
+    """
+    global _channel_cache_checked, _channel_cache_epoch
+    with _channel_cache_lock:
+        _channel_cache.clear()
+        _channel_cache_epoch += 1
+        _channel_cache_checked = 0.0
+
+# Every lookup is a point query on the primary key or a unique index
+_CHANNEL_LOOKUPS = {
+    'id': 'SELECT channel_id, channel_name, description, is_active FROM channels WHERE channel_id = ?',
+    'secret': 'SELECT channel_id, channel_name, description, is_active FROM channels WHERE channel_secret = ?',
+    'name': 'SELECT channel_id, channel_name, description, is_active FROM channels WHERE channel_name = ? AND is_active = TRUE',
+}
+
+def _cached_channel(kind: str, key: Union[int, str]) -> Optional[Channel]:
+    """Look up a channel in the cache, loading it with the `kind` lookup query on a miss"""
+    global _channel_cache_generation, _channel_cache_checked, _channel_cache_epoch
+    now = time.monotonic()
+    if now - _channel_cache_checked >= CHANNEL_GENERATION_CHECK_INTERVAL:
+        row = get_connection().execute(
+            "SELECT generation FROM cache_generations WHERE name = 'channels'").fetchone()
+        generation = row[0] if row else None
+        with _channel_cache_lock:
+            if generation != _channel_cache_generation:
+                _channel_cache.clear()
+                _channel_cache_epoch += 1
+                _channel_cache_generation = generation
+            _channel_cache_checked = now
+
+    with _channel_cache_lock:
+        entry = _channel_cache.get((kind, key))
+        if entry is not None and now - entry[1] < CHANNEL_CACHE_TTL:
+            _channel_cache.move_to_end((kind, key))
+            return entry[0]
+        epoch = _channel_cache_epoch
+
+    # Unknown secrets and names are not cached, so a new channel is found right away
+    cursor = get_connection().cursor()
+    cursor.row_factory = _record_factory(Channel)
+    channel = cursor.execute(_CHANNEL_LOOKUPS[kind], (key,)).fetchone()
+    if channel is not None:
+        with _channel_cache_lock:
+            if epoch != _channel_cache_epoch:
+                # The channels changed while we were loading this row
+                return channel
+            _channel_cache[(kind, key)] = (channel, now)
+            while len(_channel_cache) > CHANNEL_CACHE_SIZE:
+                _channel_cache.popitem(last=False)
+    return channel
+
+def get_channel_by_id(channel_id: int) -> Optional[Channel]:
+    """Get channel information by id, whether the channel is active or not"""
+    return _cached_channel('id', channel_id)
+
+def get_channel_by_secret(channel_secret: str) -> Optional[Channel]:
     """Get channel information by secret"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT channel_id, channel_name, description, is_active
-        FROM channels 
-        WHERE channel_secret = ?
-    ''', (channel_secret,))
-    result = cursor.fetchone()
-    conn.close()
-    return result
+    return _cached_channel('secret', channel_secret)
 
-def get_channel_by_name(channel_name: str) -> Optional[Tuple]:
-    """Get channel information by name"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT channel_id, channel_name, description, is_active
-        FROM channels 
-        WHERE channel_name = ? AND is_active = TRUE
-    ''', (channel_name,))
-    result = cursor.fetchone()
-    conn.close()
-    return result
+def get_channel_by_name(channel_name: str) -> Optional[Channel]:
+    """Get active channel information by name"""
+    return _cached_channel('name', channel_name)
 
-def get_all_channels() -> List[Tuple]:
-    """Get all channels with user counts"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT channel_id, channel_name, description, is_active, created_at,
-               (SELECT COUNT(*) FROM users WHERE channel_id = channels.channel_id AND is_authenticated = TRUE) as user_count
-        FROM channels 
+def get_all_channels() -> List[ChannelSummary]:
+    """Get all channels with the number of active chats authenticated for them"""
+    return _fetch_records(ChannelSummary, '''
+        SELECT c.channel_id, c.channel_name, c.description, c.is_active, c.created_at,
+               COALESCE(s.active_chats, 0) as chat_count
+        FROM channels c
+        LEFT JOIN channel_stats s ON s.channel_id = c.channel_id
         ORDER BY created_at DESC
     ''')
-    results = cursor.fetchall()
-    conn.close()
-    return results
+
+def _keyset_page(record_type, query: str, params: list, key: Tuple[str, str], limit: int,
+                 after: Optional[Tuple] = None, before: Optional[Tuple] = None) -> list:
+    """Run a newest-first listing query for one page of rows.
+
+    `key` names the (timestamp, id) columns the listing is ordered by. The page
+    starts after the key `after`, or ends before the key `before`; the latter is
+    read in ascending order and reversed so that both directions seek an index.
+    `query` must end with its WHERE clause (use WHERE 1 if it has none). Rows are
+    returned as `record_type` records.
+    """
+    columns = f'({key[0]}, {key[1]})'
+    direction = 'ASC' if before is not None else 'DESC'
+    if before is not None:
+        query += f' AND {columns} > (?, ?)'
+        params = params + list(before)
+    elif after is not None:
+        query += f' AND {columns} < (?, ?)'
+        params = params + list(after)
+    query += f' ORDER BY {key[0]} {direction}, {key[1]} {direction} LIMIT ?'
+    rows = _fetch_records(record_type, query, params + [limit])
+    if before is not None:
+        rows.reverse()
+    return rows
+
+def get_channels_page(limit: int, after: Optional[Tuple[str, int]] = None,
+                      before: Optional[Tuple[str, int]] = None) -> List[ChannelSummary]:
+    """Get up to `limit` channels in get_all_channels order, after or before a (created_at, channel_id) key"""
+    return _keyset_page(ChannelSummary, '''
+        SELECT c.channel_id, c.channel_name, c.description, c.is_active, c.created_at,
+               COALESCE(s.active_chats, 0) as chat_count
+        FROM channels c
+        LEFT JOIN channel_stats s ON s.channel_id = c.channel_id
+        WHERE 1
+    ''', [], ('c.created_at', 'c.channel_id'), limit, after, before)
+
+def count_channels() -> int:
+    """Get the number of channels from the statistics counters"""
+    row = get_connection().execute('SELECT total_channels FROM stats_counters WHERE id = 1').fetchone()
+    return row[0] if row else 0
 
 def deactivate_channel(channel_name: str) -> Tuple[bool, str]:
     """Deactivate a channel (soft delete)"""
     conn = get_connection()
-    cursor = conn.cursor()
     try:
-        # Check if channel exists
-        cursor.execute('SELECT channel_id, is_active FROM channels WHERE channel_name = ?', (channel_name,))
-        channel = cursor.fetchone()
-        
-        if not channel:
-            return False, f"Channel '{channel_name}' not found"
-        
-        channel_id, is_active = channel
-        if not is_active:
-            return False, f"Channel '{channel_name}' is already inactive"
-        
-        # Deactivate the channel
-        cursor.execute('UPDATE channels SET is_active = FALSE WHERE channel_name = ?', (channel_name,))
+        with conn:
+            cursor = conn.cursor()
+            # Check if channel exists
+            cursor.execute('SELECT channel_id, is_active FROM channels WHERE channel_name = ?', (channel_name,))
+            channel = cursor.fetchone()
+            
+            if not channel:
+                return False, f"Channel '{channel_name}' not found"
+            
+            channel_id, is_active = channel
+            if not is_active:
+                return False, f"Channel '{channel_name}' is already inactive"
+            
+            # Deactivate the channel
+            cursor.execute('UPDATE channels SET is_active = FALSE WHERE channel_name = ?', (channel_name,))
+            
+            # Deauthenticate all chats from this channel, remembering which ones were active
+            cursor.execute('''
+                UPDATE authenticated_chats
+                SET is_active = FALSE, deactivated_with_channel = TRUE
+                WHERE channel_id = ? AND is_active = TRUE
+            ''', (channel_id,))
         
-        # Deauthenticate all users from this channel
-        cursor.execute('''
-            UPDATE users 
-            SET is_authenticated = FALSE, channel_id = NULL 
-            WHERE channel_id = ?
-        ''', (channel_id,))
-        
-        conn.commit()
+        invalidate_channel_cache()
         return True, f"Channel '{channel_name}' deactivated successfully"
     except Exception as e:
         return False, f"Error deactivating channel: {e}"
-    finally:
-        conn.close()
 
 def delete_channel(channel_name: str) -> Tuple[bool, str]:
     """Permanently delete a channel (hard delete)"""
     conn = get_connection()
-    cursor = conn.cursor()
     try:
-        # Check if channel exists
-        cursor.execute('SELECT channel_id FROM channels WHERE channel_name = ?', (channel_name,))
-        channel = cursor.fetchone()
-        
-        if not channel:
-            return False, f"Channel '{channel_name}' not found"
-        
-        channel_id = channel[0]
-        
-        # Deauthenticate all users from this channel first
-        cursor.execute('''
-            UPDATE users 
-            SET is_authenticated = FALSE, channel_id = NULL 
-            WHERE channel_id = ?
-        ''', (channel_id,))
-        
-        # Delete the channel
-        cursor.execute('DELETE FROM channels WHERE channel_name = ?', (channel_name,))
+        with conn:
+            cursor = conn.cursor()
+            # Check if channel exists
+            cursor.execute('SELECT channel_id FROM channels WHERE channel_name = ?', (channel_name,))
+            channel = cursor.fetchone()
+            
+            if not channel:
+                return False, f"Channel '{channel_name}' not found"
+            
+            channel_id = channel[0]
+            
+            # Deauthenticate all chats from this channel first
+            cursor.execute('DELETE FROM authenticated_chats WHERE channel_id = ?', (channel_id,))
+            
+            # Delete the channel
+            cursor.execute('DELETE FROM channels WHERE channel_name = ?', (channel_name,))
         
-        conn.commit()
+        invalidate_channel_cache()
         return True, f"Channel '{channel_name}' deleted permanently"
     except Exception as e:
         return False, f"Error deleting channel: {e}"
-    finally:
-        conn.close()
 
 def reactivate_channel(channel_name: str) -> Tuple[bool, str]:
     """Reactivate a deactivated channel"""
     conn = get_connection()
-    cursor = conn.cursor()
     try:
-        # Check if channel exists
-        cursor.execute('SELECT channel_id, is_active FROM channels WHERE channel_name = ?', (channel_name,))
-        channel = cursor.fetchone()
-        
-        if not channel:
-            return False, f"Channel '{channel_name}' not found"
-        
-        channel_id, is_active = channel
-        if is_active:
-            return False, f"Channel '{channel_name}' is already active"
-        
-        # Reactivate the channel
-        cursor.execute('UPDATE channels SET is_active = TRUE WHERE channel_name = ?', (channel_name,))
-        conn.commit()
+        with conn:
+            cursor = conn.cursor()
+            # Check if channel exists
+            cursor.execute('SELECT channel_id, is_active FROM channels WHERE channel_name = ?', (channel_name,))
+            channel = cursor.fetchone()
+            
+            if not channel:
+                return False, f"Channel '{channel_name}' not found"
+            
+            channel_id, is_active = channel
+            if is_active:
+                return False, f"Channel '{channel_name}' is already active"
+            
+            # Reactivate the channel and the chats deactivated with it
+            cursor.execute('UPDATE channels SET is_active = TRUE WHERE channel_name = ?', (channel_name,))
+            cursor.execute('''
+                UPDATE authenticated_chats
+                SET is_active = TRUE, deactivated_with_channel = FALSE
+                WHERE channel_id = ? AND deactivated_with_channel = TRUE
+            ''', (channel_id,))
+        invalidate_channel_cache()
         return True, f"Channel '{channel_name}' reactivated successfully"
     except Exception as e:
         return False, f"Error reactivating channel: {e}"
-    finally:
-        conn.close()
 
 # Authenticated chat operations
+
+# Authenticating a chat again refreshes its row in place. Unlike INSERT OR REPLACE
+# this runs as an UPDATE, so the counter triggers see the change.
+_REAUTHENTICATE_CHAT = '''
+    ON CONFLICT (chat_id, channel_id) DO UPDATE SET
+        chat_type = excluded.chat_type,
+        chat_title = excluded.chat_title,
+        is_active = TRUE,
+        deactivated_with_channel = FALSE,
+        authenticated_at = CURRENT_TIMESTAMP,
+        last_activity = CURRENT_TIMESTAMP
+'''
+
 def add_authenticated_chat(chat_id: int, chat_type: str, chat_title: str, channel_id: int):
     """Add or update an authenticated chat for a channel"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO authenticated_chats 
-            (chat_id, chat_type, chat_title, channel_id, is_active, last_activity)
-            VALUES (?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP)
-        ''', (chat_id, chat_type, chat_title, channel_id))
-        conn.commit()
-        conn.close()
+        with conn:
+            row = conn.execute(f'''
+                INSERT INTO authenticated_chats 
+                (chat_id, chat_type, chat_title, channel_id, is_active, last_activity)
+                VALUES (?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP)
+                {_REAUTHENTICATE_CHAT}
+                RETURNING chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity
+            ''', (chat_id, chat_type, chat_title, channel_id)).fetchone()
+            row = AuthenticatedChat._make(row)
+            generation = _recipient_generation(conn, channel_id)
+        _apply_recipient_change(channel_id, generation, chat_id, row)
         print(f"Chat {chat_id} ({chat_type}) authenticated for channel {channel_id}")
     except Exception as e:
         print(f"Error in add_authenticated_chat: {e}")
@@ -394,53 +1019,99 @@ def remove_authenticated_chat(chat_id: int):
     """Remove chat authentication from all channels"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM authenticated_chats WHERE chat_id = ?', (chat_id,))
-        conn.commit()
-        conn.close()
+        with conn:
+            cursor = conn.execute('DELETE FROM authenticated_chats WHERE chat_id = ? RETURNING channel_id', (chat_id,))
+            generations = [(channel_id, _recipient_generation(conn, channel_id)) for channel_id, in cursor.fetchall()]
+        for channel_id, generation in generations:
+            _apply_recipient_change(channel_id, generation, chat_id)
         print(f"Chat {chat_id} authentication removed from all channels")
     except Exception as e:
         print(f"Error in remove_authenticated_chat: {e}")
 
-def get_authenticated_channels_for_chat(chat_id: int) -> List[Tuple]:
-    """Get all channels that a chat is authenticated for"""
+def deactivate_unreachable_chats(chat_ids: Iterable[int]) -> int:
+    """Deactivate the authentications of chats the bot can no longer send to, in every channel.
+
+    Returns the number of rows deactivated. The rows are kept, so the chat's
+    history stays visible and /join makes it active again.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    with conn:
+        cursor = conn.executemany('''
+            UPDATE authenticated_chats SET is_active = FALSE
+            WHERE chat_id = ? AND is_active = TRUE
+        ''', [(chat_id,) for chat_id in chat_ids])
+        deactivated = max(cursor.rowcount, 0)
+    if deactivated:
+        print(f"Deactivated {deactivated} authentication(s) of unreachable chats")
+    return deactivated
+
+def migrate_chat_id(old_chat_id: int, new_chat_id: int, job_id: Optional[str] = None) -> int:
+    """Move a group's authentications to the supergroup it was upgraded to and return the rows moved.
+
+    With a `job_id`, a delivery to the new chat id is added to that broadcast job
+    in place of the failed one to the old id.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        # The supergroup may already be authenticated for some of the channels itself
+        cursor.execute('''
+            DELETE FROM authenticated_chats
+            WHERE chat_id = ? AND channel_id IN (SELECT channel_id FROM authenticated_chats WHERE chat_id = ?)
+        ''', (old_chat_id, new_chat_id))
+        cursor.execute('''
+            UPDATE authenticated_chats SET chat_id = ?, chat_type = 'supergroup'
+            WHERE chat_id = ?
+        ''', (new_chat_id, old_chat_id))
+        moved = cursor.rowcount
+        if job_id is not None:
+            cursor.execute('''
+                INSERT OR IGNORE INTO broadcast_deliveries (job_id, chat_id, chat_type, chat_title)
+                SELECT job_id, ?, 'supergroup', chat_title
+                FROM broadcast_deliveries WHERE job_id = ? AND chat_id = ?
+            ''', (new_chat_id, job_id, old_chat_id))
+            if cursor.rowcount > 0:
+                cursor.execute('''
+                    UPDATE broadcast_jobs SET total_chats = total_chats + 1 WHERE job_id = ?
+                ''', (job_id,))
+    print(f"Chat {old_chat_id} migrated to {new_chat_id}")
+    return moved
+
+def get_authenticated_channels_for_chat(chat_id: int) -> List[ChatChannel]:
+    """Get all channels that a chat is authenticated for"""
+    return _fetch_records(ChatChannel, '''
         SELECT ac.channel_id, c.channel_name, ac.authenticated_at
         FROM authenticated_chats ac
         JOIN channels c ON ac.channel_id = c.channel_id
         WHERE ac.chat_id = ? AND ac.is_active = TRUE
         ORDER BY ac.authenticated_at DESC
     ''', (chat_id,))
-    results = cursor.fetchall()
-    conn.close()
-    return results
 
 def remove_authenticated_chat_from_channel(chat_id: int, channel_name: str) -> Tuple[bool, str]:
     """Remove chat authentication from a specific channel"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        
-        # First, get the channel_id for the given channel_name
-        cursor.execute('SELECT channel_id FROM channels WHERE channel_name = ? AND is_active = TRUE', (channel_name,))
-        channel = cursor.fetchone()
-        
-        if not channel:
-            return False, f"Channel '{channel_name}' not found or inactive"
-        
-        channel_id = channel[0]
-        
-        # Check if the chat is actually authenticated for this channel
-        cursor.execute('SELECT chat_id FROM authenticated_chats WHERE chat_id = ? AND channel_id = ?', (chat_id, channel_id))
-        if not cursor.fetchone():
-            return False, f"Chat is not authenticated for channel '{channel_name}'"
-        
-        # Remove the authentication
-        cursor.execute('DELETE FROM authenticated_chats WHERE chat_id = ? AND channel_id = ?', (chat_id, channel_id))
-        conn.commit()
-        conn.close()
+        with conn:
+            cursor = conn.cursor()
+            
+            # First, get the channel_id for the given channel_name
+            cursor.execute('SELECT channel_id FROM channels WHERE channel_name = ? AND is_active = TRUE', (channel_name,))
+            channel = cursor.fetchone()
+            
+            if not channel:
+                return False, f"Channel '{channel_name}' not found or inactive"
+            
+            channel_id = channel[0]
+            
+            # Check if the chat is actually authenticated for this channel
+            cursor.execute('SELECT chat_id FROM authenticated_chats WHERE chat_id = ? AND channel_id = ?', (chat_id, channel_id))
+            if not cursor.fetchone():
+                return False, f"Chat is not authenticated for channel '{channel_name}'"
+            
+            # Remove the authentication
+            cursor.execute('DELETE FROM authenticated_chats WHERE chat_id = ? AND channel_id = ?', (chat_id, channel_id))
+            generation = _recipient_generation(conn, channel_id)
+        _apply_recipient_change(channel_id, generation, chat_id)
         
         print(f"Chat {chat_id} authentication removed from channel '{channel_name}'")
         return True, f"Removed from channel '{channel_name}'"
@@ -448,35 +1119,177 @@ def remove_authenticated_chat_from_channel(chat_id: int, channel_name: str) -> T
     except Exception as e:
         return False, f"Error removing authentication: {e}"
 
-def get_authenticated_chats_for_channel(channel_id: int) -> List[Tuple]:
+def get_authenticated_chats_for_channel(channel_id: int) -> List[AuthenticatedChat]:
     """Get all authenticated chats for a specific channel"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    return _fetch_records(AuthenticatedChat, '''
         SELECT chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity
         FROM authenticated_chats 
         WHERE channel_id = ? AND is_active = TRUE
         ORDER BY last_activity DESC
     ''', (channel_id,))
-    results = cursor.fetchall()
-    conn.close()
-    return results
 
-def get_all_authenticated_chats() -> List[Tuple]:
-    """Get all authenticated chats across all channels"""
+def get_authenticated_chats_page(channel_id: int, limit: int,
+                                 after: Optional[Tuple[str, int]] = None,
+                                 before: Optional[Tuple[str, int]] = None) -> List[AuthenticatedChat]:
+    """Get up to `limit` active chats of a channel, most recently active first.
+
+    `after` is the (last_activity, chat_id) key of the last row of the previous
+    page (`before` the first row of the next one); rows come straight from
+    idx_authenticated_chats_channel, so every page costs the same no matter how
+    deep into the listing it is.
+    """
+    return _keyset_page(AuthenticatedChat, '''
+        SELECT chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity
+        FROM authenticated_chats
+        WHERE channel_id = ? AND is_active = TRUE
+    ''', [channel_id], ('last_activity', 'chat_id'), limit, after, before)
+
+def count_channel_chats(channel_id: int) -> int:
+    """Get the number of active chats of a channel from the statistics counters"""
+    row = get_connection().execute(
+        'SELECT active_chats FROM channel_stats WHERE channel_id = ?', (channel_id,)).fetchone()
+    return row[0] if row else 0
+
+# Bulk import and export of authenticated chats
+def import_authenticated_chats(channel_id: int, chats: Iterable[Tuple[int, str, str]]) -> int:
+    """Authenticate many chats for a channel and return how many rows were written.
+
+    `chats` are (chat_id, chat_type, chat_title) tuples and may be a generator; they
+    are written with executemany in transactions of IMPORT_BATCH_SIZE rows, so
+    memory stays bounded however many rows are streamed in. Chats that are
+    already authenticated for the channel are reactivated and refreshed.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT ac.chat_id, ac.chat_type, ac.chat_title, ac.channel_id, 
-               c.channel_name, ac.is_active, ac.authenticated_at, ac.last_activity
-        FROM authenticated_chats ac
-        JOIN channels c ON ac.channel_id = c.channel_id
-        WHERE ac.is_active = TRUE
-        ORDER BY ac.last_activity DESC
+    imported = 0
+    batch = []
+    for chat_id, chat_type, chat_title in chats:
+        batch.append((chat_id, chat_type, chat_title, channel_id))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += _write_authenticated_chats(conn, batch)
+            batch = []
+    if batch:
+        imported += _write_authenticated_chats(conn, batch)
+    return imported
+
+def _write_authenticated_chats(conn: sqlite3.Connection, rows: List[Tuple]) -> int:
+    with conn:
+        conn.executemany(f'''
+            INSERT INTO authenticated_chats 
+            (chat_id, chat_type, chat_title, channel_id, is_active, last_activity)
+            VALUES (?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP)
+            {_REAUTHENTICATE_CHAT}
+        ''', rows)
+    return len(rows)
+
+def iter_authenticated_chats(channel_id: int, include_inactive: bool = False) -> Iterator[AuthenticatedChat]:
+    """Yield the authenticated chats of a channel without loading them all into memory.
+
+    Rows are read in keyset pages of EXPORT_BATCH_SIZE straight from
+    idx_authenticated_chats_channel (active chats first), each page its own
+    query. No cursor stays open between pages, so the iterator can be resumed
+    on any thread.
+    """
+    for is_active in ((True, False) if include_inactive else (True,)):
+        after = None
+        while True:
+            rows = _keyset_page(AuthenticatedChat, '''
+                SELECT chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity
+                FROM authenticated_chats
+                WHERE channel_id = ? AND is_active = ?
+            ''', [channel_id, is_active], ('last_activity', 'chat_id'), EXPORT_BATCH_SIZE, after)
+            yield from rows
+            if len(rows) < EXPORT_BATCH_SIZE:
+                break
+            after = (rows[-1].last_activity, rows[-1].chat_id)
+
+# Broadcast recipient cache
+#
+# Broadcasts go to the same channels over and over, so every process keeps the
+# recipient rows of the channels it broadcast to. A lookup only reads the
+# channel's generation counter (bumped by triggers on authenticated_chats) and
+# reloads the rows when another process changed them; changes made by this
+# process are applied to the cached rows in place.
+
+class _Recipients:
+    """Cached recipient rows of one channel"""
+
+    __slots__ = ("generation", "rows", "snapshot")
+
+    def __init__(self, generation: int, rows: List[AuthenticatedChat]):
+        self.generation = generation
+        # chat_id -> row, least recently active first
+        self.rows = OrderedDict((row[0], row) for row in rows)
+        self.snapshot: Optional[Tuple] = None
+
+    def chats(self) -> Tuple:
+        """Rows in the order of get_authenticated_chats_for_channel (most recently active first)"""
+        if self.snapshot is None:
+            self.snapshot = tuple(reversed(self.rows.values()))
+        return self.snapshot
+
+def _recipient_generation(conn: sqlite3.Connection, channel_id: int) -> int:
+    row = conn.execute('SELECT generation FROM cache_generations WHERE name = ?',
+                       (f'recipients:{channel_id}',)).fetchone()
+    return row[0] if row else 0
+
+def _apply_recipient_change(channel_id: int, generation: int, chat_id: int,
+                            row: Optional[AuthenticatedChat] = None):
+    """Apply a committed change of one chat to the cached recipients of a channel.
+
+    `generation` is the channel's generation after the change. The cached rows are
+    only patched when they are exactly one change behind, otherwise they are
+    dropped and reloaded on the next lookup. `row` is the chat's new row, or None
+    when it was removed.
+    """
+    with _recipient_cache_lock:
+        entry = _recipient_cache.get(channel_id)
+        if entry is None:
+            return
+        if entry.generation != generation - 1:
+            del _recipient_cache[channel_id]
+            return
+        entry.rows.pop(chat_id, None)
+        if row is not None and row.is_active:
+            entry.rows[chat_id] = row
+        entry.generation = generation
+        entry.snapshot = None
+
+def get_channel_recipients(channel_id: int) -> Tuple:
+    """Get the active authenticated chats of a channel for a broadcast, from the cache when current.
+
+    Returns the same rows as get_authenticated_chats_for_channel as a shared tuple.
+    """
+    conn = get_connection()
+    generation = _recipient_generation(conn, channel_id)
+    with _recipient_cache_lock:
+        entry = _recipient_cache.get(channel_id)
+        if entry is not None and entry.generation == generation:
+            return entry.chats()
+
+    # Rows changed after the generation was read make the entry look outdated,
+    # so the worst case is one reload too many
+    entry = _Recipients(generation, _fetch_records(AuthenticatedChat, '''
+        SELECT chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity
+        FROM authenticated_chats 
+        WHERE channel_id = ? AND is_active = TRUE
+        ORDER BY last_activity
+    ''', (channel_id,)))
+    with _recipient_cache_lock:
+        if channel_id not in _recipient_cache and len(_recipient_cache) >= RECIPIENT_CACHE_CHANNELS:
+            _recipient_cache.clear()
+        current = _recipient_cache.get(channel_id)
+        if current is None or current.generation <= generation:
+            _recipient_cache[channel_id] = entry
+    return entry.chats()
+
+def get_all_authenticated_chats() -> List[AuthenticatedChat]:
+    """Get all active authenticated chats across all channels, one record per channel a chat is in"""
+    return _fetch_records(AuthenticatedChat, '''
+        SELECT chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity
+        FROM authenticated_chats
+        WHERE is_active = TRUE
+        ORDER BY last_activity DESC
     ''')
-    results = cursor.fetchall()
-    conn.close()
-    return results
 
 def is_chat_authenticated(chat_id: int) -> Tuple[bool, Optional[int], Optional[str]]:
     """Check if a chat is authenticated and return channel info"""
@@ -489,7 +1302,6 @@ def is_chat_authenticated(chat_id: int) -> Tuple[bool, Optional[int], Optional[s
         WHERE ac.chat_id = ? AND ac.is_active = TRUE
     ''', (chat_id,))
     result = cursor.fetchone()
-    conn.close()
     
     if result:
         return result[0], result[1], result[2]
@@ -497,80 +1309,327 @@ def is_chat_authenticated(chat_id: int) -> Tuple[bool, Optional[int], Optional[s
 
 # Chat operations for API (simplified - only authenticated chats)
 
+# Broadcast job queue operations
+def create_broadcast_job(channel_id: int, message: str, chats: Iterable[AuthenticatedChat]) -> str:
+    """Queue a broadcast job with one pending delivery per chat and return its job_id"""
+    job_id = uuid.uuid4().hex
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO broadcast_jobs (job_id, channel_id, message, total_chats)
+            VALUES (?, ?, ?, ?)
+        ''', (job_id, channel_id, message, len(chats)))
+        conn.executemany('''
+            INSERT OR IGNORE INTO broadcast_deliveries (job_id, chat_id, chat_type, chat_title)
+            VALUES (?, ?, ?, ?)
+        ''', [(job_id, chat.chat_id, chat.chat_type, chat.chat_title) for chat in chats])
+    return job_id
+
+def claim_broadcast_job(lease_seconds: int) -> Optional[Tuple]:
+    """Atomically claim the oldest queued (or abandoned) job; returns (job_id, channel_id, message)"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('''
+            UPDATE broadcast_jobs
+            SET status = 'running',
+                started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+                lease_expires_at = datetime('now', ?)
+            WHERE job_id = (
+                SELECT job_id FROM broadcast_jobs
+                WHERE status = 'queued'
+                   OR (status = 'running' AND lease_expires_at < datetime('now'))
+                ORDER BY created_at
+                LIMIT 1
+            )
+            RETURNING job_id, channel_id, message
+        ''', (f'+{lease_seconds} seconds',))
+        job = cursor.fetchone()
+    return job
+
+def get_pending_deliveries(job_id: str, limit: int) -> List[PendingDelivery]:
+    """Get up to `limit` chats of a job that have not been sent to yet"""
+    return _fetch_records(PendingDelivery, '''
+        SELECT chat_id, chat_type, chat_title
+        FROM broadcast_deliveries
+        WHERE job_id = ? AND status = 'pending'
+        LIMIT ?
+    ''', (job_id, limit))
+
+def record_delivery_results(job_id: str, results: List[Tuple[int, Optional[str], bool, int]], lease_seconds: int):
+    """Store the outcomes of a batch, update job progress and renew the job lease.
+
+    `results` are (chat_id, error, permanent, attempts) tuples with error None for
+    sent messages. Failed deliveries are also added to the dead letters of the job.
+    """
+    sent = [(job_id, chat_id) for chat_id, error, *_ in results if error is None]
+    failed = [(error, job_id, chat_id) for chat_id, error, *_ in results if error is not None]
+    dead_letters = [(job_id, chat_id, error, permanent, attempts)
+                    for chat_id, error, permanent, attempts in results if error is not None]
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE broadcast_deliveries
+            SET status = 'sent', error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE job_id = ? AND chat_id = ? AND status = 'pending'
+        ''', sent)
+        sent_count = cursor.rowcount
+        cursor.executemany('''
+            UPDATE broadcast_deliveries
+            SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE job_id = ? AND chat_id = ? AND status = 'pending'
+        ''', failed)
+        failed_count = cursor.rowcount
+        cursor.executemany('''
+            INSERT OR REPLACE INTO broadcast_dead_letters (job_id, chat_id, error, permanent, attempts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', dead_letters)
+        cursor.execute('''
+            UPDATE broadcast_jobs
+            SET sent_count = sent_count + ?, failed_count = failed_count + ?,
+                lease_expires_at = datetime('now', ?)
+            WHERE job_id = ?
+        ''', (max(sent_count, 0), max(failed_count, 0), f'+{lease_seconds} seconds', job_id))
+
+def renew_broadcast_job_lease(job_id: str, lease_seconds: int):
+    """Extend the lease of a running job so no other dispatcher claims it while a batch is in flight"""
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            UPDATE broadcast_jobs SET lease_expires_at = datetime('now', ?)
+            WHERE job_id = ? AND status = 'running'
+        ''', (f'+{lease_seconds} seconds', job_id))
+
+def finish_broadcast_job(job_id: str):
+    """Mark a job as completed"""
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            UPDATE broadcast_jobs
+            SET status = 'completed', finished_at = CURRENT_TIMESTAMP, lease_expires_at = NULL
+            WHERE job_id = ?
+        ''', (job_id,))
+
+def get_broadcast_job(job_id: str) -> Optional[BroadcastJob]:
+    """Get the progress of a broadcast job"""
+    cursor = get_connection().cursor()
+    cursor.row_factory = _record_factory(BroadcastJob)
+    cursor.execute('''
+        SELECT bj.job_id, bj.channel_id, c.channel_name, bj.status, bj.total_chats,
+               bj.sent_count, bj.failed_count, bj.created_at, bj.started_at, bj.finished_at
+        FROM broadcast_jobs bj
+        LEFT JOIN channels c ON bj.channel_id = c.channel_id
+        WHERE bj.job_id = ?
+    ''', (job_id,))
+    result = cursor.fetchone()
+    return result
+
+def get_broadcast_deliveries(job_id: str, status: Optional[str] = None) -> List[Delivery]:
+    """Get the per-chat outcomes of a broadcast job, optionally filtered by status"""
+    query = '''
+        SELECT chat_id, chat_type, chat_title, status, error, updated_at
+        FROM broadcast_deliveries
+        WHERE job_id = ?
+    '''
+    params = [job_id]
+    if status:
+        query += ' AND status = ?'
+        params.append(status)
+    return _fetch_records(Delivery, query, params)
+
+def get_dead_letters(job_id: str) -> List[DeadLetter]:
+    """Get the failed deliveries of a broadcast job with the chat they were meant for"""
+    return _fetch_records(DeadLetter, '''
+        SELECT dl.chat_id, bd.chat_type, bd.chat_title, dl.error, dl.permanent, dl.attempts,
+               dl.created_at, dl.replay_job_id
+        FROM broadcast_dead_letters dl
+        LEFT JOIN broadcast_deliveries bd ON bd.job_id = dl.job_id AND bd.chat_id = dl.chat_id
+        WHERE dl.job_id = ?
+        ORDER BY dl.chat_id
+    ''', (job_id,))
+
+def replay_dead_letters(job_id: str, include_permanent: bool = False) -> Tuple[Optional[str], int]:
+    """Queue a job re-sending a job's message to the chats of its not yet replayed dead letters.
+
+    Permanent failures are skipped unless `include_permanent` is set, and so are
+    chats that are no longer authenticated for the channel. Returns (job_id, chats)
+    of the new job, or (None, 0) when there is nothing to replay.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT dl.chat_id, ac.chat_type, ac.chat_title, bj.channel_id, bj.message
+            FROM broadcast_dead_letters dl
+            JOIN broadcast_jobs bj ON bj.job_id = dl.job_id
+            JOIN authenticated_chats ac
+              ON ac.chat_id = dl.chat_id AND ac.channel_id = bj.channel_id AND ac.is_active = TRUE
+            WHERE dl.job_id = ? AND dl.replay_job_id IS NULL AND (? OR NOT dl.permanent)
+        ''', (job_id, include_permanent))
+        rows = cursor.fetchall()
+        if not rows:
+            return None, 0
+
+        replay_job_id = uuid.uuid4().hex
+        channel_id, message = rows[0][3], rows[0][4]
+        cursor.execute('''
+            INSERT INTO broadcast_jobs (job_id, channel_id, message, total_chats)
+            VALUES (?, ?, ?, ?)
+        ''', (replay_job_id, channel_id, message, len(rows)))
+        cursor.executemany('''
+            INSERT INTO broadcast_deliveries (job_id, chat_id, chat_type, chat_title)
+            VALUES (?, ?, ?, ?)
+        ''', [(replay_job_id, chat_id, chat_type, chat_title) for chat_id, chat_type, chat_title, *_ in rows])
+        cursor.executemany('''
+            UPDATE broadcast_dead_letters SET replay_job_id = ? WHERE job_id = ? AND chat_id = ?
+        ''', [(replay_job_id, job_id, row[0]) for row in rows])
+    return replay_job_id, len(rows)
+
 # Statistics operations
+def _repair_stats_counters(cursor: sqlite3.Cursor) -> List[str]:
+    """Recompute all statistics counters from the tables and return the names of those that were off"""
+    cursor.execute('''
+        SELECT (SELECT COUNT(*) FROM users),
+               (SELECT COUNT(*) FROM groups),
+               (SELECT COUNT(*) FROM channels),
+               (SELECT COUNT(*) FROM authenticated_chats WHERE is_active = TRUE)
+    ''')
+    actual = dict(zip(('total_users', 'total_groups', 'total_channels', 'total_authenticated_chats'),
+                      cursor.fetchone()))
+    cursor.execute('''
+        SELECT total_users, total_groups, total_channels, total_authenticated_chats
+        FROM stats_counters WHERE id = 1
+    ''')
+    stored = dict(zip(actual, cursor.fetchone()))
+    drifted = [name for name in actual if stored[name] != actual[name]]
+    if drifted:
+        cursor.execute('''
+            UPDATE stats_counters
+            SET total_users = ?, total_groups = ?, total_channels = ?, total_authenticated_chats = ?
+            WHERE id = 1
+        ''', tuple(actual.values()))
+    
+    cursor.execute('''
+        SELECT c.channel_id, COUNT(ac.chat_id), s.active_chats
+        FROM channels c
+        LEFT JOIN authenticated_chats ac ON ac.channel_id = c.channel_id AND ac.is_active = TRUE
+        LEFT JOIN channel_stats s ON s.channel_id = c.channel_id
+        GROUP BY c.channel_id
+    ''')
+    channel_drift = [(channel_id, count) for channel_id, count, stored_count in cursor.fetchall()
+                     if stored_count != count]
+    cursor.executemany('''
+        INSERT INTO channel_stats (channel_id, active_chats) VALUES (?, ?)
+        ON CONFLICT (channel_id) DO UPDATE SET active_chats = excluded.active_chats
+    ''', channel_drift)
+    cursor.execute('DELETE FROM channel_stats WHERE channel_id NOT IN (SELECT channel_id FROM channels)')
+    drifted += [f"channel {channel_id}" for channel_id, _ in channel_drift]
+    if cursor.rowcount > 0:
+        drifted.append("deleted channels")
+    return drifted
+
+def check_stats_counters() -> List[str]:
+    """Recompute the statistics counters, repair any drift and return what had drifted"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    # IMMEDIATE, so no write lands between counting and storing the counts
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        drifted = _repair_stats_counters(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if drifted:
+        print(f"Repaired drifted statistics counters: {', '.join(drifted)}")
+    return drifted
+
+def get_stats_totals() -> dict:
+    """Get the bot-wide totals from the counters maintained by triggers"""
+    row = get_connection().execute('''
+        SELECT total_users, total_groups, total_channels, total_authenticated_chats
+        FROM stats_counters WHERE id = 1
+    ''').fetchone()
+    return dict(zip(("total_users", "total_groups", "total_channels", "total_authenticated_chats"), row))
+
 def get_bot_stats() -> dict:
-    """Get comprehensive bot statistics"""
+    """Get comprehensive bot statistics from the counters maintained by triggers"""
     conn = get_connection()
     cursor = conn.cursor()
     
     # Get basic stats
-    cursor.execute('SELECT COUNT(*) FROM users')
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM groups')
-    total_groups = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM channels')
-    total_channels = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM authenticated_chats WHERE is_active = TRUE')
-    total_authenticated_chats = cursor.fetchone()[0]
+    stats = get_stats_totals()
     
     # Get channel distribution (based on authenticated chats)
     cursor.execute('''
-        SELECT c.channel_name, COUNT(ac.chat_id) as chat_count
+        SELECT c.channel_name, COALESCE(s.active_chats, 0) as chat_count
         FROM channels c
-        LEFT JOIN authenticated_chats ac ON c.channel_id = ac.channel_id AND ac.is_active = TRUE
-        GROUP BY c.channel_id, c.channel_name
+        LEFT JOIN channel_stats s ON s.channel_id = c.channel_id
         ORDER BY chat_count DESC
     ''')
     channel_distribution = cursor.fetchall()
     
-    conn.close()
-    
-    return {
-        "total_users": total_users,
-        "total_groups": total_groups,
-        "total_channels": total_channels,
-        "total_authenticated_chats": total_authenticated_chats,
-        "channel_distribution": channel_distribution
-    }
+    stats["channel_distribution"] = channel_distribution
+    return stats
+
+def get_groups_page(limit: int, after: Optional[Tuple[str, int]] = None,
+                    before: Optional[Tuple[str, int]] = None) -> List[Group]:
+    """Get up to `limit` groups, newest first, after or before a (created_at, group_id) key"""
+    return _keyset_page(Group, '''
+        SELECT group_id, group_title, is_active, created_at
+        FROM groups
+        WHERE 1
+    ''', [], ('created_at', 'group_id'), limit, after, before)
+
+def get_group_members_preview(group_ids: List[int], per_group: int) -> List[Member]:
+    """Get the first `per_group` members of each group, ordered by name"""
+    if not group_ids:
+        return []
+    placeholders = ', '.join('?' * len(group_ids))
+    return _fetch_records(Member, f'''
+        SELECT group_id, user_id, username, first_name
+        FROM (
+            SELECT gm.group_id, gm.user_id, u.username, u.first_name,
+                   ROW_NUMBER() OVER (PARTITION BY gm.group_id ORDER BY u.first_name, gm.user_id) as position
+            FROM group_members gm
+            JOIN users u ON gm.user_id = u.user_id
+            WHERE gm.group_id IN ({placeholders})
+        )
+        WHERE position <= ?
+        ORDER BY group_id, position
+    ''', list(group_ids) + [per_group])
+
+def count_group_members(group_ids: List[int]) -> dict:
+    """Get the number of members of each of the given groups"""
+    if not group_ids:
+        return {}
+    placeholders = ', '.join('?' * len(group_ids))
+    return dict(get_connection().execute(f'''
+        SELECT group_id, COUNT(*) FROM group_members
+        WHERE group_id IN ({placeholders})
+        GROUP BY group_id
+    ''', list(group_ids)).fetchall())
 
 def get_debug_info() -> dict:
     """Get debug information about groups and authenticated chats"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Get all groups
-    cursor.execute('SELECT group_id, group_title, is_active FROM groups ORDER BY created_at DESC')
-    groups = cursor.fetchall()
-    
-    # Get all group members
-    cursor.execute('''
-        SELECT gm.group_id, g.group_title, gm.user_id, u.username, u.first_name
-        FROM group_members gm
-        JOIN groups g ON gm.group_id = g.group_id
-        JOIN users u ON gm.user_id = u.user_id
-        ORDER BY gm.group_id, u.first_name
-    ''')
-    group_members = cursor.fetchall()
-    
-    # Get authenticated chats
-    cursor.execute('''
-        SELECT ac.chat_id, ac.chat_type, ac.chat_title, ac.channel_id, 
-               c.channel_name, ac.is_active, ac.authenticated_at
-        FROM authenticated_chats ac
-        JOIN channels c ON ac.channel_id = c.channel_id
-        ORDER BY ac.authenticated_at DESC
-    ''')
-    authenticated_chats = cursor.fetchall()
-    
-    conn.close()
-    
+    # Members carry only their group_id; the group titles are in "groups"
     return {
-        "groups": groups,
-        "group_members": group_members,
-        "authenticated_chats": authenticated_chats
+        "groups": _fetch_records(Group, '''
+            SELECT group_id, group_title, is_active, created_at
+            FROM groups
+            ORDER BY created_at DESC
+        '''),
+        "group_members": _fetch_records(Member, '''
+            SELECT gm.group_id, gm.user_id, u.username, u.first_name
+            FROM group_members gm
+            JOIN users u ON gm.user_id = u.user_id
+            ORDER BY gm.group_id, u.first_name
+        '''),
+        "authenticated_chats": _fetch_records(AuthenticatedChat, '''
+            SELECT chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity
+            FROM authenticated_chats
+            ORDER BY authenticated_at DESC
+        '''),
     }
 
 # Standalone channel creation function for CLI usage
@@ -605,6 +1664,10 @@ if __name__ == "__main__":
         print("  Delete channel:     python db.py delete <channel_name>")
         print("  Reactivate channel: python db.py reactivate <channel_name>")
         print("  List channels:      python db.py list")
+        print("  Migrate schema:     python db.py migrate")
+        print("  Check statistics:   python db.py check-stats")
+        print("  Import chats:       python db.py import <channel_name> <file.ndjson|file.csv>")
+        print("  Export chats:       python db.py export <channel_name> <file.ndjson|file.csv>")
         print("")
         print("Examples:")
         print("  python db.py create testchannel secret123 'Test channel'")
@@ -644,7 +1707,7 @@ if __name__ == "__main__":
             print("Usage: python db.py delete <channel_name>")
             sys.exit(1)
         channel_name = sys.argv[2]
-        print(f"⚠️  WARNING: This will permanently delete channel '{channel_name}' and deauthenticate all users!")
+        print(f"⚠️  WARNING: This will permanently delete channel '{channel_name}' and deauthenticate all chats!")
         confirm = input("Are you sure? Type 'yes' to confirm: ")
         if confirm.lower() == 'yes':
             success, message = delete_channel(channel_name)
@@ -675,11 +1738,49 @@ if __name__ == "__main__":
             for channel_id, channel_name, description, is_active, created_at, user_count in channels:
                 status = "🟢 Active" if is_active else "🔴 Inactive"
                 print(f"**{channel_name}** {status}")
-                print(f"   ID: {channel_id} | Users: {user_count}")
+                print(f"   ID: {channel_id} | Chats: {user_count}")
                 if description:
                     print(f"   Description: {description}")
                 print(f"   Created: {created_at}\n")
     
+    elif command in ("import", "export"):
+        if len(sys.argv) < 4:
+            print(f"Usage: python db.py {command} <channel_name> <file.ndjson|file.csv>")
+            sys.exit(1)
+        from bulk import guess_format, parse_chats, format_chats
+        channel_name, path = sys.argv[2], sys.argv[3]
+        channel = get_channel_by_name(channel_name)
+        if not channel:
+            print(f"❌ Channel '{channel_name}' not found or inactive")
+            sys.exit(1)
+        fmt = guess_format(path)
+        
+        if command == "import":
+            report = {}
+            with open(path, newline='', encoding='utf-8') as f:
+                imported = import_authenticated_chats(channel.channel_id, parse_chats(f, fmt, report))
+            print(f"✅ Imported {imported} chats into channel '{channel_name}'")
+            if report["skipped"]:
+                print(f"⚠️  Skipped {report['skipped']} invalid line(s):")
+                for error in report["errors"]:
+                    print(f"   {error}")
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                for chunk in format_chats(iter_authenticated_chats(channel.channel_id), fmt):
+                    f.write(chunk)
+            print(f"✅ Exported the chats of channel '{channel_name}' to {path}")
+    
+    elif command == "check-stats":
+        drifted = check_stats_counters()
+        if drifted:
+            print(f"⚠️  Repaired {len(drifted)} drifted counter(s)")
+        else:
+            print("✅ Statistics counters are consistent")
+    
+    elif command == "migrate":
+        # init_database above already applied any pending migrations
+        print(f"✅ Database schema is at version {get_schema_version()}")
+    
     else:
         print(f"❌ Unknown command: {command}")
         print("Use 'python db.py' without arguments to see usage information.")
@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Environment variables are loaded by docker-compose
+
+# Telegram allows roughly 30 messages per second overall, 20 messages per minute
+# to the same group and about one message per second to the same private chat
+GLOBAL_RATE = float(os.environ.get("TELEGRAM_CHANNEL_BOT_GLOBAL_RATE", 30))
+GROUP_RATE_PER_MINUTE = float(os.environ.get("TELEGRAM_CHANNEL_BOT_GROUP_RATE", 20))
+PRIVATE_RATE = 1.0
+PRIVATE_BURST = 3
+# How often a request is retried after Telegram answered with RetryAfter
+MAX_RETRIES = int(os.environ.get("TELEGRAM_CHANNEL_BOT_MAX_RETRIES", 3))
+# Idle per-chat buckets are dropped once this many are tracked
+MAX_TRACKED_CHATS = 10000
+
+class TokenBucket:
+    """Token bucket handing out send slots at `rate` per second with bursts of up to `capacity`"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it.
+
+        Tokens may be borrowed from the future, so concurrent callers are
+        queued one slot apart instead of all waking up at the same time.
+        """
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self) -> bool:
+        """Check whether the bucket is full, i.e. it no longer holds back anything"""
+        self._refill()
+        return self.tokens >= self.capacity
+
+def _is_group_chat(chat_id) -> bool:
+    """Group, supergroup and channel ids are negative (or @usernames for channels)"""
+    if isinstance(chat_id, str):
+        return chat_id.startswith("@") or chat_id.startswith("-")
+    return chat_id < 0
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """Throttles outgoing requests to stay within Telegram's global and per-chat limits.
+
+    Requests addressed to a chat first wait for that chat's budget and then for
+    a global slot, so a busy group never burns global throughput while it waits.
+    A RetryAfter answer pauses every request for the requested time before the
+    failed one is retried. The optional `rate_limit_args` of ExtBot methods
+    overrides the number of retries.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE,
+                 group_rate_per_minute: float = GROUP_RATE_PER_MINUTE,
+                 max_retries: int = MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.group_rate = group_rate_per_minute / 60
+        self.group_burst = group_rate_per_minute
+        self.max_retries = max_retries
+        self.chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        self.paused_until = 0.0
+
+    async def initialize(self) -> None:
+        """Nothing to set up, buckets are created on demand"""
+
+    async def shutdown(self) -> None:
+        """Forget all per-chat buckets"""
+        self.chat_buckets.clear()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_TRACKED_CHATS:
+                for idle_chat_id in [key for key, value in self.chat_buckets.items() if value.is_idle()]:
+                    del self.chat_buckets[idle_chat_id]
+            if _is_group_chat(chat_id):
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(PRIVATE_RATE, PRIVATE_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id):
+        """Wait until a request to `chat_id` fits into the per-chat and global budgets"""
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            delay = self.global_bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        # A RetryAfter may have been received by another request while we were waiting
+        delay = self.paused_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.paused_until - time.monotonic()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """Run the request once it fits into the budgets, retrying after RetryAfter"""
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+
+        attempt = 0
+        while True:
+            await self._acquire(chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt >= max_retries:
+                    raise
+                attempt += 1
+                # Flood control applies to the whole bot, so hold back every request
+                self.paused_until = max(self.paused_until, time.monotonic() + e.retry_after)
+                print(f"Rate limited on {endpoint} for chat {chat_id}: retrying in {e.retry_after}s "
+                      f"(attempt {attempt}/{max_retries})")
+
+_shared_rate_limiter: Optional[TelegramRateLimiter] = None
+
+def get_rate_limiter() -> TelegramRateLimiter:
+    """Get the rate limiter shared by every Bot in this process"""
+    global _shared_rate_limiter
+    if _shared_rate_limiter is None:
+        _shared_rate_limiter = TelegramRateLimiter()
+    return _shared_rate_limiter
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-query overhead of acquiring a database connection.
+
+Compares the previous connection path (ensure the data directory with a
+write probe, open a new connection, run a probe query, close it again)
+with the current fast path of db.get_connection(), using the same point
+query the broadcast path runs for every request.
+"""
+
+import io
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+QUERY = "SELECT channel_id, channel_name, description, is_active FROM channels WHERE channel_secret = ?"
+
+def legacy_query(channel_secret: str):
+    """Run the query the way every db.py function used to: a new connection per call"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.ensure_data_directory()
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    conn.execute("SELECT name FROM sqlite_master WHERE type='table' LIMIT 1")
+    result = conn.execute(QUERY, (channel_secret,)).fetchone()
+    conn.close()
+    return result
+
+def current_query(channel_secret: str):
+    """Run the query over this thread's reused connection"""
+    return db.get_connection().execute(QUERY, (channel_secret,)).fetchone()
+
+def measure(func, iterations: int) -> float:
+    """Return the mean time per call in microseconds"""
+    func("welcome123")  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func("welcome123")
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Database connection overhead benchmark')
+    parser.add_argument('--iterations', type=int, default=2000, help='Queries per measurement')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.init_database()
+            db.create_default_channel()
+
+        before = measure(legacy_query, args.iterations)
+        after = measure(current_query, args.iterations)
+        db.close_connection()
+
+    print(f"📊 Per-query overhead over {args.iterations} queries")
+    print(f"   Before (probe + new connection): {before:9.1f} µs/query")
+    print(f"   After  (reused connection):      {after:9.1f} µs/query")
+    print(f"   Speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
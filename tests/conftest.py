@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Shared fixtures for the offline tests
+
+`database` runs a test against a fresh database in its own data directory,
+`db_executor` gives the async_db wrappers fresh threads, `client` is the Flask
+test client with the API key "test-key", and `sql_trace` records the SQL
+statements a piece of code runs.
+"""
+
+import io
+import os
+import sys
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import api
+import async_db
+import broadcast
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test in its own data directory, with no connection or cached rows of an earlier test"""
+    monkeypatch.chdir(tmp_path)
+    db.close_connection()
+    db._recipient_cache.clear()
+    db.invalidate_channel_cache()
+    yield tmp_path
+    db.close_connection()
+
+@pytest.fixture
+def database(workdir):
+    """A database at the current schema version with the default channel"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.init_database()
+        db.create_default_channel()
+
+@pytest.fixture
+def db_executor(monkeypatch):
+    """Fresh executor threads, so no thread keeps a connection to an earlier test's database"""
+    executor = ThreadPoolExecutor(max_workers=async_db.DB_THREADS, thread_name_prefix="db")
+    monkeypatch.setattr(async_db, "_executor", executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+@pytest.fixture
+def client(monkeypatch):
+    """Flask test client for the API key "test-key", without a dispatcher thread"""
+    monkeypatch.setattr(api, "start_dispatcher", lambda: None)
+    monkeypatch.setattr(api, "wake_dispatcher", lambda: None)
+    monkeypatch.setattr(api, "TELEGRAM_CHANNEL_BOT_API_KEY", "test-key")
+    return api.app.test_client()
+
+@pytest.fixture
+def sql_trace():
+    """Context manager yielding the list of SQL statements run on this thread's connection inside it"""
+    @contextlib.contextmanager
+    def trace():
+        statements = []
+        conn = db.get_connection()
+        conn.set_trace_callback(statements.append)
+        try:
+            yield statements
+        finally:
+            conn.set_trace_callback(None)
+    return trace
+
+@pytest.fixture
+def run_job(monkeypatch):
+    """Run a queued broadcast job to completion with a fake Bot"""
+    def run(job_id, bot, message="hello"):
+        async def get_bot():
+            return bot
+        monkeypatch.setattr(broadcast, "get_bot", get_bot)
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(broadcast.process_broadcast_job(job_id, message))
+    return run
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the paged admin listings in admin_pages.py
+
+Walks the listings forwards and backwards through their inline buttons and
+checks that every row shows up once and that every page fits in a Telegram
+message.
+
+Run with: python -m pytest tests/test_admin_pages.py
+"""
+
+import io
+import asyncio
+import contextlib
+
+import pytest
+
+import db
+import admin_pages
+
+@pytest.fixture(autouse=True)
+def chats(database, db_executor):
+    # Long titles, to check that pages stay below Telegram's message limit
+    db.import_authenticated_chats(1, [(-chat_id, "group", f"Group {chat_id} " + "x" * 300)
+                                      for chat_id in range(1, 56)])
+
+def walk(view, argument=""):
+    """Follow the Next buttons from the first page, then the Previous buttons back, returning the page texts"""
+    async def main():
+        forward = []
+        text, keyboard = await admin_pages.render_page(view, argument)
+        while True:
+            forward.append(text)
+            assert len(text) <= admin_pages.MESSAGE_LIMIT
+            buttons = {button.text: button.callback_data for button in keyboard.inline_keyboard[0]} if keyboard else {}
+            assert all(len(data.encode()) <= 64 for data in buttons.values())
+            if "Next ➡️" not in buttons:
+                break
+            text, keyboard = await admin_pages.render_page(*admin_pages.parse_callback(buttons["Next ➡️"]))
+
+        backward = [text]
+        while keyboard and "⬅️ Previous" in [button.text for button in keyboard.inline_keyboard[0]]:
+            data = keyboard.inline_keyboard[0][0].callback_data
+            text, keyboard = await admin_pages.render_page(*admin_pages.parse_callback(data))
+            backward.append(text)
+        return forward, backward
+
+    return asyncio.run(main())
+
+def test_channel_chats_are_paged_both_ways():
+    forward, backward = walk("chats", "1")
+    assert len(forward) == 3
+    assert backward == forward[::-1]
+    shown = [line for page in forward for line in page.splitlines() if line.startswith("  ID: ")]
+    assert len(shown) == len(set(shown)) == 55
+
+def test_groups_page_shows_a_preview_of_members():
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.write_tracking_batch([(user_id, None, f"User {user_id}", None) for user_id in range(1, 16)],
+                                [(-group_id, f"Group {group_id}") for group_id in range(1, 8)],
+                                [(-1, user_id) for user_id in range(1, 16)], [])
+    forward, backward = walk("groups")
+    assert len(forward) == 2 and backward == forward[::-1]
+    assert "Group 1 (ID: -1) - 15 members" in "".join(forward)
+    assert "… and 5 more" in "".join(forward)
+
+def test_single_pages_have_no_buttons():
+    text, keyboard = asyncio.run(admin_pages.render_page("stats"))
+    assert "💬 Authenticated Chats: 55" in text and "• general: 55 chats" in text
+    assert keyboard is None
+    assert asyncio.run(admin_pages.render_page("chats", "99")) == ("❌ Channel with ID 99 not found.", None)
+
+def test_foreign_callback_data_is_ignored():
+    for data in ("auth_request", "page:unknown::n:1:2024-01-01 00:00:00", "page:chats:1:n:x:2024"):
+        assert admin_pages.parse_callback(data) is None
+    assert admin_pages.parse_callback("page:chats:1:p:-5:2024-01-01 00:00:00") == (
+        "chats", "1", None, ("2024-01-01 00:00:00", -5))
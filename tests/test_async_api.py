@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests for the async serving mode in async_api.py
+
+Starts the tornado server on the broadcast event loop and checks that it
+answers like the Flask routes, passes other routes on to Flask and queues
+many concurrent broadcasts from a single process.
+
+Run with: python -m pytest tests/test_async_api.py
+"""
+
+import json
+import time
+import asyncio
+import socket
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import db
+import api
+import async_db
+import async_api
+import broadcast
+
+pytestmark = pytest.mark.usefixtures("database", "db_executor")
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(broadcast, "start_dispatcher", lambda: None)
+    monkeypatch.setattr(api, "start_dispatcher", lambda: None)
+    monkeypatch.setattr(api, "TELEGRAM_CHANNEL_BOT_API_KEY", "test-key")
+    monkeypatch.setenv("TELEGRAM_CHANNEL_BOT_TOKEN", "123:test")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    http_server = async_api.start(port, "127.0.0.1")
+    yield f"http://127.0.0.1:{port}"
+    broadcast.run(http_server.close_all_connections())
+    http_server.stop()
+    broadcast.shutdown()
+
+def call(url, body=None, api_key="test-key"):
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["X-API-Key"] = api_key
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def test_routes_answer_like_flask(server):
+    status, body = call(server + "/api/health")
+    assert status == 200 and json.loads(body)["total_authenticated_chats"] == 0
+    assert call(server + "/api/channels", api_key=None)[0] == 401
+    status, body = call(server + "/api/channels?limit=1")
+    assert status == 200
+    assert [channel["channel_name"] for channel in json.loads(body)["channels"]] == ["general"]
+    assert call(server + "/api/channels?limit=oops")[0] == 400
+    status, body = call(server + "/api/stats")
+    assert status == 200 and json.loads(body)["total_channels"] == 1
+    assert call(server + "/web/broadcast-to-channel", {"message": "Hi"})[0] == 400
+
+def test_other_routes_are_served_by_flask(server):
+    status, body = call(server + "/api/broadcast-jobs/missing")
+    assert status == 404 and json.loads(body)["error"] == "Broadcast job not found"
+
+def test_concurrent_broadcasts_are_queued(server):
+    db.import_authenticated_chats(1, [(-chat_id, "group", f"Group {chat_id}") for chat_id in range(1, 11)])
+    secret = db.get_connection().execute("SELECT channel_secret FROM channels WHERE channel_id = 1").fetchone()[0]
+    body = {"message": "Hello", "channel_name": "general", "channel_secret": secret}
+
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        results = list(pool.map(lambda _: call(server + "/api/broadcast-to-channel", body), range(200)))
+
+    assert [status for status, _ in results] == [202] * 200
+    job_ids = {json.loads(response)["job_id"] for _, response in results}
+    assert len(job_ids) == 200
+    assert all(db.get_broadcast_job(job_id) is not None for job_id in job_ids)
+
+def test_readiness_probes_do_not_hold_database_threads(server, monkeypatch):
+    class SlowBot:
+        async def get_me(self):
+            await asyncio.sleep(1)
+
+    async def get_bot():
+        return SlowBot()
+
+    monkeypatch.setattr(broadcast, "get_bot", get_bot)
+    monkeypatch.setattr(broadcast, "_bot_check", (0.0, False, "Not checked yet"))
+    # A single database thread, which a blocking getMe would take away from everything else
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+    monkeypatch.setattr(async_db, "_executor", executor)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        probes = [pool.submit(call, server + "/api/health/ready") for _ in range(3)]
+        time.sleep(0.2)
+        start = time.monotonic()
+        assert call(server + "/api/health")[0] == 200
+        assert time.monotonic() - start < 0.5
+        results = [probe.result() for probe in probes]
+    executor.shutdown(wait=True)
+
+    assert [status for status, _ in results] == [200] * 3
+    assert json.loads(results[0][1])["checks"]["bot"]["detail"] == "Telegram reachable"
+
+def test_channels_stream_ndjson(server):
+    status, body = call(server + "/api/channels?format=ndjson&limit=1")
+    assert status == 200
+    assert [json.loads(line)["channel_name"] for line in body.decode().splitlines()] == ["general"]
+    assert call(server + "/api/channels?format=xml")[0] == 400
+
+def test_streamed_pages_are_read_on_any_database_thread(server):
+    for number in range(1, 10):
+        db.create_channel(f"channel{number}", f"secret{number}")
+    # A page per chunk, each fetched on whichever database thread is free
+    status, body = call(server + "/api/channels?format=ndjson&limit=2")
+    assert status == 200
+    names = [json.loads(line)["channel_name"] for line in body.decode().splitlines()]
+    assert sorted(names) == sorted(["general"] + [f"channel{number}" for number in range(1, 10)])
+
+def test_channel_chats_stream_ndjson(server):
+    db.import_authenticated_chats(1, [(-chat_id, "group", f"Group {chat_id}") for chat_id in range(1, 26)])
+    secret = db.get_connection().execute("SELECT channel_secret FROM channels WHERE channel_id = 1").fetchone()[0]
+    url = server + "/api/channel/general/chats"
+
+    status, body = call(url, {"channel_secret": secret, "format": "ndjson", "limit": 10})
+    assert status == 200
+    chat_ids = [json.loads(line)["chat_id"] for line in body.decode().splitlines()]
+    assert sorted(chat_ids) == list(range(-25, 0))
+
+    status, body = call(url + "?limit=10", {"channel_secret": secret})
+    assert status == 200 and len(json.loads(body)["chats"]) == 10 and json.loads(body)["total"] == 25
+    assert call(url, {"channel_secret": "wrong"})[0] == 401
+    assert call(url, {"channel_secret": secret}, api_key=None)[0] == 401
+    assert call(url, {"channel_secret": secret, "format": "xml"})[0] == 400
+
+def test_chats_export_streams_from_the_async_server(server, monkeypatch):
+    monkeypatch.setattr(db, "EXPORT_BATCH_SIZE", 7)
+    db.import_authenticated_chats(1, [(-chat_id, "group", f"Group {chat_id}") for chat_id in range(1, 31)])
+    db.deactivate_unreachable_chats([-30])
+    url = server + "/api/channel/general/chats/export"
+
+    status, body = call(url)
+    assert status == 200
+    assert sorted(json.loads(line)["chat_id"] for line in body.decode().splitlines()) == list(range(-29, 0))
+
+    status, body = call(url + "?format=csv&include_inactive=1")
+    lines = body.decode().splitlines()
+    assert status == 200 and lines[0].startswith("chat_id,") and len(lines) == 31
+    assert call(url, api_key=None)[0] == 401
+    assert call(url + "?format=xml")[0] == 400
+    assert call(server + "/api/channel/missing/chats/export")[0] == 404
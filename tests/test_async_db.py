@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for async_db.py
+
+Checks that database calls awaited by the bot handlers run on the database
+executor and leave the event loop free to process other updates.
+
+Run with: python -m pytest tests/test_async_db.py
+"""
+
+import io
+import time
+import asyncio
+import threading
+import contextlib
+
+import pytest
+
+import db
+import async_db
+
+pytestmark = pytest.mark.usefixtures("database", "db_executor")
+
+def test_calls_run_on_database_threads():
+    async def main():
+        return await async_db.run_db(lambda: threading.current_thread().name)
+
+    assert asyncio.run(main()).startswith("db")
+
+def test_event_loop_keeps_running_during_slow_queries():
+    def slow_query():
+        time.sleep(0.2)
+        return db.get_channel_by_name("general")
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        channel = await async_db.run_db(slow_query)
+        task.cancel()
+        return channel, ticks
+
+    channel, ticks = asyncio.run(main())
+    assert channel.channel_name == "general"
+    assert ticks >= 10
+
+def test_wrappers_return_db_results():
+    async def main():
+        with contextlib.redirect_stdout(io.StringIO()):
+            await async_db.add_authenticated_chat(-1, "group", "Group", 1)
+        return await async_db.is_chat_authenticated(-1)
+
+    assert asyncio.run(main()) == (1, 1, "general")
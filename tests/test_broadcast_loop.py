@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-worker event loop in broadcast.py
+
+Checks that coroutines submitted from Flask threads and the dispatcher all run
+on the one background loop thread, concurrently, and that a queued broadcast
+sends many messages at once over it with the worker's one shared Bot.
+
+Run with: python -m pytest tests/test_broadcast_loop.py
+"""
+
+import io
+import time
+import asyncio
+import threading
+import contextlib
+import concurrent.futures
+
+import pytest
+from telegram.error import Forbidden
+
+import db
+import broadcast
+
+@pytest.fixture(autouse=True)
+def worker_loop():
+    yield
+    broadcast.shutdown()
+
+async def loop_thread_name(delay=0):
+    await asyncio.sleep(delay)
+    return threading.current_thread().name
+
+def test_submitted_coroutines_overlap_on_one_loop_thread():
+    start = time.monotonic()
+    futures = [broadcast.submit(loop_thread_name(0.2)) for _ in range(20)]
+    names = {future.result() for future in futures}
+    assert names == {"broadcast-loop"}
+    assert time.monotonic() - start < 1
+
+def test_run_is_safe_from_many_threads():
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(broadcast.run(loop_thread_name(0.05))))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["broadcast-loop"] * 10
+
+def test_run_times_out_and_cancels():
+    with pytest.raises(concurrent.futures.TimeoutError):
+        broadcast.run(asyncio.sleep(5), timeout=0.05)
+
+def queue_broadcast(chat_ids):
+    db.import_authenticated_chats(1, [(chat_id, "group", f"Group {chat_id}") for chat_id in chat_ids])
+    return db.create_broadcast_job(1, "hello", db.get_channel_recipients(1))
+
+def test_queued_broadcast_sends_many_messages_at_once(database, db_executor, monkeypatch):
+    in_flight = 0
+    peak = 0
+    threads = set()
+
+    class FakeBot:
+        async def send_message(self, chat_id, text):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            threads.add(threading.current_thread().name)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            if chat_id == -3:
+                raise Forbidden("Forbidden: bot was blocked by the user")
+
+    async def get_bot():
+        return FakeBot()
+
+    monkeypatch.setattr(broadcast, "get_bot", get_bot)
+    job_id = queue_broadcast([-1, -2, -3, -4, -5])
+    # The dispatcher thread runs the job on the worker's loop
+    with contextlib.redirect_stdout(io.StringIO()):
+        broadcast.run(broadcast.process_broadcast_job(job_id, "hello"))
+
+    job = db.get_broadcast_job(job_id)
+    assert (job.status, job.sent_count, job.failed_count) == ("completed", 4, 1)
+    assert peak == 5
+    assert threads == {"broadcast-loop"}
+
+def test_attached_application_loop_and_bot_are_used(database, db_executor):
+    sent = []
+
+    class ApplicationBot:
+        async def send_message(self, chat_id, text):
+            sent.append((chat_id, threading.current_thread().name))
+
+    job_id = queue_broadcast([-1, -2])
+
+    async def main():
+        # Like bot.start_api: the Application's running loop and initialized bot
+        broadcast.attach(asyncio.get_running_loop(), ApplicationBot())
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.to_thread(broadcast.run, broadcast.process_broadcast_job(job_id, "hello"))
+        broadcast.shutdown()
+        # The owner's loop keeps running
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert sorted(sent) == [(-2, "MainThread"), (-1, "MainThread")]
+    assert db.get_broadcast_job(job_id).sent_count == 2
+    assert broadcast._loop is None and broadcast._bot is None
+
+def test_worker_builds_one_bot_and_shuts_it_down(monkeypatch):
+    created = []
+    initialized = []
+    closed = []
+
+    async def initialize(bot):
+        initialized.append(bot)
+
+    async def shutdown(bot):
+        closed.append(bot)
+
+    real_create_bot = broadcast.create_bot
+
+    def create_bot(token):
+        created.append(real_create_bot(token))
+        return created[-1]
+
+    # No getMe round trip or connection pool to close: only count the calls
+    monkeypatch.setattr(broadcast.ExtBot, "initialize", initialize)
+    monkeypatch.setattr(broadcast.ExtBot, "shutdown", shutdown)
+    monkeypatch.setattr(broadcast, "create_bot", create_bot)
+    monkeypatch.setenv("TELEGRAM_CHANNEL_BOT_TOKEN", "123:test")
+
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        bots = list(pool.map(lambda _: broadcast.run(broadcast.get_bot()), range(4)))
+    bots.append(broadcast.run(broadcast.get_bot()))
+
+    bot, = created
+    assert isinstance(bot, broadcast.ExtBot)
+    assert all(other is bot for other in bots)
+    assert initialized == [bot]
+
+    broadcast.shutdown()
+    assert closed == [bot]
+    assert broadcast._bot is None and broadcast._loop is None
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk import and export of authenticated chats
+
+Covers the NDJSON/CSV parsing in bulk.py, the batched writes in db.py and the
+streaming import/export endpoints in api.py.
+
+Run with: python -m pytest tests/test_bulk.py
+"""
+
+import io
+import json
+
+import pytest
+
+import db
+import bulk
+
+pytestmark = pytest.mark.usefixtures("database")
+
+def test_parse_skips_and_reports_invalid_lines():
+    lines = [
+        '{"chat_id": -1, "chat_type": "group", "chat_title": "Group"}\n',
+        '\n',
+        '{"chat_id": "-2", "chat_type": "supergroup"}\n',
+        'not json\n',
+        '{"chat_id": 3, "chat_type": "robot"}\n',
+    ]
+    report = {}
+    chats = list(bulk.parse_chats(lines, "ndjson", report))
+    assert chats == [(-1, "group", "Group"), (-2, "supergroup", "Chat -2")]
+    assert report["skipped"] == 2
+    assert report["errors"][0].startswith("line 4:") and report["errors"][1].startswith("line 5:")
+
+def test_import_writes_in_batches_and_exports_everything(monkeypatch):
+    monkeypatch.setattr(db, "IMPORT_BATCH_SIZE", 7)
+    monkeypatch.setattr(db, "EXPORT_BATCH_SIZE", 5)
+    chats = ((-chat_id, "group", f"Group {chat_id}") for chat_id in range(1, 51))
+    assert db.import_authenticated_chats(1, chats) == 50
+    # Importing again refreshes the rows instead of duplicating them
+    assert db.import_authenticated_chats(1, [(-1, "group", "Renamed")]) == 1
+
+    rows = list(db.iter_authenticated_chats(1))
+    assert len(rows) == 50
+    assert db.get_bot_stats()["total_authenticated_chats"] == 50
+    assert dict((row[0], row[2]) for row in rows)[-1] == "Renamed"
+
+def test_csv_round_trip():
+    db.import_authenticated_chats(1, [(-1, "group", "Group, with comma"), (2, "private", "Chat 2")])
+    exported = "".join(bulk.format_chats(db.iter_authenticated_chats(1), "csv"))
+    report = {}
+    chats = sorted(bulk.parse_chats(io.StringIO(exported, newline=""), "csv", report))
+    assert chats == [(-1, "group", "Group, with comma"), (2, "private", "Chat 2")]
+    assert report["skipped"] == 0
+
+def test_import_and_export_endpoints(client):
+    headers = {"X-API-Key": "test-key", "Content-Type": "application/x-ndjson"}
+    body = "".join(json.dumps({"chat_id": -chat_id, "chat_type": "group"}) + "\n" for chat_id in range(1, 1001))
+    response = client.post("/api/channel/general/chats/import", data=body + "oops\n", headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["imported"] == 1000
+    assert response.get_json()["skipped"] == 1
+
+    response = client.get("/api/channel/general/chats/export", headers={"X-API-Key": "test-key"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(records) == 1000 and records[0]["is_active"] is True
+
+    response = client.get("/api/channel/general/chats/export?format=csv", headers={"X-API-Key": "test-key"})
+    assert response.mimetype == "text/csv"
+    assert len(response.get_data(as_text=True).splitlines()) == 1001
+
+def test_endpoints_reject_bad_requests(client):
+    assert client.get("/api/channel/general/chats/export").status_code == 401
+    headers = {"X-API-Key": "test-key"}
+    assert client.get("/api/channel/missing/chats/export", headers=headers).status_code == 404
+    assert client.get("/api/channel/general/chats/export?format=xml", headers=headers).status_code == 400
+    response = client.post("/api/channel/general/chats/import", data="oops\n", headers=headers)
+    assert response.status_code == 400
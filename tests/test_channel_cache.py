@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the channel cache in db.py
+
+Checks that channel lookups by secret and by name are served from memory and
+that changes made by this process or by another one invalidate the cache.
+
+Run with: python -m pytest tests/test_channel_cache.py
+"""
+
+import sqlite3
+
+import pytest
+
+import db
+
+pytestmark = pytest.mark.usefixtures("database")
+
+@pytest.fixture
+def count_queries(sql_trace):
+    """Call func and return its result with the number of statements it ran"""
+    def count(func, *args):
+        with sql_trace() as statements:
+            result = func(*args)
+        return result, len(statements)
+    return count
+
+def test_repeated_lookups_are_served_from_memory(count_queries):
+    channel, queries = count_queries(db.get_channel_by_secret, "welcome123")
+    assert channel[1] == "general" and queries > 0
+    assert count_queries(db.get_channel_by_secret, "welcome123") == (channel, 0)
+    channel, queries = count_queries(db.get_channel_by_name, "general")
+    assert channel[1] == "general"
+    assert count_queries(db.get_channel_by_name, "general") == (channel, 0)
+    channel, queries = count_queries(db.get_channel_by_id, 1)
+    assert channel == db.Channel(1, "general", "Default general channel for all users", True)
+    assert count_queries(db.get_channel_by_id, 1) == (channel, 0)
+
+def test_unknown_secrets_are_not_cached():
+    assert db.get_channel_by_secret("new-secret") is None
+    db.create_channel("new", "new-secret")
+    assert db.get_channel_by_secret("new-secret")[1] == "new"
+
+def test_local_changes_invalidate_the_cache():
+    assert db.get_channel_by_secret("welcome123")[3]
+    assert db.get_channel_by_name("general") is not None
+    db.deactivate_channel("general")
+    assert not db.get_channel_by_secret("welcome123").is_active
+    assert not db.get_channel_by_id(1).is_active
+    assert db.get_channel_by_name("general") is None
+    db.reactivate_channel("general")
+    assert db.get_channel_by_name("general") is not None
+    db.delete_channel("general")
+    assert db.get_channel_by_secret("welcome123") is None
+    assert db.get_channel_by_id(1) is None
+
+def test_changes_by_other_processes_are_noticed(monkeypatch):
+    monkeypatch.setattr(db, "CHANNEL_GENERATION_CHECK_INTERVAL", 0)
+    assert db.get_channel_by_secret("welcome123")[3]
+
+    # Another worker (or the CLI) deactivates the channel through its own connection
+    other = sqlite3.connect(db.DATABASE_PATH)
+    with other:
+        other.execute("UPDATE channels SET is_active = FALSE WHERE channel_name = 'general'")
+    other.close()
+
+    assert not db.get_channel_by_secret("welcome123")[3]
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(db, "CHANNEL_CACHE_SIZE", 3)
+    for index in range(5):
+        db.create_channel(f"channel{index}", f"secret{index}")
+    for index in range(5):
+        assert db.get_channel_by_secret(f"secret{index}")[1] == f"channel{index}"
+    assert len(db._channel_cache) == 3
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for feeding delivery outcomes back into authenticated_chats
+
+Checks that chats the bot can no longer reach are deactivated in every
+channel, and that groups upgraded to supergroups keep their authentications
+under the new chat id and still get the broadcast.
+
+Run with: python -m pytest tests/test_chat_pruning.py
+"""
+
+import io
+import asyncio
+import contextlib
+
+import pytest
+from telegram.error import BadRequest, ChatMigrated, Forbidden
+
+import db
+import async_db
+
+@pytest.fixture(autouse=True)
+def channels(database, db_executor):
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.create_channel("news", "news-secret")
+
+class Bot:
+    """Raises the given error for a chat, delivers to every other chat"""
+
+    def __init__(self, failing):
+        self.failing = failing
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if chat_id in self.failing:
+            raise self.failing[chat_id]
+        self.sent.append(chat_id)
+
+def queue_broadcast_to_general():
+    return db.create_broadcast_job(1, "hello", db.get_channel_recipients(1))
+
+def recipients(channel_id):
+    return sorted(chat.chat_id for chat in db.get_channel_recipients(channel_id))
+
+def test_unreachable_chats_are_deactivated_in_every_channel(run_job):
+    chats = [(-1, "group", "Kicked"), (-2, "group", "Deleted"), (-3, "group", "Too long"), (4, "private", "Fine")]
+    db.import_authenticated_chats(1, chats)
+    db.import_authenticated_chats(2, chats[:1])
+    assert db.get_stats_totals()["total_authenticated_chats"] == 5
+
+    run_job(queue_broadcast_to_general(), Bot({
+        -1: Forbidden("Forbidden: bot was kicked from the group chat"),
+        -2: BadRequest("Chat not found"),
+        -3: BadRequest("Message is too long"),
+    }))
+
+    # A bad message says nothing about the chat, so -3 stays
+    assert recipients(1) == [-3, 4]
+    assert recipients(2) == []
+    assert db.get_stats_totals()["total_authenticated_chats"] == 2
+    assert db.count_channel_chats(1) == 2
+
+    # The next broadcast does not spend a request on them
+    bot = Bot({})
+    run_job(queue_broadcast_to_general(), bot)
+    assert sorted(bot.sent) == [-3, 4]
+
+def test_migrated_group_is_rewritten_and_still_receives_the_broadcast(run_job):
+    db.import_authenticated_chats(1, [(-1, "group", "Upgraded"), (2, "private", "Chat 2")])
+    db.import_authenticated_chats(2, [(-1, "group", "Upgraded"), (-1001, "supergroup", "Upgraded")])
+
+    bot = Bot({-1: ChatMigrated(-1001)})
+    job_id = queue_broadcast_to_general()
+    run_job(job_id, bot)
+
+    assert sorted(bot.sent) == [-1001, 2]
+    assert recipients(1) == [-1001, 2]
+    assert [chat.chat_type for chat in db.get_channel_recipients(1) if chat.chat_id == -1001] == ["supergroup"]
+    # Already authenticated under the new id: no duplicate row
+    assert recipients(2) == [-1001]
+    job = db.get_broadcast_job(job_id)
+    assert (job.total_chats, job.sent_count, job.failed_count) == (3, 2, 1)
+    # The triggers kept the statistics in step with the moved and removed rows
+    assert db.check_stats_counters() == []
+
+def test_migration_service_message_moves_authentications():
+    db.import_authenticated_chats(1, [(-1, "group", "Upgraded")])
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert asyncio.run(async_db.migrate_chat_id(-1, -1001)) == 1
+    assert recipients(1) == [-1001]
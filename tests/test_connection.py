@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-thread database connections in db.py
+
+Checks that a thread reuses its one connection, that other threads and forked
+children open their own, and that new connections get the WAL journal and the
+other pragmas.
+
+Run with: python -m pytest tests/test_connection.py
+"""
+
+import os
+import threading
+
+import pytest
+
+import db
+
+pytestmark = pytest.mark.usefixtures("database")
+
+def test_thread_reuses_its_connection():
+    conn = db.get_connection()
+    assert db.get_connection() is conn
+
+    others = []
+    thread = threading.Thread(target=lambda: others.append(db.get_connection()))
+    thread.start()
+    thread.join()
+    assert others[0] is not conn
+
+    # Closing it makes the next call open a new one
+    db.close_connection()
+    assert db.get_connection() is not conn
+
+def test_connection_pragmas():
+    conn = db.get_connection()
+
+    def pragma(name):
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+    assert pragma("journal_mode") == "wal"
+    assert pragma("synchronous") == 1  # NORMAL
+    assert pragma("busy_timeout") == int(db.DATABASE_BUSY_TIMEOUT * 1000)
+    assert pragma("cache_size") == -16000
+    assert pragma("temp_store") == 2  # MEMORY
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_opens_its_own_connection():
+    conn = db.get_connection()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            child_conn = db.get_connection()
+            ok = child_conn is not conn and db.get_connection() is child_conn
+            ok = ok and child_conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0] == 1
+        except Exception:
+            ok = False
+        os.write(write_end, b"1" if ok else b"0")
+        os._exit(0)
+    os.close(write_end)
+    result = os.read(read_end, 1)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    assert result == b"1"
+    # The parent keeps using its connection
+    assert db.get_connection() is conn
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Schema migration tests for db.py
+
+Runs the migration runner against temporary databases: a fresh one, one
+created before schema versioning existed, and one where a step fails.
+
+Run with: python -m pytest tests/test_db_migrations.py
+"""
+
+import io
+import os
+import sqlite3
+import contextlib
+
+import pytest
+
+import db
+
+pytestmark = pytest.mark.usefixtures("workdir")
+
+def init_quietly():
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.init_database()
+        db.create_default_channel()
+
+def index_names():
+    rows = db.get_connection().execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    return {row[0] for row in rows}
+
+def test_fresh_database_reaches_latest_version():
+    init_quietly()
+    assert db.get_schema_version() == db.SCHEMA_VERSION
+    assert "idx_authenticated_chats_channel" in index_names()
+    assert db.migrate_database() == 0
+
+def test_unversioned_database_is_upgraded_in_place(workdir):
+    # A database created by the old init_database: base tables only, user_version 0
+    os.makedirs("data")
+    legacy = sqlite3.connect(db.DATABASE_PATH)
+    legacy.executescript('''
+        CREATE TABLE channels (
+            channel_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_name TEXT NOT NULL UNIQUE,
+            channel_secret TEXT NOT NULL UNIQUE,
+            description TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER
+        );
+        CREATE TABLE authenticated_chats (
+            chat_id INTEGER NOT NULL,
+            chat_type TEXT NOT NULL,
+            chat_title TEXT,
+            channel_id INTEGER NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            authenticated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (chat_id, channel_id)
+        );
+        INSERT INTO channels (channel_name, channel_secret) VALUES ('legacy', 's3cret');
+        INSERT INTO authenticated_chats (chat_id, chat_type, channel_id) VALUES (-100, 'group', 1);
+    ''')
+    legacy.close()
+
+    init_quietly()
+    assert db.get_schema_version() == db.SCHEMA_VERSION
+    assert db.get_authenticated_chats_for_channel(1)[0][0] == -100
+    assert db.get_broadcast_job("missing") is None
+
+def test_failed_step_rolls_back_to_previous_version(monkeypatch):
+    def broken_step(cursor):
+        """Step that fails halfway through"""
+        cursor.execute("CREATE TABLE half_done (id INTEGER)")
+        raise sqlite3.OperationalError("boom")
+
+    monkeypatch.setattr(db, "MIGRATIONS", db.MIGRATIONS + [broken_step])
+    monkeypatch.setattr(db, "SCHEMA_VERSION", len(db.MIGRATIONS))
+    with pytest.raises(sqlite3.OperationalError):
+        init_quietly()
+
+    conn = db.get_connection()
+    assert db.get_schema_version() == db.SCHEMA_VERSION - 1
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+def test_newer_database_is_rejected():
+    init_quietly()
+    db.get_connection().execute(f"PRAGMA user_version = {db.SCHEMA_VERSION + 1}")
+    with pytest.raises(RuntimeError):
+        db.migrate_database()
+
+def test_channel_maintenance_uses_authenticated_chats():
+    init_quietly()
+    db.create_channel("news", "secret", "News", chat_id=-1, chat_type="group", chat_title="Group")
+    db.add_authenticated_chat(-2, "group", "Other group", 2)
+    counts = {channel[1]: channel[5] for channel in db.get_all_channels()}
+    assert counts == {"general": 0, "news": 2}
+
+    assert db.deactivate_channel("news")[0]
+    assert db.get_authenticated_chats_for_channel(2) == []
+
+    assert db.delete_channel("news")[0]
+    count = db.get_connection().execute("SELECT COUNT(*) FROM authenticated_chats WHERE channel_id = 2").fetchone()[0]
+    assert count == 0
+
+def test_reactivated_channel_gets_back_the_chats_deactivated_with_it():
+    init_quietly()
+    db.create_channel("news", "secret", "News", chat_id=-1, chat_type="group", chat_title="Group")
+    db.add_authenticated_chat(-2, "group", "Other group", 2)
+    db.add_authenticated_chat(-3, "group", "Kicked group", 2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.deactivate_unreachable_chats([-3])
+
+    assert db.deactivate_channel("news")[0]
+    assert db.count_channel_chats(2) == 0
+    assert db.reactivate_channel("news")[0]
+
+    # The chat that was already unreachable stays inactive
+    assert sorted(chat.chat_id for chat in db.get_authenticated_chats_for_channel(2)) == [-2, -1]
+    assert db.count_channel_chats(2) == 2
+    assert db.check_stats_counters() == []
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Query plan regression tests for db.py
+
+Runs the real db.py functions against a populated temporary database,
+captures the SQL they execute and checks with EXPLAIN QUERY PLAN that the
+hot lookups are served by an index instead of scanning or sorting a table.
+
+Run with: python -m pytest tests/test_db_query_plans.py
+"""
+
+import io
+import contextlib
+
+import pytest
+
+import db
+
+@pytest.fixture(autouse=True)
+def rows(database):
+    """Enough rows for the planner to prefer indexes"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.create_channel("news", "secret", "News channel")
+    conn = db.get_connection()
+    with conn:
+        conn.executemany('''
+            INSERT INTO authenticated_chats (chat_id, chat_type, chat_title, channel_id, is_active)
+            VALUES (?, 'group', ?, ?, ?)
+        ''', [(-chat_id, f"Group {chat_id}", 1 + chat_id % 2, chat_id % 10 != 0) for chat_id in range(1, 2001)])
+        conn.executemany('INSERT INTO users (user_id, first_name) VALUES (?, ?)',
+                         [(user_id, f"User {user_id}") for user_id in range(1, 501)])
+        conn.executemany('INSERT INTO groups (group_id, group_title) VALUES (?, ?)',
+                         [(-group_id, f"Group {group_id}") for group_id in range(1, 51)])
+        conn.executemany('INSERT INTO group_members (group_id, user_id) VALUES (?, ?)',
+                         [(-(user_id % 50 + 1), user_id) for user_id in range(1, 501)])
+
+@pytest.fixture
+def query_plans(sql_trace):
+    """Call a db.py function and return the query plan of every SELECT it ran"""
+    def explain(func, *args):
+        with sql_trace() as statements, contextlib.redirect_stdout(io.StringIO()):
+            func(*args)
+
+        plans = []
+        for sql in statements:
+            if sql.lstrip().upper().startswith("SELECT"):
+                rows = db.get_connection().execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+                plans.append(" | ".join(row[3] for row in rows))
+        assert plans, f"{func.__name__} did not run any SELECT"
+        return plans
+    return explain
+
+def assert_indexed(plan, index_name):
+    assert index_name in plan, plan
+    assert "USE TEMP B-TREE" not in plan, plan
+
+def test_broadcast_recipients_use_channel_index(query_plans):
+    plan, = query_plans(db.get_authenticated_chats_for_channel, 1)
+    assert_indexed(plan, "idx_authenticated_chats_channel")
+    assert "SEARCH authenticated_chats" in plan
+
+def test_all_authenticated_chats_use_active_index(query_plans):
+    plan, = query_plans(db.get_all_authenticated_chats)
+    assert_indexed(plan, "idx_authenticated_chats_active")
+
+def test_chat_lookups_use_primary_key(query_plans):
+    for func in (db.is_chat_authenticated, db.get_authenticated_channels_for_chat):
+        plan, = query_plans(func, -5)
+        assert "SEARCH ac USING INDEX sqlite_autoindex_authenticated_chats_1 (chat_id=?)" in plan, plan
+
+def test_channel_lookups_use_unique_indexes(query_plans):
+    # Bypass the channel cache so the lookups reach the database
+    db.invalidate_channel_cache()
+    generation_plan, plan = query_plans(db.get_channel_by_secret, "secret")
+    assert "SEARCH cache_generations USING INDEX sqlite_autoindex_cache_generations_1 (name=?)" in generation_plan
+    assert "USING INDEX sqlite_autoindex_channels_2 (channel_secret=?)" in plan, plan
+    db.invalidate_channel_cache()
+    *_, plan = query_plans(db.get_channel_by_name, "news")
+    assert "USING INDEX sqlite_autoindex_channels_1 (channel_name=?)" in plan, plan
+    db.invalidate_channel_cache()
+    *_, plan = query_plans(db.get_channel_by_id, 2)
+    assert "SEARCH channels USING INTEGER PRIMARY KEY (rowid=?)" in plan, plan
+
+def test_debug_info_listings_avoid_sorting(query_plans):
+    groups_plan, members_plan, chats_plan = query_plans(db.get_debug_info)
+    assert_indexed(groups_plan, "idx_groups_created_at")
+    # Members come out in group order; only the names within a group are sorted
+    assert "SCAN gm USING COVERING INDEX sqlite_autoindex_group_members_1" in members_plan, members_plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in members_plan, members_plan
+    assert "SEARCH u USING INTEGER PRIMARY KEY" in members_plan, members_plan
+    assert_indexed(chats_plan, "idx_authenticated_chats_authenticated_at")
+
+def test_stats_read_counters_instead_of_counting(query_plans):
+    counters_plan, distribution_plan = query_plans(db.get_bot_stats)
+    assert "SEARCH stats_counters USING INTEGER PRIMARY KEY" in counters_plan, counters_plan
+    assert "authenticated_chats" not in distribution_plan, distribution_plan
+    assert "SEARCH s USING INTEGER PRIMARY KEY" in distribution_plan, distribution_plan
+
+def test_pending_deliveries_use_status_index(query_plans):
+    job_id = db.create_broadcast_job(1, "hello", db.get_authenticated_chats_for_channel(1))
+    plan, = query_plans(db.get_pending_deliveries, job_id, 100)
+    assert "idx_broadcast_deliveries_status (job_id=? AND status=?)" in plan, plan
+
+def test_listing_pages_seek_instead_of_sorting(query_plans):
+    *_, plan = query_plans(db.get_authenticated_chats_page, 1, 50, ("2999-01-01 00:00:00", 0))
+    assert_indexed(plan, "idx_authenticated_chats_channel")
+    assert "(last_activity,chat_id)<(?,?)" in plan, plan
+    plan, = query_plans(db.get_channels_page, 50, ("2999-01-01 00:00:00", 0))
+    assert_indexed(plan, "idx_channels_created_at")
+    plan, = query_plans(db.get_groups_page, 50, None, ("2000-01-01 00:00:00", 0))
+    assert_indexed(plan, "idx_groups_created_at")
+    *_, plan = query_plans(db.get_authenticated_chats_page, 1, 50, None, ("2000-01-01 00:00:00", 0))
+    assert "(last_activity,chat_id)>(?,?)" in plan, plan
+    assert "USE TEMP B-TREE" not in plan, plan
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for delivery retries and dead letters
+
+Checks how broadcast.py classifies send errors, that transient errors are
+retried a bounded number of times, and that failed deliveries end up in the
+dead-letter table from where they can be replayed to just those chats.
+
+Run with: python -m pytest tests/test_delivery_retries.py
+"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+import db
+import broadcast
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(database, db_executor, monkeypatch):
+    monkeypatch.setattr(broadcast, "RETRY_BASE_DELAY", 0)
+
+class FlakyBot:
+    """Fails sends to the chats in `failing` every time, and to those in `errors` once per listed error"""
+
+    def __init__(self, failing=None, errors=None):
+        self.failing = failing or {}
+        self.errors = {chat_id: list(chat_errors) for chat_id, chat_errors in (errors or {}).items()}
+        self.calls = []
+
+    async def send_message(self, chat_id, text):
+        self.calls.append(chat_id)
+        if chat_id in self.failing:
+            raise self.failing[chat_id]
+        if self.errors.get(chat_id):
+            raise self.errors[chat_id].pop(0)
+
+@pytest.mark.parametrize("error, permanent", [
+    (Forbidden("Forbidden: bot was blocked by the user"), True),
+    (BadRequest("Chat not found"), True),
+    (TimedOut(), False),
+    (NetworkError("Connection reset"), False),
+    (RetryAfter(1), False),
+    (RuntimeError("bug"), True),
+])
+def test_errors_are_classified(error, permanent):
+    assert broadcast.is_permanent_error(error) is permanent
+
+def test_retry_delay_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(broadcast, "RETRY_BASE_DELAY", 1)
+    delays = [broadcast.retry_delay(10) for _ in range(100)]
+    assert all(0 <= delay <= broadcast.RETRY_MAX_DELAY for delay in delays)
+    assert len(set(delays)) > 1
+
+def test_flood_control_is_only_retried_by_the_rate_limiter():
+    # RetryAfter reaching send_with_retries already went through the limiter's retries
+    bot = FlakyBot({1: RetryAfter(5)})
+    failure = asyncio.run(broadcast.send_with_retries(bot, 1, "hello"))
+    assert failure == broadcast.DeliveryFailure("Flood control exceeded. Retry in 5 seconds", False, 1)
+    assert bot.calls == [1]
+
+def test_transient_errors_are_retried_until_delivered():
+    bot = FlakyBot(errors={1: [TimedOut(), NetworkError("Connection reset")]})
+    assert asyncio.run(broadcast.send_with_retries(bot, 1, "hello")) is None
+    assert bot.calls == [1, 1, 1]
+
+def test_retries_are_bounded_and_permanent_errors_are_not_retried():
+    bot = FlakyBot({1: NetworkError("down"), 2: Forbidden("Forbidden: bot was kicked")})
+    chats = [db.PendingDelivery(chat_id, "private", None) for chat_id in (1, 2, 3)]
+    failures = asyncio.run(broadcast.deliver(bot, chats, "hello"))
+    assert failures[0] == broadcast.DeliveryFailure("down", False, broadcast.SEND_RETRIES + 1)
+    assert failures[1] == broadcast.DeliveryFailure("Forbidden: bot was kicked", True, 1, unreachable=True)
+    assert failures[2] is None
+    assert bot.calls.count(2) == 1
+
+def test_deliver_keeps_the_sends_in_flight_up_to_the_cap():
+    in_flight = 0
+    peak = 0
+    sent = []
+
+    class SlowBot:
+        async def send_message(self, chat_id, text):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(0.01)
+                if chat_id == 3:
+                    raise Forbidden("Forbidden: bot was blocked by the user")
+                sent.append(chat_id)
+            finally:
+                in_flight -= 1
+
+    chats = [db.PendingDelivery(chat_id, "private", None) for chat_id in range(1, 11)]
+    failures = asyncio.run(broadcast.deliver(SlowBot(), chats, "hello", concurrency=4))
+    assert peak == 4
+    # The failed send neither cancels the sends in flight with it nor the ones after it
+    assert [failure is None for failure in failures] == [chat_id != 3 for chat_id in range(1, 11)]
+    assert sorted(sent) == [1, 2, 4, 5, 6, 7, 8, 9, 10]
+
+def queue_broadcast(chat_ids):
+    db.import_authenticated_chats(1, [(chat_id, "group", f"Group {chat_id}") for chat_id in chat_ids])
+    chats = db.get_authenticated_chats_for_channel(1)
+    return db.create_broadcast_job(1, "hello", chats)
+
+def test_failed_deliveries_are_dead_lettered_and_replayed(run_job):
+    job_id = queue_broadcast([-1, -2, -3])
+    bot = FlakyBot({-2: BadRequest("Message is too long"), -3: TimedOut()})
+    run_job(job_id, bot)
+
+    job = db.get_broadcast_job(job_id)
+    assert (job.sent_count, job.failed_count) == (1, 2)
+    dead_letters = {row.chat_id: row for row in db.get_dead_letters(job_id)}
+    assert set(dead_letters) == {-2, -3}
+    assert dead_letters[-2].permanent and dead_letters[-2].attempts == 1
+    assert not dead_letters[-3].permanent and dead_letters[-3].attempts == broadcast.SEND_RETRIES + 1
+
+    # Only the transient failure is replayed, and only once
+    replay_job_id, total = db.replay_dead_letters(job_id)
+    assert total == 1
+    assert [row.chat_id for row in db.get_broadcast_deliveries(replay_job_id)] == [-3]
+    assert db.replay_dead_letters(job_id) == (None, 0)
+
+    run_job(replay_job_id, FlakyBot({}))
+    assert db.get_broadcast_job(replay_job_id).sent_count == 1
+    assert db.get_dead_letters(replay_job_id) == []
+
+    replay_job_id, total = db.replay_dead_letters(job_id, include_permanent=True)
+    assert total == 1
+    assert [row.chat_id for row in db.get_broadcast_deliveries(replay_job_id)] == [-2]
+
+def test_dead_letter_endpoints(client, run_job):
+    headers = {"X-API-Key": "test-key"}
+    job_id = queue_broadcast([-1, -2])
+    run_job(job_id, FlakyBot({-1: TimedOut()}))
+
+    response = client.get(f"/api/broadcast-jobs/{job_id}/dead-letters", headers=headers)
+    assert response.status_code == 200
+    assert [(row["chat_id"], row["permanent"]) for row in response.get_json()["dead_letters"]] == [(-1, False)]
+
+    response = client.post(f"/api/broadcast-jobs/{job_id}/replay", headers=headers)
+    assert response.status_code == 202
+    assert response.get_json()["total_authenticated_chats"] == 1
+    assert client.post(f"/api/broadcast-jobs/{job_id}/replay", headers=headers).status_code == 404
+    assert client.post("/api/broadcast-jobs/missing/replay", headers=headers).status_code == 404
+    assert client.get(f"/api/broadcast-jobs/{job_id}/dead-letters").status_code == 401
+
+def test_lease_is_renewed_while_a_batch_outlives_it(run_job, monkeypatch):
+    monkeypatch.setattr(broadcast, "JOB_LEASE_SECONDS", 1)
+    job_id = queue_broadcast([-1, -2])
+    assert db.claim_broadcast_job(1)[0] == job_id
+
+    class SlowBot:
+        async def send_message(self, chat_id, text):
+            await asyncio.sleep(2.5)
+
+    # Another worker's dispatcher keeps looking for abandoned jobs meanwhile
+    stolen = []
+    done = threading.Event()
+    def other_dispatcher():
+        while not done.is_set():
+            job = db.claim_broadcast_job(1)
+            if job:
+                stolen.append(job)
+            time.sleep(0.1)
+        db.close_connection()
+    thread = threading.Thread(target=other_dispatcher)
+    thread.start()
+    try:
+        run_job(job_id, SlowBot())
+    finally:
+        done.set()
+        thread.join()
+
+    assert stolen == []
+    job = db.get_broadcast_job(job_id)
+    assert (job.status, job.sent_count) == ("completed", 2)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the health endpoints in api.py
+
+Checks that the liveness probe does no work, that the readiness probe only
+runs constant-time checks and reports failures with a 503.
+
+Run with: python -m pytest tests/test_health.py
+"""
+
+import pytest
+
+import db
+import api
+
+@pytest.fixture(autouse=True)
+def bot_reachable(database, monkeypatch):
+    monkeypatch.setattr(api, "check_bot", lambda: (True, "Telegram reachable"))
+
+@pytest.fixture
+def traced(client, sql_trace):
+    """GET url and return the response with the SQL statements it ran"""
+    def get(url):
+        with sql_trace() as statements:
+            response = client.get(url)
+        return response, statements
+    return get
+
+def test_liveness_runs_no_queries(traced):
+    response, statements = traced("/api/health/live")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "alive"
+    assert statements == []
+
+def test_readiness_does_not_read_tables(traced):
+    response, statements = traced("/api/health/ready")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "ready"
+    assert body["checks"]["database"]["ok"] and body["checks"]["bot"]["ok"]
+    assert statements and not any("FROM" in sql.upper() for sql in statements)
+
+def test_readiness_fails_when_a_check_fails(client, monkeypatch):
+    monkeypatch.setattr(api, "check_bot", lambda: (False, "Bot token is not configured"))
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert response.get_json()["checks"]["bot"] == {"ok": False, "detail": "Bot token is not configured"}
+
+def test_readiness_reports_outdated_schema(client):
+    db.get_connection().execute("PRAGMA user_version = 1")
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert not response.get_json()["checks"]["database"]["ok"]
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for the keyset pagination of the channel and chat listings
+
+Checks that walking the pages returns every row exactly once even while rows
+are added, and that the listing endpoints validate their cursors.
+
+Run with: python -m pytest tests/test_pagination.py
+"""
+
+import io
+import json
+import contextlib
+
+import pytest
+
+import db
+
+@pytest.fixture(autouse=True)
+def listings(database):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for number in range(1, 25):
+            db.create_channel(f"channel{number}", f"secret{number}")
+    # Imported chats share one timestamp, so the pages have to break ties by chat_id
+    db.import_authenticated_chats(1, [(-chat_id, "group", f"Group {chat_id}") for chat_id in range(1, 251)])
+
+def test_chat_pages_match_the_full_listing():
+    chats = []
+    after = None
+    while True:
+        page = db.get_authenticated_chats_page(1, 40, after)
+        if not page:
+            break
+        chats.extend(page)
+        after = (page[-1][5], page[-1][0])
+    assert chats == sorted(chats, key=lambda chat: (chat[5], chat[0]), reverse=True)
+    assert sorted(chats) == sorted(db.get_authenticated_chats_for_channel(1))
+    assert db.count_channel_chats(1) == 250
+
+def test_channel_pages_match_the_full_listing():
+    channels = []
+    after = None
+    while True:
+        page = db.get_channels_page(7, after)
+        if not page:
+            break
+        channels.extend(page)
+        after = (page[-1][4], page[-1][0])
+    assert sorted(channels) == sorted(db.get_all_channels())
+    assert len(channels) == db.count_channels() == 25
+
+def test_chat_endpoint_walks_all_pages(client):
+    headers = {"X-API-Key": "test-key"}
+    secret = db.get_connection().execute("SELECT channel_secret FROM channels WHERE channel_id = 1").fetchone()[0]
+    seen = []
+    cursor = None
+    while True:
+        response = client.post("/api/channel/general/chats", headers=headers,
+                               json={"channel_secret": secret, "limit": 100, "cursor": cursor})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["total"] == (250 if cursor is None else 251)
+        seen.extend(chat["chat_id"] for chat in data["chats"])
+        if cursor is None:
+            # Chats authenticated while paging sort before the cursor and are not repeated
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.add_authenticated_chat(1000, "private", "Late chat", 1)
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 250
+
+def test_channel_endpoint_pages(client):
+    headers = {"X-API-Key": "test-key"}
+    first = client.get("/api/channels?limit=10", headers=headers).get_json()
+    assert len(first["channels"]) == 10 and first["total"] == 25
+    rest = client.get(f"/api/channels?limit=1000&cursor={first['next_cursor']}", headers=headers).get_json()
+    assert len(rest["channels"]) == 15 and rest["next_cursor"] is None
+    names = {channel["channel_name"] for channel in first["channels"] + rest["channels"]}
+    assert len(names) == 25
+
+def test_endpoints_reject_bad_page_arguments(client):
+    headers = {"X-API-Key": "test-key"}
+    for query in ("limit=0", "limit=1001", "limit=ten", "cursor=bogus", "cursor=WzEsMl0"):
+        assert client.get(f"/api/channels?{query}", headers=headers).status_code == 400, query
+
+def test_listings_stream_ndjson(client):
+    headers = {"X-API-Key": "test-key"}
+    response = client.get("/api/channels?format=ndjson&limit=7", headers=headers)
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+    channels = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len({channel["channel_id"] for channel in channels}) == 25
+
+    # The stream continues from a page cursor
+    first = client.get("/api/channels?limit=10", headers=headers).get_json()
+    response = client.get(f"/api/channels?format=ndjson&cursor={first['next_cursor']}", headers=headers)
+    assert len(response.get_data(as_text=True).splitlines()) == 15
+
+    secret = db.get_connection().execute("SELECT channel_secret FROM channels WHERE channel_id = 1").fetchone()[0]
+    response = client.post("/api/channel/general/chats", headers=headers,
+                           json={"channel_secret": secret, "format": "ndjson", "limit": 40})
+    chats = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len({chat["chat_id"] for chat in chats}) == 250 and chats[0]["is_active"] is True
+
+    assert client.get("/api/channels?format=xml", headers=headers).status_code == 400
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for the outgoing rate limiter in rate_limiter.py
+
+Runs the token buckets and TelegramRateLimiter against a fake clock, so the
+per-chat and global limits, flood control pauses and retries are checked
+without waiting, and that gunicorn runs a single process so its limits hold.
+
+Run with: python -m pytest tests/test_rate_limiter.py
+"""
+
+import types
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+
+import api
+import rate_limiter
+
+class FakeClock:
+    """monotonic() and sleep() of a clock that only moves when something sleeps"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += delay
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(rate_limiter, "asyncio", types.SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+def send_times(limiter, clock, chat_ids, rate_limit_args=None):
+    """Send one request per chat id in order and return the fake time each one went out"""
+    times = []
+
+    async def callback():
+        times.append(clock.now - 1000.0)
+        return True
+
+    async def main():
+        for chat_id in chat_ids:
+            await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": chat_id}, rate_limit_args)
+
+    asyncio.run(main())
+    return times
+
+def test_token_bucket_bursts_then_refills_up_to_capacity(clock):
+    bucket = rate_limiter.TokenBucket(rate=1, capacity=3)
+    assert [bucket.reserve() for _ in range(5)] == [0, 0, 0, 1, 2]
+    assert not bucket.is_idle()
+    clock.now += 10
+    # Refilling stops at the capacity: again only three requests pass at once
+    assert bucket.is_idle()
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0, 1]
+
+def test_private_chats_get_one_message_per_second_after_a_burst(clock):
+    limiter = rate_limiter.TelegramRateLimiter()
+    assert send_times(limiter, clock, [42] * 5) == [0, 0, 0, 1, 2]
+
+def test_groups_get_their_per_minute_budget(clock):
+    limiter = rate_limiter.TelegramRateLimiter(group_rate_per_minute=20)
+    times = send_times(limiter, clock, [-100] * 22)
+    assert times[:20] == [0] * 20
+    assert times[20:] == pytest.approx([3, 6])
+    # Other chats do not wait for the busy group
+    assert send_times(limiter, clock, [-200, 7])[0] == times[-1]
+
+def test_global_rate_applies_across_chats(clock):
+    limiter = rate_limiter.TelegramRateLimiter(global_rate=30)
+    times = send_times(limiter, clock, range(1, 33))
+    assert times[:30] == [0] * 30
+    assert times[30:] == pytest.approx([1 / 30, 2 / 30])
+
+def test_retry_after_pauses_every_request(clock):
+    limiter = rate_limiter.TelegramRateLimiter()
+    calls = []
+
+    async def flood_once():
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise RetryAfter(5)
+        return True
+
+    async def main():
+        return await limiter.process_request(flood_once, (), {}, "sendMessage", {"chat_id": 1}, None)
+
+    assert asyncio.run(main()) is True
+    assert calls == [1000.0, 1005.0]
+    assert limiter.paused_until == 1005.0
+
+    # A request to any other chat waits for a pause still in effect
+    limiter.paused_until = clock.now + 4
+    assert send_times(limiter, clock, [2]) == [9]
+
+def test_gives_up_after_max_retries(clock):
+    limiter = rate_limiter.TelegramRateLimiter(max_retries=2)
+    calls = []
+
+    async def always_flooded():
+        calls.append(clock.now)
+        raise RetryAfter(1)
+
+    def request(rate_limit_args=None):
+        return limiter.process_request(always_flooded, (), {}, "sendMessage", {"chat_id": 1}, rate_limit_args)
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(request())
+    assert len(calls) == 3
+
+    # rate_limit_args overrides the number of retries
+    calls.clear()
+    with pytest.raises(RetryAfter):
+        asyncio.run(request(0))
+    assert len(calls) == 1
+
+def test_idle_chat_buckets_are_dropped(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "MAX_TRACKED_CHATS", 2)
+    limiter = rate_limiter.TelegramRateLimiter()
+    send_times(limiter, clock, [1, 2])
+    clock.now += 60
+    send_times(limiter, clock, [3])
+    assert list(limiter.chat_buckets) == [3]
+
+def test_gunicorn_runs_one_worker_process(monkeypatch):
+    commands = []
+    monkeypatch.setattr(api, "TELEGRAM_CHANNEL_BOT_API_SERVER", "gunicorn")
+    monkeypatch.setattr("subprocess.run", lambda cmd, check: commands.append(cmd))
+    api.run_api()
+    cmd, = commands
+    # Every worker process would have its own limiter and dispatcher
+    assert cmd[cmd.index("--workers") + 1] == "1"
+    assert cmd[cmd.index("--threads") + 1] == str(api.TELEGRAM_CHANNEL_BOT_API_THREADS)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the broadcast recipient cache in db.py
+
+Checks that repeated broadcasts to a channel reuse the cached recipient rows,
+that membership changes made by this process patch them in place and that
+changes made by another process cause a reload.
+
+Run with: python -m pytest tests/test_recipient_cache.py
+"""
+
+import io
+import sqlite3
+import contextlib
+
+import pytest
+
+import db
+
+@pytest.fixture(autouse=True)
+def chats(database):
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.create_channel("news", "secret")
+        for chat_id in range(1, 6):
+            db.add_authenticated_chat(-chat_id, "group", f"Group {chat_id}", 1)
+
+@pytest.fixture
+def recipients(sql_trace):
+    """Return the cached recipients and the number of authenticated_chats queries it took"""
+    def load():
+        with sql_trace() as statements, contextlib.redirect_stdout(io.StringIO()):
+            chats = db.get_channel_recipients(1)
+        return chats, sum("FROM authenticated_chats" in sql for sql in statements)
+    return load
+
+def chat_ids(chats):
+    return sorted(chat[0] for chat in chats)
+
+def test_cached_rows_match_the_channel_listing(recipients):
+    chats, loads = recipients()
+    assert loads == 1
+    assert list(chats) == db.get_authenticated_chats_for_channel(1)
+    assert recipients() == (chats, 0)
+
+def test_local_changes_are_applied_in_place(recipients):
+    recipients()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.add_authenticated_chat(-10, "supergroup", "New group", 1)
+        db.remove_authenticated_chat(-1)
+        db.remove_authenticated_chat_from_channel(-2, "general")
+        # Changes to other channels leave this one alone
+        db.add_authenticated_chat(-3, "group", "Group 3", 2)
+
+    chats, loads = recipients()
+    assert loads == 0
+    assert chat_ids(chats) == [-10, -5, -4, -3]
+    assert chats[0][0] == -10  # most recently active first
+    assert chat_ids(chats) == chat_ids(db.get_authenticated_chats_for_channel(1))
+
+def test_changes_by_other_processes_cause_a_reload(recipients):
+    recipients()
+    other = sqlite3.connect(db.DATABASE_PATH)
+    with other:
+        other.execute("UPDATE authenticated_chats SET is_active = FALSE WHERE chat_id = -5")
+    other.close()
+
+    chats, loads = recipients()
+    assert loads == 1
+    assert chat_ids(chats) == [-4, -3, -2, -1]
+
+def test_channel_maintenance_invalidates_recipients(recipients):
+    recipients()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.deactivate_channel("general")
+    assert recipients()[0] == ()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the row records returned by db.py
+
+Checks that every listing returns the record type of its rows, built by the
+shared row factory, and that records still unpack like the tuples they replace.
+
+Run with: python -m pytest tests/test_records.py
+"""
+
+import io
+import sys
+import contextlib
+
+import pytest
+
+import db
+
+@pytest.fixture(autouse=True)
+def rows(database):
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.add_authenticated_chat(-1, "group", "Group 1", 1)
+        db.write_tracking_batch([(10, "user", "User", None)], [(-1, "Group 1")], [(-1, 10)], [])
+
+def test_listings_return_records():
+    listings = [
+        (db.AuthenticatedChat, db.get_authenticated_chats_for_channel(1)),
+        (db.AuthenticatedChat, db.get_authenticated_chats_page(1, 10)),
+        (db.AuthenticatedChat, list(db.iter_authenticated_chats(1))),
+        (db.AuthenticatedChat, db.get_channel_recipients(1)),
+        (db.AuthenticatedChat, db.get_all_authenticated_chats()),
+        (db.ChannelSummary, db.get_all_channels()),
+        (db.ChannelSummary, db.get_channels_page(10)),
+        (db.Group, db.get_groups_page(10)),
+        (db.Member, db.get_group_members_preview([-1], 10)),
+        (db.ChatChannel, db.get_authenticated_channels_for_chat(-1)),
+        (db.Group, db.get_debug_info()["groups"]),
+        (db.Member, db.get_debug_info()["group_members"]),
+        (db.AuthenticatedChat, db.get_debug_info()["authenticated_chats"]),
+    ]
+    for record_type, rows in listings:
+        assert rows and all(type(row) is record_type for row in rows), record_type.__name__
+
+    chat, = db.get_authenticated_chats_for_channel(1)
+    chat_id, chat_type, chat_title, is_active, authenticated_at, last_activity = chat
+    assert (chat.chat_id, chat.chat_title, chat.is_active) == (chat_id, chat_title, is_active) == (-1, "Group 1", 1)
+    assert db.get_group_members_preview([-1], 10) == [db.Member(-1, 10, "user", "User")]
+    assert db.count_group_members([-1, -2]) == {-1: 1}
+
+def test_records_are_as_small_as_tuples():
+    chat, = db.get_authenticated_chats_for_channel(1)
+    assert not hasattr(chat, "__dict__")
+    assert sys.getsizeof(chat) == sys.getsizeof(tuple(chat))
+
+def test_cached_recipients_stay_records_after_local_changes():
+    db.get_channel_recipients(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.add_authenticated_chat(-2, "supergroup", "Group 2", 1)
+    assert [type(chat) for chat in db.get_channel_recipients(1)] == [db.AuthenticatedChat] * 2
+
+def test_broadcast_queries_return_records():
+    job_id = db.create_broadcast_job(1, "hello", db.get_channel_recipients(1))
+    assert db.get_pending_deliveries(job_id, 10) == [db.PendingDelivery(-1, "group", "Group 1")]
+    db.record_delivery_results(job_id, [(-1, "Chat not found", True, 1)], 60)
+
+    job = db.get_broadcast_job(job_id)
+    assert type(job) is db.BroadcastJob
+    assert (job.channel_name, job.total_chats, job.failed_count) == ("general", 1, 1)
+    delivery, = db.get_broadcast_deliveries(job_id)
+    assert type(delivery) is db.Delivery and (delivery.status, delivery.error) == ("failed", "Chat not found")
+    dead_letter, = db.get_dead_letters(job_id)
+    assert type(dead_letter) is db.DeadLetter
+    assert (dead_letter.chat_title, dead_letter.permanent, dead_letter.replay_job_id) == ("Group 1", 1, None)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the statistics counters in db.py
+
+Checks that the trigger-maintained counters read by get_bot_stats agree with
+the tables after every kind of write, and that drift is detected and repaired.
+
+Run with: python -m pytest tests/test_stats_counters.py
+"""
+
+import io
+import contextlib
+
+import pytest
+
+import db
+
+pytestmark = pytest.mark.usefixtures("database")
+
+def counted_stats() -> dict:
+    """Statistics computed by scanning the tables"""
+    conn = db.get_connection()
+    count = lambda sql: conn.execute(sql).fetchone()[0]
+    return {
+        "total_users": count("SELECT COUNT(*) FROM users"),
+        "total_groups": count("SELECT COUNT(*) FROM groups"),
+        "total_channels": count("SELECT COUNT(*) FROM channels"),
+        "total_authenticated_chats": count("SELECT COUNT(*) FROM authenticated_chats WHERE is_active = TRUE"),
+        "channel_distribution": sorted(conn.execute('''
+            SELECT c.channel_name, COUNT(ac.chat_id)
+            FROM channels c
+            LEFT JOIN authenticated_chats ac ON c.channel_id = ac.channel_id AND ac.is_active = TRUE
+            GROUP BY c.channel_id
+        ''').fetchall()),
+    }
+
+def stored_stats() -> dict:
+    stats = db.get_bot_stats()
+    stats["channel_distribution"] = sorted(stats["channel_distribution"])
+    return stats
+
+def test_counters_follow_every_write():
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.create_channel("news", "secret", chat_id=-1, chat_type="group", chat_title="Group 1")
+        for user_id in range(3):
+            db.add_user_to_db(user_id, "user", "User", None)
+            db.add_user_to_db(user_id, "renamed", "User", None)
+        db.add_group_to_db(-1, "Group 1")
+        db.add_group_to_db(-1, "Group 1 renamed")
+        db.write_tracking_batch([(10, "u", "U", None)], [(-2, "Group 2")], [(-2, 10)], [])
+        db.add_authenticated_chat(-1, "group", "Group 1", 1)
+        db.add_authenticated_chat(-1, "group", "Group 1", 1)  # authenticating again
+        db.add_authenticated_chat(-2, "group", "Group 2", 1)
+        db.add_authenticated_chat(-2, "group", "Group 2", 2)
+        assert stored_stats() == counted_stats()
+
+        db.remove_authenticated_chat_from_channel(-2, "news")
+        db.remove_authenticated_chat(-1)
+        assert stored_stats() == counted_stats()
+
+        db.add_authenticated_chat(-3, "private", "Chat 3", 2)
+        db.deactivate_channel("news")
+        assert stored_stats() == counted_stats()
+        db.delete_channel("news")
+        assert stored_stats() == counted_stats()
+
+    assert db.get_bot_stats()["total_users"] == 4
+    assert db.get_bot_stats()["channel_distribution"] == [("general", 1)]
+
+def test_all_channels_report_active_chat_counts():
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.add_authenticated_chat(-1, "group", "Group 1", 1)
+        db.add_authenticated_chat(-2, "group", "Group 2", 1)
+    assert [channel[5] for channel in db.get_all_channels()] == [2]
+
+def test_drift_is_detected_and_repaired():
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.add_authenticated_chat(-1, "group", "Group 1", 1)
+    conn = db.get_connection()
+    with conn:
+        conn.execute("UPDATE stats_counters SET total_users = 42, total_authenticated_chats = 0")
+        conn.execute("UPDATE channel_stats SET active_chats = 7")
+    assert stored_stats() != counted_stats()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        drifted = db.check_stats_counters()
+    assert drifted == ["total_users", "total_authenticated_chats", "channel 1"]
+    assert stored_stats() == counted_stats()
+    assert db.check_stats_counters() == []
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for tracking.py
+
+Checks that buffered user, group and membership tracking coalesces repeated
+updates, skips unchanged rows and keeps joins and leaves in order.
+
+Run with: python -m pytest tests/test_tracking.py
+"""
+
+import io
+import os
+import contextlib
+
+import pytest
+
+import db
+import tracking
+
+@pytest.fixture(autouse=True)
+def flusher(database, monkeypatch):
+    # Flush explicitly instead of from the background thread
+    monkeypatch.setattr(tracking, "_flusher_pid", os.getpid())
+    for state in (tracking._pending_users, tracking._pending_groups, tracking._pending_members,
+                  tracking._written_users, tracking._written_groups, tracking._written_members):
+        state.clear()
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Record every batch written by the flusher"""
+    written = []
+
+    def write_tracking_batch(*batch):
+        written.append(batch)
+        db.write_tracking_batch(*batch)
+
+    monkeypatch.setattr(tracking, "write_tracking_batch", write_tracking_batch)
+    return written
+
+def query(sql):
+    return db.get_connection().execute(sql).fetchall()
+
+def test_repeated_commands_coalesce_into_one_transaction(batches):
+    for _ in range(50):
+        tracking.track_user(1, "alice", "Alice", None)
+        tracking.track_group(-10, "Group")
+        tracking.track_group_member(-10, 1)
+
+    assert tracking.flush() == 3
+    assert len(batches) == 1
+    assert query("SELECT user_id, username FROM users") == [(1, "alice")]
+    assert query("SELECT group_id, user_id FROM group_members") == [(-10, 1)]
+
+def test_unchanged_rows_are_not_written_again(batches):
+    tracking.track_user(1, "alice", "Alice", None)
+    tracking.track_group(-10, "Group")
+    tracking.track_group_member(-10, 1)
+    tracking.flush()
+
+    tracking.track_user(1, "alice", "Alice", None)
+    tracking.track_group(-10, "Group")
+    tracking.track_group_member(-10, 1)
+    assert tracking.flush() == 0
+
+    tracking.track_group(-10, "Renamed group")
+    assert tracking.flush() == 1
+    assert query("SELECT group_title FROM groups") == [("Renamed group",)]
+    assert len(batches) == 2
+
+def test_upsert_keeps_created_at():
+    db.get_connection().execute(
+        "INSERT INTO users (user_id, username, created_at) VALUES (1, 'old', '2020-01-01 00:00:00')")
+    db.get_connection().commit()
+    tracking.track_user(1, "new", "New", None)
+    tracking.flush()
+    assert query("SELECT username, created_at FROM users") == [("new", "2020-01-01 00:00:00")]
+
+def test_leave_after_join_wins():
+    tracking.track_group_member(-10, 1)
+    tracking.track_group_member_left(-10, 1)
+    tracking.flush()
+    assert query("SELECT * FROM group_members") == []
+
+    tracking.track_group_member(-10, 1)
+    tracking.flush()
+    tracking.track_group_member_left(-10, 1)
+    tracking.flush()
+    tracking.track_group_member(-10, 1)
+    tracking.flush()
+    assert query("SELECT group_id, user_id FROM group_members") == [(-10, 1)]
+
+def test_failed_flush_keeps_rows_pending(monkeypatch):
+    def failing_batch(*batch):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(tracking, "write_tracking_batch", failing_batch)
+    tracking.track_user(1, "alice", "Alice", None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert tracking.flush() == 0
+
+    monkeypatch.setattr(tracking, "write_tracking_batch", db.write_tracking_batch)
+    assert tracking.flush() == 1
+    assert query("SELECT user_id FROM users") == [(1,)]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for webhook mode
+
+Checks the webhook configuration in webhook.py and replays the harness's
+updates against python-telegram-bot's webhook server (started locally, without
+registering the webhook with Telegram).
+
+Run with: python -m pytest tests/test_webhook.py
+"""
+
+import os
+import sys
+import socket
+import asyncio
+
+import pytest
+from telegram import Bot
+from telegram.ext import Updater
+
+# webhook_harness is a script next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import webhook
+import webhook_harness
+
+def test_polling_without_webhook_url(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", "")
+    assert webhook.webhook_settings() is None
+
+def test_webhook_settings(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", "https://bot.example.com")
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "s3cret_token-1")
+    settings = webhook.webhook_settings()
+    assert settings["webhook_url"] == "https://bot.example.com/telegram"
+    assert settings["url_path"] == "telegram" and settings["secret_token"] == "s3cret_token-1"
+
+@pytest.mark.parametrize("url, secret", [
+    ("https://bot.example.com", ""),
+    ("https://bot.example.com", "not allowed!"),
+    ("http://bot.example.com", "s3cret"),
+])
+def test_invalid_webhook_settings_are_rejected(monkeypatch, url, secret):
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", url)
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", secret)
+    with pytest.raises(ValueError):
+        webhook.webhook_settings()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_harness_updates_reach_the_update_queue(monkeypatch):
+    async def offline(*args, **kwargs):
+        pass
+    # Neither fetch the bot's own user nor register the webhook with Telegram
+    monkeypatch.setattr(Bot, "initialize", offline)
+    monkeypatch.setattr(Updater, "_bootstrap", offline)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/telegram"
+
+    async def main():
+        queue = asyncio.Queue()
+        updater = Updater(Bot("123:TEST"), queue)
+        async with updater:
+            await updater.start_webhook(listen="127.0.0.1", port=port, url_path="telegram",
+                                        webhook_url="https://bot.example.com/telegram", secret_token="s3cret")
+            updates = webhook_harness.sample_updates(42, 42)
+            results = await asyncio.to_thread(webhook_harness.replay, url, updates, "s3cret", 2, 1)
+            rejected = await asyncio.to_thread(webhook_harness.replay, url, updates[:1], "wrong")
+            received = [queue.get_nowait() for _ in range(queue.qsize())]
+            await updater.stop()
+        return results, rejected, received
+
+    results, rejected, received = asyncio.run(main())
+    assert [status for status, _ in results] == [200] * 6
+    assert [status for status, _ in rejected] == [403]
+    assert [update.update_id for update in received] == list(range(1, 7))
+    assert received[0].message.text == "/start" and received[0].effective_chat.id == 42
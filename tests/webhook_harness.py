@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Webhook test harness
+
+Posts recorded Telegram updates to a locally running bot in webhook mode, the
+way Telegram would, and reports the status and latency of every request. Use it
+to check the secret token setup and to measure update handling without
+exposing the bot to the internet.
+
+Updates are read from an NDJSON file (one update object per line, as returned
+by getUpdates); without a file a few sample commands are sent. update_id and
+message dates are rewritten so recorded updates can be replayed any number of
+times.
+
+Usage:
+    python tests/webhook_harness.py --url http://localhost:8443/telegram --secret <secret>
+    python tests/webhook_harness.py --updates recorded.ndjson --repeat 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import urllib.error
+import urllib.request
+from typing import Iterable, List, Optional, Tuple
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def sample_updates(chat_id: int, user_id: int) -> List[dict]:
+    """A few private-chat commands from the given user"""
+    user = {"id": user_id, "is_bot": False, "first_name": "Harness", "username": "webhook_harness"}
+    chat = {"id": chat_id, "type": "private", "first_name": "Harness"}
+    updates = []
+    for text in ("/start", "/status", "hello"):
+        message = {"message_id": len(updates) + 1, "date": 0, "chat": chat, "from": user, "text": text}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        updates.append({"update_id": 0, "message": message})
+    return updates
+
+def load_updates(path: str) -> List[dict]:
+    """Read recorded updates from an NDJSON file"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _refresh(update: dict, update_id: int) -> dict:
+    """Give a recorded update a new update_id and the current time as message date"""
+    update = dict(update, update_id=update_id)
+    for key in ("message", "edited_message", "channel_post"):
+        if key in update:
+            update[key] = dict(update[key], date=int(time.time()))
+    return update
+
+def post_update(url: str, update: dict, secret: Optional[str], timeout: float = 10) -> Tuple[int, float]:
+    """Post one update to the webhook and return the HTTP status and the seconds it took"""
+    headers = {"Content-Type": "application/json"}
+    if secret is not None:
+        headers[SECRET_HEADER] = secret
+    request = urllib.request.Request(url, data=json.dumps(update).encode(), headers=headers, method="POST")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+def replay(url: str, updates: Iterable[dict], secret: Optional[str], repeat: int = 1,
+           first_update_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Post every update `repeat` times and return the (status, seconds) of each request"""
+    update_id = first_update_id if first_update_id is not None else int(time.time())
+    results = []
+    updates = list(updates)
+    for _ in range(repeat):
+        for update in updates:
+            results.append(post_update(url, _refresh(update, update_id), secret))
+            update_id += 1
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Post recorded updates to the bot's webhook")
+    parser.add_argument("--url", default="http://localhost:8443/telegram", help="Webhook URL of the local bot")
+    parser.add_argument("--secret", default=os.environ.get("TELEGRAM_CHANNEL_BOT_WEBHOOK_SECRET"),
+                        help="Secret token (default: $TELEGRAM_CHANNEL_BOT_WEBHOOK_SECRET)")
+    parser.add_argument("--updates", help="NDJSON file with recorded updates")
+    parser.add_argument("--chat-id", type=int, default=int(os.environ.get("ADMIN_USER_ID") or 1),
+                        help="Private chat (and user) id of the sample updates")
+    parser.add_argument("--repeat", type=int, default=1, help="How often to send the updates")
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates) if args.updates else sample_updates(args.chat_id, args.chat_id)
+    print(f"Posting {len(updates) * args.repeat} updates to {args.url}")
+
+    # The bot must reject updates without the secret token
+    unauthenticated, _ = post_update(args.url, _refresh(updates[0], 0), None)
+    print(f"{'✅' if unauthenticated == 403 else '❌'} Request without secret token: HTTP {unauthenticated}")
+
+    results = replay(args.url, updates, args.secret, args.repeat)
+    latencies = sorted(seconds * 1000 for _, seconds in results)
+    failed = [status for status, _ in results if status != 200]
+    print(f"{'✅' if not failed else '❌'} {len(results) - len(failed)}/{len(results)} updates accepted")
+    print(f"Latency: median {statistics.median(latencies):.1f} ms, "
+          f"p95 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.1f} ms, "
+          f"max {latencies[-1]:.1f} ms")
+    sys.exit(1 if failed or unauthenticated != 403 else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import time
+import atexit
+import threading
+from typing import Dict, Tuple, Optional
+
+from db import write_tracking_batch
+
+# Environment variables are loaded by docker-compose
+
+# Buffered tracking writes are flushed at least this often (milliseconds)...
+FLUSH_INTERVAL = float(os.environ.get("TELEGRAM_CHANNEL_BOT_TRACKING_FLUSH_MS", 500)) / 1000
+# ...or as soon as this many rows are pending
+FLUSH_ROWS = int(os.environ.get("TELEGRAM_CHANNEL_BOT_TRACKING_FLUSH_ROWS", 500))
+# An unchanged user is written again only to refresh last_seen, at most this often (seconds)
+LAST_SEEN_RESOLUTION = 300
+# Upper bound for the rows remembered as already written
+MAX_REMEMBERED = 50000
+
+# Tracking is bookkeeping only (users, groups and who is in which group), so the
+# bot handlers record it here instead of writing to SQLite on every command.
+# A background thread writes the latest state of every touched row in one
+# transaction and skips rows that did not change since they were last written.
+_lock = threading.Lock()
+_pending_users: Dict[int, Tuple] = {}
+_pending_groups: Dict[int, Tuple] = {}
+# (group_id, user_id) -> True when the user joined, False when they left
+_pending_members: Dict[Tuple[int, int], bool] = {}
+
+# What was last written: user rows with the time they were written, group rows, memberships
+_written_users: Dict[int, Tuple[Tuple, float]] = {}
+_written_groups: Dict[int, Tuple] = {}
+_written_members: set = set()
+
+_flush_wakeup = threading.Event()
+_flusher_pid: Optional[int] = None
+
+def _pending_count() -> int:
+    return len(_pending_users) + len(_pending_groups) + len(_pending_members)
+
+def _queued():
+    """Start the flusher on first use and wake it early when enough rows are pending"""
+    if _flusher_pid != os.getpid():
+        start_flusher()
+    if _pending_count() >= FLUSH_ROWS:
+        _flush_wakeup.set()
+
+def track_user(user_id: int, username: str, first_name: str, last_name: str):
+    """Record that a user was seen (buffered replacement for db.add_user_to_db)"""
+    row = (user_id, username, first_name, last_name)
+    with _lock:
+        written = _written_users.get(user_id)
+        if user_id not in _pending_users and written is not None and written[0] == row \
+                and time.monotonic() - written[1] < LAST_SEEN_RESOLUTION:
+            return
+        _pending_users[user_id] = row
+    _queued()
+
+def track_group(group_id: int, group_title: str):
+    """Record that a group is active (buffered replacement for db.add_group_to_db)"""
+    row = (group_id, group_title)
+    with _lock:
+        if group_id not in _pending_groups and _written_groups.get(group_id) == row:
+            return
+        _pending_groups[group_id] = row
+    _queued()
+
+def track_group_member(group_id: int, user_id: int):
+    """Record that a user is in a group (buffered replacement for db.add_user_to_group)"""
+    key = (group_id, user_id)
+    with _lock:
+        if key not in _pending_members and key in _written_members:
+            return
+        _pending_members[key] = True
+    _queued()
+
+def track_group_member_left(group_id: int, user_id: int):
+    """Record that a user left a group (buffered replacement for db.remove_user_from_group).
+
+    Goes through the buffer as well so a pending join can never be written after the leave.
+    """
+    with _lock:
+        _pending_members[(group_id, user_id)] = False
+    _queued()
+
+def flush() -> int:
+    """Write all pending tracking rows in one transaction and return how many were written"""
+    global _pending_users, _pending_groups, _pending_members
+    with _lock:
+        if not _pending_count():
+            return 0
+        users, groups, members = _pending_users, _pending_groups, _pending_members
+        _pending_users, _pending_groups, _pending_members = {}, {}, {}
+
+    joined = [key for key, is_member in members.items() if is_member]
+    left = [key for key, is_member in members.items() if not is_member]
+    try:
+        write_tracking_batch(list(users.values()), list(groups.values()), joined, left)
+    except Exception as e:
+        print(f"Error flushing tracking buffer: {e}")
+        # Put the rows back unless a newer state was recorded in the meantime
+        with _lock:
+            for source, target in ((users, _pending_users), (groups, _pending_groups), (members, _pending_members)):
+                for key, value in source.items():
+                    target.setdefault(key, value)
+        return 0
+
+    now = time.monotonic()
+    with _lock:
+        if len(_written_users) + len(users) > MAX_REMEMBERED:
+            _written_users.clear()
+        if len(_written_groups) + len(groups) > MAX_REMEMBERED:
+            _written_groups.clear()
+        if len(_written_members) + len(joined) > MAX_REMEMBERED:
+            _written_members.clear()
+        for user_id, row in users.items():
+            _written_users[user_id] = (row, now)
+        _written_groups.update(groups)
+        _written_members.update(joined)
+        _written_members.difference_update(left)
+    return len(users) + len(groups) + len(members)
+
+def _flush_forever():
+    while True:
+        _flush_wakeup.wait(FLUSH_INTERVAL)
+        _flush_wakeup.clear()
+        flush()
+
+def start_flusher():
+    """Start this process' tracking flusher thread (once per process)"""
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_forever, name="tracking-flusher", daemon=True).start()
+
+atexit.register(flush)
@@ -0,0 +1,37 @@
+import os
+import re
+from typing import Optional
+
+# Environment variables are loaded by docker-compose
+
+# With a public URL configured, Telegram pushes updates to the bot's webhook
+# server instead of the bot long-polling getUpdates. Every request must carry the
+# secret token in the X-Telegram-Bot-Api-Secret-Token header; python-telegram-bot
+# answers requests without it with 403 before they reach a handler.
+WEBHOOK_URL = os.environ.get("TELEGRAM_CHANNEL_BOT_WEBHOOK_URL", "").strip().rstrip("/")
+WEBHOOK_SECRET = os.environ.get("TELEGRAM_CHANNEL_BOT_WEBHOOK_SECRET", "")
+WEBHOOK_LISTEN = os.environ.get("TELEGRAM_CHANNEL_BOT_WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("TELEGRAM_CHANNEL_BOT_WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.environ.get("TELEGRAM_CHANNEL_BOT_WEBHOOK_PATH", "telegram").strip("/")
+
+# Telegram only accepts 1-256 characters A-Z, a-z, 0-9, _ and - as secret token
+SECRET_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+def webhook_settings() -> Optional[dict]:
+    """Get the Application.run_webhook arguments, or None to run in polling mode.
+
+    Raises ValueError when webhook mode is configured without a valid secret token.
+    """
+    if not WEBHOOK_URL:
+        return None
+    if not WEBHOOK_URL.startswith("https://"):
+        raise ValueError("TELEGRAM_CHANNEL_BOT_WEBHOOK_URL must be an https:// URL")
+    if not SECRET_TOKEN_PATTERN.fullmatch(WEBHOOK_SECRET):
+        raise ValueError("TELEGRAM_CHANNEL_BOT_WEBHOOK_SECRET must be 1-256 characters of A-Z, a-z, 0-9, _ and -")
+    return {
+        "listen": WEBHOOK_LISTEN,
+        "port": WEBHOOK_PORT,
+        "url_path": WEBHOOK_PATH,
+        "webhook_url": f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+        "secret_token": WEBHOOK_SECRET,
+    }